@@ -0,0 +1,109 @@
+"""
+In-memory room allocation for a queue of room applications
+"""
+import time
+
+
+class RoomPool:
+    """Free beds per block, bucketed by vacancy so a best-fit room is found without sorting"""
+
+    def __init__(self, rooms):
+        # rooms: iterable of (room_no, block, vacancy)
+        self.rooms = {}    # room_no -> [block, vacancy]
+        self.blocks = {}   # block -> list of buckets, buckets[v] = set of rooms with v free beds
+        self.free = {}     # block -> free beds
+        for room_no, block, vacancy in rooms:
+            vacancy = max(vacancy or 0, 0)
+            self.rooms[room_no] = [block, vacancy]
+            self._bucket(block, vacancy).add(room_no)
+            self.free[block] = self.free.get(block, 0) + vacancy
+
+    def _bucket(self, block, vacancy):
+        buckets = self.blocks.setdefault(block, [])
+        while len(buckets) <= vacancy:
+            buckets.append(set())
+        return buckets[vacancy]
+
+    def _move(self, room_no, delta):
+        block, vacancy = self.rooms[room_no]
+        self.blocks[block][vacancy].discard(room_no)
+        self._bucket(block, vacancy + delta).add(room_no)
+        self.rooms[room_no][1] = vacancy + delta
+        self.free[block] += delta
+
+    def take_room(self, room_no):
+        entry = self.rooms.get(room_no)
+        if entry is None or entry[1] < 1:
+            return None
+        self._move(room_no, -1)
+        return room_no
+
+    def take_in_block(self, block, spread=False):
+        if not self.free.get(block):
+            return None
+        buckets = self.blocks[block]
+        order = range(len(buckets) - 1, 0, -1) if spread else range(1, len(buckets))
+        for vacancy in order:
+            if buckets[vacancy]:
+                room_no = next(iter(buckets[vacancy]))
+                self._move(room_no, -1)
+                return room_no
+        return None
+
+    def take_any(self, spread=False):
+        # Fullest block first keeps whole blocks free for later preferences; emptiest when spreading
+        blocks = [b for b, n in self.free.items() if n > 0]
+        if not blocks:
+            return None
+        block = (max if spread else min)(blocks, key=lambda b: self.free[b])
+        return self.take_in_block(block, spread)
+
+    def give_back(self, room_no):
+        if room_no in self.rooms:
+            self._move(room_no, 1)
+
+
+def allocate(applications, rooms, fallback=True, spread=False):
+    """Place applications in the order given.
+
+    applications: dicts with 'id', 'student', 'room' (preferred room or None),
+    'blocks' (preferred blocks, best first) and 'current' (room held now or None).
+    rooms: iterable of (room_no, block, vacancy).
+    Returns (placed, unplaced, stats), placed as (application, room_no) pairs.
+    """
+    started = time.perf_counter()
+    pool = RoomPool(rooms)
+    placed, unplaced = [], []
+    seen = set()
+    for app in applications:
+        if app['student'] in seen:
+            unplaced.append((app, 'Duplicate application for this student'))
+            continue
+        seen.add(app['student'])
+        room_no = None
+        if app.get('current') is not None:
+            # The bed a mover holds now counts as free while they are placed
+            pool.give_back(app['current'])
+        if app.get('room') is not None:
+            room_no = pool.take_room(app['room'])
+        for block in app.get('blocks') or ():
+            if room_no is not None:
+                break
+            room_no = pool.take_in_block(block, spread)
+        if room_no is None and fallback:
+            room_no = pool.take_any(spread)
+        if room_no is None:
+            if app.get('current') is not None:
+                pool.take_room(app['current'])
+            unplaced.append((app, 'No room with vacancy matches the preferences'))
+            continue
+        placed.append((app, room_no))
+    elapsed = time.perf_counter() - started
+    stats = {
+        'applications': len(applications),
+        'placed': len(placed),
+        'unplaced': len(unplaced),
+        'solve_ms': round(elapsed * 1000, 2),
+        'placements_per_sec': round(len(placed) / elapsed) if elapsed else None,
+    }
+    return placed, unplaced, stats
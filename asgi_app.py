@@ -0,0 +1,323 @@
+"""
+Optional ASGI entry point: the student read endpoints run on an async MySQL pool,
+everything else is handed to the Flask app in a thread pool.
+
+    pip install -r requirements-async.txt
+    uvicorn asgi_app:app --host 0.0.0.0 --port 3000
+
+/api/current-user, /api/student-dashboard, /api/student-profile and /api/student-fees use
+up to ASYNC_DB_POOL_MAX aiomysql connections; a request waiting on MySQL holds a coroutine,
+not a thread. /api/events streams are coroutines too, so there is no SSE_MAX_STREAMS limit.
+Every other route runs in ASGI_WSGI_THREADS threads. URLs, bodies, status codes, ETags,
+request ids and metrics match the Flask app. The async routes only read sessions from the
+tiered session store; with any other session_interface Flask serves them instead.
+"""
+import asyncio
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+
+import aiomysql
+import pymysql
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.http import generate_etag, parse_etags
+
+import flask_app
+from events import Subscription
+from flask_app import DB_CONFIG, POOL_CONFIG, metrics, log
+from log_config import request_id
+
+# Connections in the async pool; each waiting request costs a coroutine, not a thread
+ASYNC_DB_POOL_MAX = int(os.environ.get('ASYNC_DB_POOL_MAX', 50))
+# Threads that run the Flask routes not served natively here
+ASGI_WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 32))
+
+
+class AsyncPool:
+    """aiomysql pool with the same settings as the blocking ConnectionPool"""
+
+    def __init__(self, config, min_size=2, max_size=50, timeout=10, max_lifetime=3600):
+        self.config = config
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self._pool = None
+
+    async def start(self):
+        self._pool = await aiomysql.create_pool(
+            host=self.config['host'], port=self.config.get('port', 3306),
+            user=self.config['user'], password=self.config['password'], db=self.config['database'],
+            autocommit=True, cursorclass=aiomysql.DictCursor,
+            minsize=self.min_size, maxsize=self.max_size, pool_recycle=int(self.max_lifetime))
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+    async def query(self, sql, params=None):
+        started = time.perf_counter()
+        try:
+            try:
+                conn = await asyncio.wait_for(self._pool.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                raise flask_app.PoolTimeoutError(f'No database connection free after {self.timeout}s')
+            try:
+                async with conn.cursor() as cur:
+                    await cur.execute(sql, params or ())
+                    return await cur.fetchall()
+            except (pymysql.err.InterfaceError, pymysql.err.OperationalError):
+                # Drop the connection rather than hand a broken one to the next request
+                conn.close()
+                raise
+            finally:
+                self._pool.release(conn)
+        finally:
+            metrics.record_db(time.perf_counter() - started)
+
+    def stats(self):
+        if self._pool is None:
+            return {}
+        return {'size': self._pool.size, 'idle': self._pool.freesize,
+                'in_use': self._pool.size - self._pool.freesize, 'max_size': self.max_size}
+
+
+async_db = AsyncPool(DB_CONFIG, min_size=POOL_CONFIG['min_size'], max_size=ASYNC_DB_POOL_MAX,
+                     timeout=POOL_CONFIG['timeout'], max_lifetime=POOL_CONFIG['max_lifetime'])
+metrics.gauge('async_pool', 'Async database connection pool', async_db.stats)
+
+
+async def load_student_dashboard(student_id):
+    # Same cache, SQL and shaping as flask_app.load_student_dashboard
+    # The cache can read its SQLite or MySQL version store, so keep it off the event loop too
+    cached = await asyncio.to_thread(flask_app.dashboard_cache.get, student_id)
+    if cached is not None:
+        return cached
+    rows = await async_db.query(flask_app.dashboard_sql(), (student_id,))
+    if not rows:
+        return None
+    return flask_app.build_dashboard(student_id, rows[0])
+
+
+async def read_session(headers):
+    flask = flask_app.app
+    cookie_name = flask.config['SESSION_COOKIE_NAME']
+    raw = headers.get(b'cookie')
+    if not raw:
+        return {}
+    morsel = SimpleCookie(raw.decode('latin-1')).get(cookie_name)
+    interface = flask.session_interface
+    if morsel is None:
+        return {}
+    # Even a cached session is checked against SQLite for revocation, so always off the event loop
+    data = await asyncio.to_thread(interface.peek, flask, morsel.value)
+    return data or {}
+
+
+def json_body(payload):
+    # Same bytes jsonify() produces outside debug mode
+    return (flask_app.app.json.dumps(payload, separators=(',', ':')) + '\n').encode()
+
+
+async def current_user(session, headers):
+    if 'user' not in session:
+        return 401, {'error': 'Not logged in'}
+    return 200, session['user']
+
+
+async def student_dashboard(session, headers):
+    if 'user' not in session:
+        return 401, {'error': 'Not logged in'}
+    if session['user'].get('role') != 'student':
+        return 403, {'error': 'Forbidden'}
+    data = await load_student_dashboard(session['user'].get('id'))
+    if data is None:
+        return 404, {'error': 'Profile not found'}
+    body = json_body(flask_app.dashboard_payload(session['user'], data))
+    etag = generate_etag(body)
+    extra = [(b'cache-control', b'private, no-cache'), (b'etag', f'"{etag}"'.encode())]
+    if_none_match = headers.get(b'if-none-match')
+    if if_none_match and parse_etags(if_none_match.decode('latin-1')).contains(etag):
+        return 304, None, extra
+    return 200, body, extra
+
+
+async def student_profile(session, headers):
+    if 'user' not in session:
+        return 401, {'error': 'Not logged in'}
+    if session['user'].get('role') != 'student':
+        return 403, {'error': 'Forbidden'}
+    data = await load_student_dashboard(session['user'].get('id'))
+    if data is None:
+        return 404, {'error': 'Profile not found'}
+    return 200, data['profile']
+
+
+async def student_fees(session, headers):
+    if 'user' not in session:
+        return 401, {'error': 'Not logged in'}
+    if session['user'].get('role') != 'student':
+        return 403, {'error': 'Forbidden'}
+    data = await load_student_dashboard(session['user'].get('id'))
+    if data is None:
+        return 404, {'error': 'Student not found'}
+    return 200, flask_app.student_fees_payload(data)
+
+
+async def manager_only(session, headers):
+    if 'user' not in session:
+        return 401, {'error': 'Not logged in'}
+    if session['user'].get('role') != 'manager':
+        return 403, {'error': 'Forbidden'}
+    return None
+
+
+class AsyncSubscription(Subscription):
+    """Event queue of one stream, waking its coroutine on the event loop instead of a thread"""
+
+    def __init__(self, loop, max_queue):
+        super().__init__(max_queue)
+        self._loop = loop
+        self._ready = asyncio.Event()
+
+    def _wake(self):
+        self._loop.call_soon_threadsafe(self._ready.set)
+
+    async def next(self, timeout):
+        event = self.get(0)
+        if event is None:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+            event = self.get(0)
+        return event
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+# GET routes served natively; the rest of the API goes through Flask unchanged
+ASYNC_ROUTES = {
+    '/api/current-user': current_user,
+    '/api/student-dashboard': student_dashboard,
+    '/api/student-profile': student_profile,
+    '/api/student-fees': student_fees,
+}
+
+
+class AsyncApp:
+    """ASGI application: native handlers for ASYNC_ROUTES, Flask (via a thread pool) for the rest"""
+
+    def __init__(self):
+        self.wsgi = WsgiToAsgi(flask_app.app)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        # Native handlers read the session without Flask, which only a session interface with peek() allows
+        native = (scope['type'] == 'http' and scope['method'] == 'GET'
+                  and hasattr(flask_app.app.session_interface, 'peek'))
+        handler = ASYNC_ROUTES.get(scope.get('path')) if native else None
+        if native and scope.get('path') == '/api/events':
+            await self.stream_events(scope, receive, send)
+            return
+        if handler is None:
+            await self.wsgi(scope, receive, send)
+            return
+        await self.serve(handler, scope, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await async_db.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def startup(self):
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(ASGI_WSGI_THREADS))
+        await async_db.start()
+        await asyncio.to_thread(flask_app.warm_up)
+
+    async def serve(self, handler, scope, send):
+        headers = dict(scope.get('headers') or [])
+        started = time.perf_counter()
+        metrics_token = metrics.start_request()
+        rid = (headers.get(b'x-request-id') or b'').decode('latin-1') or uuid.uuid4().hex[:16]
+        rid_token = request_id.set(rid)
+        extra = []
+        try:
+            session = await read_session(headers)
+            result = await handler(session, headers)
+            status, payload = result[0], result[1]
+            extra = list(result[2]) if len(result) > 2 else []
+            body = payload if isinstance(payload, bytes) or payload is None else json_body(payload)
+        except flask_app.PoolTimeoutError:
+            status, body = 503, json_body({'error': 'Database busy, please retry'})
+        except Exception:
+            log.exception('Unhandled error in %s', scope['path'])
+            status, body = 500, json_body({'error': 'Internal server error'})
+        finally:
+            request_id.reset(rid_token)
+        response_headers = [(b'x-request-id', rid.encode())] + extra
+        if body is not None:
+            response_headers += [(b'content-type', b'application/json'),
+                                 (b'content-length', str(len(body)).encode())]
+        await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+        await send({'type': 'http.response.body', 'body': body or b''})
+        metrics.finish_request(scope['path'], 'GET', status, time.perf_counter() - started, metrics_token)
+
+    async def stream_events(self, scope, receive, send):
+        # Same stream as Flask's /api/events, but an open dashboard costs a coroutine rather than a thread
+        headers = dict(scope.get('headers') or [])
+        if await manager_only(await read_session(headers), headers):
+            await self.serve(manager_only, scope, send)
+            return
+        loop = asyncio.get_running_loop()
+        last_event_id = (headers.get(b'last-event-id') or b'').decode('latin-1') or None
+        subscription = flask_app.broadcaster.subscribe(AsyncSubscription(loop, flask_app.EVENTS_QUEUE_SIZE), last_event_id)
+        disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+        try:
+            started = time.perf_counter()
+            metrics_token = metrics.start_request()
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no')]})
+            # Timed to the headers, like the Flask route; the stream itself stays out of the latency histograms
+            metrics.finish_request(scope['path'], 'GET', 200, time.perf_counter() - started, metrics_token)
+            await send({'type': 'http.response.body', 'body': b'retry: 2000\n\n', 'more_body': True})
+            deadline = loop.time() + flask_app.SSE_STREAM_SECONDS
+            while loop.time() < deadline:
+                waiter = asyncio.ensure_future(subscription.next(flask_app.SSE_HEARTBEAT_SECONDS))
+                await asyncio.wait({waiter, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if not waiter.done():
+                    waiter.cancel()
+                    return
+                event = waiter.result()
+                message = flask_app.sse_message(event) if event else ': keep-alive\n\n'
+                await send({'type': 'http.response.body', 'body': message.encode(), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        except OSError:
+            pass  # the client went away mid-send
+        finally:
+            flask_app.broadcaster.unsubscribe(subscription)
+            disconnected.cancel()
+
+
+app = AsyncApp()
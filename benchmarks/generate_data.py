@@ -0,0 +1,233 @@
+"""
+Fill a scratch database with a synthetic hostel for benchmarking
+
+    python benchmarks/generate_data.py --reset --students 5000
+
+Uses the DB_HOST / DB_USER / DB_PASSWORD settings from .env, but writes to
+BENCH_DB_NAME (default hostel_bench), never to the real hostel_db. MySQL or
+MariaDB must run with lower_case_table_names=1, as the app mixes RoomInfo/roominfo.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import pymysql
+from dotenv import load_dotenv
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+load_dotenv(os.path.join(ROOT, '.env'))
+
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'user': os.environ.get('DB_USER', 'root'),
+    'password': os.environ.get('DB_PASSWORD', '@AMS2trps'),
+    'autocommit': True,
+}
+BENCH_DB_NAME = os.environ.get('BENCH_DB_NAME', 'hostel_bench')
+
+SCHEMA = [
+    '''CREATE TABLE blockinfo (
+        BlockId INT PRIMARY KEY,
+        HostelId INT NOT NULL UNIQUE,
+        Type VARCHAR(32) NOT NULL,
+        Vacancy INT NOT NULL DEFAULT 0
+    )''',
+    '''CREATE TABLE roominfo (
+        RoomNo INT PRIMARY KEY,
+        BlockId INT NOT NULL,
+        Type VARCHAR(16) NOT NULL,
+        Vacancy INT NOT NULL DEFAULT 0,
+        KEY idx_roominfo_block (BlockId)
+    )''',
+    '''CREATE TABLE messinfo (
+        MessId INT PRIMARY KEY,
+        MessName VARCHAR(32) NOT NULL,
+        Vacancy INT NOT NULL DEFAULT 0
+    )''',
+    '''CREATE TABLE studentinfo (
+        StudentId INT AUTO_INCREMENT PRIMARY KEY,
+        Firstname VARCHAR(50) NOT NULL,
+        Lastname VARCHAR(50) NOT NULL,
+        MobNo VARCHAR(15),
+        Dept VARCHAR(50),
+        Year INT,
+        Degree VARCHAR(20),
+        Address VARCHAR(255),
+        Password VARCHAR(100),
+        StHostelId INT,
+        RoomId INT,
+        MessId INT,
+        KEY idx_studentinfo_room (RoomId)
+    )''',
+    '''CREATE TABLE FeesInfo (
+        StudentId INT PRIMARY KEY,
+        FeesPaid DECIMAL(10,2) NOT NULL DEFAULT 0
+    )''',
+    '''CREATE TABLE login (
+        id INT PRIMARY KEY,
+        username VARCHAR(50) NOT NULL UNIQUE,
+        password VARCHAR(100) NOT NULL,
+        role VARCHAR(20) NOT NULL
+    )''',
+    '''CREATE TABLE hostelmanagerinfo (
+        ManagerId INT PRIMARY KEY,
+        Name VARCHAR(100) NOT NULL
+    )''',
+    '''CREATE TABLE roomapplication (
+        ApplicationId INT AUTO_INCREMENT PRIMARY KEY,
+        StudentId INT NOT NULL,
+        PreferredBlock INT,
+        Priority INT NOT NULL DEFAULT 0,
+        AppliedOn DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        Status VARCHAR(16) NOT NULL DEFAULT 'Pending'
+    )''',
+]
+
+# Triggers and procedures the app relies on, installed after the bulk load so it is not slowed by them
+SQL_SCRIPTS = ('room_vacancy_triggers.sql', 'block_vacancy_triggers.sql', 'sp_update_fee_payment.sql',
+               'sp_assign_room.sql', 'hostel_summary.sql', 'student_search_indexes.sql', 'change_log.sql')
+
+FIRST_NAMES = ('Aarav', 'Diya', 'Ishaan', 'Meera', 'Kabir', 'Ananya', 'Rohan', 'Saanvi', 'Vihaan', 'Tara')
+LAST_NAMES = ('Sharma', 'Iyer', 'Patel', 'Reddy', 'Nair', 'Gupta', 'Khan', 'Das', 'Joshi', 'Rao')
+DEPTS = ('CSE', 'ECE', 'ME', 'CE', 'EEE', 'IT')
+DEGREES = ('BTech', 'MTech', 'MSc', 'PhD')
+
+
+def run_sql_script(cur, path):
+    """Run a mysql-client style script (USE and DELIMITER lines included) through PyMySQL"""
+    delimiter = ';'
+    statement = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            stripped = line.strip()
+            if stripped.upper().startswith('DELIMITER '):
+                delimiter = stripped.split()[1]
+                continue
+            if stripped.upper().startswith('USE ') or (not statement and (not stripped or stripped.startswith('--'))):
+                continue
+            statement.append(line)
+            if stripped.endswith(delimiter):
+                sql = ''.join(statement).rstrip()[:-len(delimiter)]
+                statement = []
+                if sql.strip():
+                    cur.execute(sql)
+
+
+def insert_batches(cur, sql, rows, size=1000):
+    for i in range(0, len(rows), size):
+        cur.executemany(sql, rows[i:i + size])
+
+
+def generate(args):
+    rng = random.Random(args.seed)
+    blocks, rooms, messes, students, fees, logins = [], [], [], [], [], []
+
+    for b in range(1, args.blocks + 1):
+        blocks.append([b, b, f'Block {chr(64 + b) if b <= 26 else b}', 0])
+        for r in range(1, args.rooms_per_block + 1):
+            rooms.append([b * 1000 + r, b, rng.choice(('Single', 'Double', 'Triple')), args.room_capacity])
+    for m in range(1, args.messes + 1):
+        messes.append([m, f'Mess {m}', 0])
+
+    free = list(rooms)
+    rng.shuffle(free)
+    mess_load = {m[0]: 0 for m in messes}
+    for student_id in range(1, args.students + 1):
+        room = None
+        while free and room is None:
+            if free[-1][3] > 0:
+                room = free[-1]
+                room[3] -= 1
+            else:
+                free.pop()
+        mess_id = rng.choice(messes)[0] if messes else None
+        if mess_id:
+            mess_load[mess_id] += 1
+        students.append((
+            student_id, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), f'9{rng.randrange(10**9):09d}',
+            rng.choice(DEPTS), rng.randint(1, 4), rng.choice(DEGREES), f'{rng.randint(1, 999)} Main Road',
+            'pass123', room[1] if room else None, room[0] if room else None, mess_id,
+        ))
+        paid = 50000 if rng.random() < args.paid_ratio else rng.choice((0, 10000, 25000, 40000))
+        fees.append((student_id, paid))
+        logins.append((student_id, f'student{student_id}', 'pass123', 'student'))
+
+    # Free beds per block and free places per mess, which the write endpoints move by one per student
+    for block in blocks:
+        block[3] = sum(room[3] for room in rooms if room[1] == block[0])
+    for mess in messes:
+        mess[2] = max(args.mess_capacity - mess_load[mess[0]], 0)
+    manager_id = args.students + 1
+    logins.append((manager_id, args.manager_user, args.manager_password, 'manager'))
+    applications = [(s[0], rng.randint(1, args.blocks), rng.randint(0, 3))
+                    for s in rng.sample(students, min(args.applications, len(students)))]
+    return blocks, rooms, messes, students, fees, logins, applications
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--reset', action='store_true', help='drop and recreate the benchmark database first')
+    parser.add_argument('--blocks', type=int, default=4)
+    parser.add_argument('--rooms-per-block', type=int, default=100)
+    parser.add_argument('--room-capacity', type=int, default=3)
+    parser.add_argument('--messes', type=int, default=3)
+    parser.add_argument('--mess-capacity', type=int, default=2000)
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--paid-ratio', type=float, default=0.5, help='share of students with fees fully paid')
+    parser.add_argument('--applications', type=int, default=0, help='pending roomapplication rows')
+    parser.add_argument('--manager-user', default='bench_manager')
+    parser.add_argument('--manager-password', default='bench')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if BENCH_DB_NAME == 'hostel_db':
+        sys.exit('Refusing to generate into hostel_db; set BENCH_DB_NAME to a scratch database')
+
+    started = time.perf_counter()
+    conn = pymysql.connect(**DB_CONFIG)
+    with conn.cursor() as cur:
+        if args.reset:
+            cur.execute(f'DROP DATABASE IF EXISTS `{BENCH_DB_NAME}`')
+        cur.execute(f'CREATE DATABASE IF NOT EXISTS `{BENCH_DB_NAME}`')
+        cur.execute(f'USE `{BENCH_DB_NAME}`')
+        cur.execute("SHOW TABLES LIKE 'studentinfo'")
+        if cur.fetchone():
+            sys.exit(f'{BENCH_DB_NAME} already has data; pass --reset to rebuild it')
+        for ddl in SCHEMA:
+            cur.execute(ddl)
+
+        blocks, rooms, messes, students, fees, logins, applications = generate(args)
+        insert_batches(cur, 'INSERT INTO blockinfo (BlockId, HostelId, Type, Vacancy) VALUES (%s, %s, %s, %s)', blocks)
+        insert_batches(cur, 'INSERT INTO roominfo (RoomNo, BlockId, Type, Vacancy) VALUES (%s, %s, %s, %s)', rooms)
+        insert_batches(cur, 'INSERT INTO messinfo (MessId, MessName, Vacancy) VALUES (%s, %s, %s)', messes)
+        insert_batches(cur, 'INSERT INTO studentinfo (StudentId, Firstname, Lastname, MobNo, Dept, Year, Degree, '
+                            'Address, Password, StHostelId, RoomId, MessId) '
+                            'VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)', students)
+        insert_batches(cur, 'INSERT INTO FeesInfo (StudentId, FeesPaid) VALUES (%s, %s)', fees)
+        insert_batches(cur, 'INSERT INTO login (id, username, password, role) VALUES (%s, %s, %s, %s)', logins)
+        insert_batches(cur, 'INSERT INTO hostelmanagerinfo (ManagerId, Name) VALUES (%s, %s)',
+                       [(args.students + 1, 'Bench Manager')])
+        insert_batches(cur, 'INSERT INTO roomapplication (StudentId, PreferredBlock, Priority) VALUES (%s, %s, %s)',
+                       applications)
+
+        for script in SQL_SCRIPTS:
+            run_sql_script(cur, os.path.join(ROOT, 'sql_scripts', script))
+    conn.close()
+
+    # Fill hostel_summary from the loaded rows through the app's own rebuild
+    os.environ['DB_NAME'] = BENCH_DB_NAME
+    sys.path.insert(0, ROOT)
+    import flask_app
+    flask_app.refresh_schema_cache()
+    flask_app.rebuild_summary()
+
+    print(f'{BENCH_DB_NAME}: {len(blocks)} blocks, {len(rooms)} rooms, {len(messes)} messes, '
+          f'{len(students)} students, {len(applications)} applications '
+          f'in {time.perf_counter() - started:.1f}s')
+    print(f'Manager login: {args.manager_user} / {args.manager_password}; students: student<id> / pass123')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+"""
+Latency and throughput benchmark for the main endpoints
+
+    python benchmarks/run_bench.py                      # in-process, through flask_app.app.test_client()
+    python benchmarks/run_bench.py --url http://127.0.0.1:3000
+    python benchmarks/run_bench.py --save benchmarks/baseline.json
+    python benchmarks/run_bench.py --compare benchmarks/baseline.json
+
+Run benchmarks/generate_data.py first. In-process runs use BENCH_DB_NAME (default
+hostel_bench); against --url the server decides which database is used.
+
+Reports p50/p95/p99 latency and requests/sec for login, the student dashboard, the table
+endpoints, fee updates and add/delete student. --compare exits 1 on regressions beyond
+--tolerance (default 20%). In-process runs turn login throttling off; set the
+LOGIN_LIMIT_* bursts to 0 on a server you benchmark with --url.
+"""
+import argparse
+import http.cookiejar
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DB_NAME = os.environ.get('BENCH_DB_NAME', 'hostel_bench')
+
+
+class TestClientTransport:
+    """Requests through Flask's test client, no network in between"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_data()
+
+
+class HttpTransport:
+    """Requests to a running server, one cookie jar per worker"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                     headers={'Content-Type': 'application/json'} if data else {})
+        try:
+            with self.opener.open(req, timeout=30) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}  # endpoint -> list of seconds
+        self.errors = {}   # endpoint -> count
+        self.wall = {}     # endpoint -> wall-clock seconds of its phase
+
+    def timed(self, name, transport, method, path, body=None, expect=(200,)):
+        started = time.perf_counter()
+        status, payload = transport.request(method, path, body)
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.samples.setdefault(name, []).append(elapsed)
+            if status not in expect:
+                self.errors[name] = self.errors.get(name, 0) + 1
+        return status, payload
+
+    def report(self):
+        results = {}
+        for name, samples in self.samples.items():
+            ordered = sorted(samples)
+            wall = self.wall.get(name) or sum(samples)
+            results[name] = {
+                'requests': len(samples),
+                'errors': self.errors.get(name, 0),
+                'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+                'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+                'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+                'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+                'rps': round(len(samples) / wall, 1) if wall else None,
+            }
+        return results
+
+
+def login(transport, username, password):
+    status, body = transport.request('POST', '/api/login', {'username': username, 'password': password})
+    if status != 200:
+        raise SystemExit(f'Login as {username} failed ({status}): {body[:200]!r}')
+
+
+def run_phase(recorder, name, workers, count, make_transport, step):
+    """Run step(transport, i) count times across the worker threads"""
+    transports = [make_transport(w) for w in range(workers)]
+    counter = iter(range(count))
+    counter_lock = threading.Lock()
+
+    def work(transport):
+        while True:
+            with counter_lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            step(transport, i)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=work, args=(t,)) for t in transports]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if name in recorder.samples:
+        recorder.wall[name] = elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='benchmark a running server instead of the in-process app')
+    parser.add_argument('--requests', type=int, default=500, help='requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=20, help='untimed requests per endpoint first')
+    parser.add_argument('--manager-user', default='bench_manager')
+    parser.add_argument('--manager-password', default='bench')
+    parser.add_argument('--only', help='comma-separated endpoint names to run')
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed p95 slowdown / throughput drop against the baseline (0.2 = 20%%)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    if args.url:
+        def make_transport(_):
+            return HttpTransport(args.url)
+    else:
+        os.environ['DB_NAME'] = BENCH_DB_NAME
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        # Every benchmark login comes from one address; the login limiter would throttle the login phase
+        os.environ.setdefault('LOGIN_LIMIT_USER_BURST', '0')
+        os.environ.setdefault('LOGIN_LIMIT_IP_BURST', '0')
+        sys.path.insert(0, ROOT)
+        import flask_app
+        flask_app.db_pool.warm()
+        flask_app.refresh_schema_cache()
+
+        def make_transport(_):
+            return TestClientTransport(flask_app.app)
+
+    manager = make_transport(-1)
+    login(manager, args.manager_user, args.manager_password)
+    status, body = manager.request('GET', '/api/login?fields=id,username,password,role&limit=5000')
+    students = [u for u in json.loads(body) if u['role'] == 'student'] if status == 200 else []
+    if not students:
+        raise SystemExit('No student logins found; run benchmarks/generate_data.py first')
+    status, body = manager.request('GET', '/api/roominfo?fields=RoomNo,Vacancy&limit=5000')
+    free_rooms = [r['RoomNo'] for r in json.loads(body) if r['Vacancy'] > 0] if status == 200 else []
+
+    # Change-feed token from before the write phases, so the feed phase replays their edits
+    status, body = manager.request('GET', '/api/studentinfo/changes')
+    changes_since = json.loads(body)['next'] if status == 200 else None
+
+    recorder = Recorder()
+    warm = Recorder()
+
+    def manager_transport(w):
+        transport = make_transport(w)
+        login(transport, args.manager_user, args.manager_password)
+        return transport
+
+    def student_transport(w):
+        transport = make_transport(w)
+        student = students[w % len(students)]
+        login(transport, student['username'], student['password'])
+        return transport
+
+    def do_login(transport, i, rec):
+        student = students[rng.randrange(len(students))]
+        rec.timed('login', transport, 'POST', '/api/login',
+                  {'username': student['username'], 'password': student['password']})
+
+    def do_dashboard(transport, i, rec):
+        rec.timed('student_dashboard', transport, 'GET', '/api/student-dashboard')
+
+    def do_table(table, query=''):
+        def step(transport, i, rec):
+            rec.timed(f'table_{table}', transport, 'GET', f'/api/{table}?limit=100{query}')
+        return step
+
+    def do_search(transport, i, rec):
+        # Name prefix plus a filter, alternating with a full-text search sorted by relevance
+        if i % 2:
+            path = f'/api/studentinfo/search?q={rng.choice("ADIKMRSTV")}{rng.choice("aeiou")}&Year={rng.randint(1, 4)}'
+        else:
+            path = f'/api/studentinfo/search?q={rng.choice(("Sharma", "Iyer", "Patel", "Reddy", "Nair"))}&mode=fulltext'
+        rec.timed('search_students', transport, 'GET', path)
+
+    def do_fees(transport, i, rec):
+        student = students[rng.randrange(len(students))]
+        rec.timed('update_fees', transport, 'PUT', f'/api/studentinfo/{student["id"]}/fees',
+                  {'FeesPaid': rng.choice((10000, 25000, 50000))})
+
+    def do_changes(transport, i, rec):
+        if changes_since:
+            rec.timed('studentinfo_changes', transport, 'GET', f'/api/studentinfo/changes?since={changes_since}')
+
+    def do_add_delete(transport, i, rec):
+        room = free_rooms[i % len(free_rooms)] if free_rooms and i % 2 == 0 else None
+        status, body = rec.timed('add_student', transport, 'POST', '/api/studentinfo', {
+            'Firstname': 'Bench', 'Lastname': f'Student{i}', 'Dept': 'CSE', 'Year': 1, 'Degree': 'BTech',
+            'Password': 'pass123', 'RoomId': room, 'username': f'bench_{os.getpid()}_{i}_{rng.randrange(10**9)}',
+        }, expect=(200, 400))
+        if status != 200:
+            return
+        student_id = json.loads(body)['id']
+        # Deleting needs fully paid fees
+        transport.request('PUT', f'/api/studentinfo/{student_id}/fees', {'FeesPaid': 50000})
+        rec.timed('delete_student', transport, 'DELETE', f'/api/studentinfo/{student_id}')
+
+    phases = [
+        ('login', make_transport, do_login),
+        ('student_dashboard', student_transport, do_dashboard),
+        ('table_roominfo', make_transport, do_table('roominfo')),
+        ('table_blockinfo', make_transport, do_table('blockinfo')),
+        ('table_studentinfo', manager_transport, do_table('studentinfo')),
+        ('search_students', manager_transport, do_search),
+        ('update_fees', manager_transport, do_fees),
+        ('add_student', manager_transport, do_add_delete),
+        ('studentinfo_changes', manager_transport, do_changes),
+    ]
+    only = set(args.only.split(',')) if args.only else None
+    for name, transport_factory, step in phases:
+        if only and name not in only:
+            continue
+        if args.warmup:
+            run_phase(warm, name, min(args.concurrency, args.warmup), args.warmup, transport_factory,
+                      lambda t, i, s=step: s(t, i, warm))
+        run_phase(recorder, name, args.concurrency, args.requests, transport_factory,
+                  lambda t, i, s=step: s(t, i, recorder))
+        # add_student also records delete_student, over the same wall-clock phase
+        if name == 'add_student' and 'delete_student' in recorder.samples:
+            recorder.wall['delete_student'] = recorder.wall.get('add_student')
+
+    results = recorder.report()
+    print(f"{'endpoint':<20}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for name, r in results.items():
+        print(f"{name:<20}{r['requests']:>9}{r['errors']:>8}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['rps']:>10}")
+
+    run = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'commit': git_commit(),
+        'transport': args.url or 'test_client',
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'results': results,
+    }
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f'Saved {args.save}')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(baseline, run, args.tolerance):
+            sys.exit(1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(baseline, run, tolerance):
+    """Print the change per endpoint; returns True if anything regressed beyond tolerance"""
+    regressed = False
+    print(f"\nAgainst baseline {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    for name, now in run['results'].items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            print(f'  {name}: no baseline')
+            continue
+        p95_change = now['p95_ms'] / before['p95_ms'] - 1 if before['p95_ms'] else 0
+        rps_change = now['rps'] / before['rps'] - 1 if before.get('rps') and now.get('rps') else 0
+        bad = p95_change > tolerance or rps_change < -tolerance
+        regressed |= bad
+        print(f"  {name}: p95 {before['p95_ms']} -> {now['p95_ms']} ms ({p95_change:+.0%}), "
+              f"req/s {before['rps']} -> {now['rps']} ({rps_change:+.0%}){'  REGRESSION' if bad else ''}")
+    return regressed
+
+
+if __name__ == '__main__':
+    main()
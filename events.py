@@ -0,0 +1,265 @@
+"""
+Publish/subscribe for live dashboard events, in process memory or relayed between worker processes through SQLite
+
+flask_app publishes a 'vacancy' event (current Vacancy of the rooms, blocks and messes a
+write touched, read back after the commit so trigger changes are included) and a 'fees'
+event (FeesPaid and FeesRemaining, plus 'removed' students) once a write commits.
+/api/events copies them to every open stream. A listener that falls EVENTS_QUEUE_SIZE
+events behind, or reconnects with a Last-Event-ID older than the last EVENTS_HISTORY
+events, gets a reset and should reload its data.
+
+With EVENTS_PATH set (gunicorn.conf.py does this) events reach streams in every worker.
+Each worker with open streams keeps its row in the listeners table fresh, and writers
+skip the read-back while no worker has one.
+"""
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque, namedtuple
+
+# id: '<boot>-<n>' (None for a reset); name: the SSE event name; data: JSON-ready payload
+Event = namedtuple('Event', 'id name data')
+
+# Sent instead of events a listener can no longer get; it should reload what it shows
+RESET = 'reset'
+
+
+class Subscription:
+    """One listener's queue; a listener that falls max_queue events behind gets a single reset instead"""
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._events = deque()
+        self._cond = threading.Condition()
+        self.resets = 0
+
+    def deliver(self, event):
+        # Runs on the publishing thread, so it never blocks
+        with self._cond:
+            if len(self._events) >= self.max_queue:
+                self._events.clear()
+                event = Event(None, RESET, {'reason': 'lagging'})
+                self.resets += 1
+            self._events.append(event)
+            self._cond.notify()
+        self._wake()
+
+    def _wake(self):
+        pass
+
+    def get(self, timeout=None):
+        """Next event, or None after timeout seconds without one"""
+        with self._cond:
+            if not self._events and timeout != 0:
+                self._cond.wait(timeout)
+            return self._events.popleft() if self._events else None
+
+
+class Broadcaster:
+    """Fans each published event out to every subscription in this process, keeping the last few for reconnects"""
+
+    shared = False
+
+    def __init__(self, history=1000):
+        self.boot = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._recent = deque(maxlen=history)
+        self._counter = itertools.count(1)
+        self._stats = {'published': 0, 'delivered': 0}
+
+    def publish(self, name, data):
+        with self._lock:
+            event = Event(f'{self.boot}-{next(self._counter)}', name, data)
+            self._recent.append(event)
+        self._fan_out([event])
+
+    def _fan_out(self, events):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+            self._stats['published'] += len(events)
+            self._stats['delivered'] += len(events) * len(subscriptions)
+        for event in events:
+            for subscription in subscriptions:
+                subscription.deliver(event)
+
+    def _parse_id(self, event_id):
+        boot, _, seq = (event_id or '').partition('-')
+        return int(seq) if boot == self.boot and seq.isdigit() else None
+
+    def _missed(self, after):
+        """Events after sequence number after, or None when some of them are no longer kept"""
+        if self._recent and self._parse_id(self._recent[0].id) > after + 1:
+            return None
+        return [event for event in self._recent if self._parse_id(event.id) > after]
+
+    def subscribe(self, subscription=None, last_event_id=None):
+        """Register a subscription; given the last event id a client saw, the events it missed are queued first"""
+        subscription = subscription or Subscription()
+        with self._lock:
+            missed = []
+            if last_event_id:
+                after = self._parse_id(last_event_id)
+                missed = self._missed(after) if after is not None else None
+                if missed is None:
+                    missed = [Event(None, RESET, {'reason': 'missed events'})]
+            self._subscriptions.add(subscription)
+        for event in missed:
+            subscription.deliver(event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def listening(self):
+        return bool(self._subscriptions)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['subscribers'] = len(self._subscriptions)
+            stats['resets'] = sum(s.resets for s in self._subscriptions)
+        return stats
+
+
+class SQLiteBroadcaster(Broadcaster):
+    """Events written to a SQLite file; one relay thread per worker process reads them back and fans them out"""
+
+    shared = True
+    # Old events are trimmed every this many publishes
+    TRIM_EVERY = 100
+    # A worker with subscribers refreshes its listeners row every third of this; rows older than it are ignored
+    LISTENER_TTL = 15
+
+    def __init__(self, path, history=1000, poll_interval=0.25):
+        super().__init__(history)
+        self.path = path
+        self.history = history
+        self.poll_interval = poll_interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._publishes = 0
+        self._relay = None
+        self._worker = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._beat_at = 0
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                data TEXT NOT NULL,
+                created REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        # One row per worker process that has subscribers, so publishers in any worker know someone is listening
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS listeners (
+                worker TEXT PRIMARY KEY,
+                subscribers INTEGER NOT NULL,
+                seen REAL NOT NULL
+            )
+        ''')
+        # Every worker uses the boot id of the file, so event ids mean the same in all of them
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('boot', ?)", (self.boot,))
+        self.boot = conn.execute("SELECT value FROM meta WHERE key = 'boot'").fetchone()[0]
+        self._last = conn.execute('SELECT COALESCE(MAX(id), 0) FROM events').fetchone()[0]
+
+    def _conn(self):
+        # sqlite3 connections must stay on the thread that opened them
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def publish(self, name, data):
+        conn = self._conn()
+        conn.execute('INSERT INTO events (name, data, created) VALUES (?, ?, ?)',
+                     (name, json.dumps(data, default=str), time.time()))
+        with self._lock:
+            self._publishes += 1
+            trim = self._publishes % self.TRIM_EVERY == 0
+        if trim:
+            conn.execute('DELETE FROM events WHERE id <= (SELECT MAX(id) FROM events) - ?', (self.history,))
+
+    def _read(self, after, limit=1000):
+        rows = self._conn().execute('SELECT id, name, data FROM events WHERE id > ? ORDER BY id LIMIT ?',
+                                    (after, limit)).fetchall()
+        return [Event(f'{self.boot}-{row[0]}', row[1], json.loads(row[2])) for row in rows]
+
+    def _beat(self):
+        """Record how many subscribers this worker has, or drop its row when it has none"""
+        with self._lock:
+            count = len(self._subscriptions)
+            self._beat_at = time.monotonic()
+        conn = self._conn()
+        if count:
+            conn.execute('INSERT OR REPLACE INTO listeners (worker, subscribers, seen) VALUES (?, ?, ?)',
+                         (self._worker, count, time.time()))
+        else:
+            conn.execute('DELETE FROM listeners WHERE worker = ?', (self._worker,))
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                if time.monotonic() - self._beat_at >= self.LISTENER_TTL / 3:
+                    self._beat()
+                events = self._read(self._last)
+            except sqlite3.Error:
+                continue
+            if events:
+                self._last = self._parse_id(events[-1].id)
+                self._fan_out(events)
+
+    def _missed(self, after):
+        oldest = self._conn().execute('SELECT MIN(id) FROM events').fetchone()[0]
+        if oldest is not None and oldest > after + 1:
+            return None
+        # The relay delivers anything newer than what it has read, so replay only up to there
+        return [event for event in self._read(after, self.history) if self._parse_id(event.id) <= self._last]
+
+    def subscribe(self, subscription=None, last_event_id=None):
+        with self._lock:
+            if self._relay is None:
+                self._relay = threading.Thread(target=self._run, name='event-relay', daemon=True)
+                self._relay.start()
+        subscription = super().subscribe(subscription, last_event_id)
+        self._beat()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        super().unsubscribe(subscription)
+        try:
+            self._beat()
+        except sqlite3.Error:
+            pass  # The relay thread retries, and the row expires anyway
+
+    def listening(self):
+        # Subscribers may be in any worker; a worker that died stops refreshing its row and drops out after the TTL
+        if self._subscriptions:
+            return True
+        try:
+            return self._conn().execute('SELECT 1 FROM listeners WHERE seen > ? LIMIT 1',
+                                        (time.time() - self.LISTENER_TTL,)).fetchone() is not None
+        except sqlite3.Error:
+            return True
+
+    def stats(self):
+        stats = super().stats()
+        try:
+            stats['listening_workers'] = self._conn().execute(
+                'SELECT COUNT(*) FROM listeners WHERE seen > ?', (time.time() - self.LISTENER_TTL,)).fetchone()[0]
+        except sqlite3.Error:
+            pass
+        return stats
@@ -1,28 +1,125 @@
-from flask import Flask, request, session, jsonify, send_from_directory
+"""
+HostelEase API and static frontend
+
+Request details the README only names:
+
+/api/<table>, GET /api/studentinfo
+    limit (TABLE_PAGE_DEFAULT when only after is given, at most TABLE_PAGE_MAX), after (the
+    X-Next-Cursor or Link rel="next" of the previous page), fields=A,B, order=[-]column (primary
+    key or a NOT NULL column). stream=1 or Accept: application/x-ndjson streams the table from a
+    server-side cursor. Public reference tables carry a per-table version as their ETag.
+POST /api/studentinfo/import
+    JSON array, text/csv body or a CSV in the 'file' field; studentinfo columns plus username.
+    Rows are checked against room, mess and block vacancy, then inserted in one transaction
+    that answers 409 if another write took their places meanwhile.
+POST /api/studentinfo/<id>/auto-assign
+    {"Block": 1, "strategy": "spread", <ROOM_INDEX_GROUP_BY columns>}; the bed is claimed with
+    a guarded UPDATE ... WHERE Vacancy > 0, so a stale room index never over-fills a room.
+POST /api/roomapplication/allocate
+    Pending applications by Priority, then date: preferred room, then Preference1..3 and
+    PreferredBlock, then any room unless {"fallback": false}. Placed ones become Approved.
+GET /api/fees/outstanding
+    min (default 0.01), hostel, ids=1,2, limit.
+PATCH /api/studentinfo
+    [{"StudentId": 12, "fields": {"Year": 2}}, ...]; failing items are rejected with a reason,
+    the rest are written in one transaction and vacancies move with the students.
+GET /api/studentinfo/search
+    q (each word starts the first or last name; mode=fulltext ranks by relevance), Dept, Year,
+    Degree, StHostelId, RoomId, MessId (comma-separated values), sort=Dept,-Year (columns,
+    FeesPaid or relevance), limit (default 50) and after.
+GET /api/<table>/changes?since=<token>
+    The first page of a fed table carries X-Change-Token. Returns {key, inserted, updated,
+    deleted, next, more}; call again from next while more is true. 410 means the token is
+    older than the pruned log and the table should be reloaded.
+
+With DB_REPLICAS set, table pages and exports (except the ETag-cached tables), /api/FeesInfo
+and /api/fees/outstanding read from a replica. Writes, reads that guard a write, logins and
+cache fills stay on the primary.
+"""
+from flask import Flask, Response, request, session, jsonify, send_from_directory, has_request_context
+import click
 from flask_session import Session
 from flask_cors import CORS
 import pymysql
+from pymysql.constants import SERVER_STATUS
 import os
+import base64
+import contextvars
+import functools
+import bisect
+import csv
+import io
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from urllib.parse import urlencode
+from datetime import timedelta
 from dotenv import load_dotenv
+from log_config import setup_logging, request_id
+from allocator import allocate
+from metrics import Metrics
+from rate_limit import Rule, TokenBucketLimiter, SQLiteTokenBucketLimiter
+from events import RESET, Broadcaster, SQLiteBroadcaster, Subscription
+from session_store import SQLiteSessionStore, LRUSessionCache, TieredSessionInterface
 
 # Load environment variables from .env file
 load_dotenv()
 
+# JSON logs written by a background thread; LOG_LEVEL=DEBUG adds session and row dumps
+setup_logging(os.environ.get('LOG_LEVEL', 'INFO'))
+log = logging.getLogger(__name__)
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PUBLIC_DIR = os.path.join(BASE_DIR, 'public')
 
 app = Flask(__name__, static_folder=PUBLIC_DIR, static_url_path='')
 app.config['SECRET_KEY'] = os.environ.get('FLASK_SECRET', 'hostel-secret')
-app.config['SESSION_TYPE'] = 'filesystem'
+# 'sqlite' = in-process LRU in front of a shared SQLite store (session_store.py);
+# any other value is handed to Flask-Session, e.g. 'filesystem'
+app.config['SESSION_TYPE'] = os.environ.get('SESSION_TYPE', 'sqlite')
 app.config['SESSION_PERMANENT'] = False
+app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(seconds=int(os.environ.get('SESSION_LIFETIME', 86400)))
 app.config['SESSION_FILE_DIR'] = os.path.join(BASE_DIR, 'flask_session')
 app.config['SESSION_USE_SIGNER'] = True
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['SESSION_COOKIE_SECURE'] = False  # Set to True if using HTTPS
-Session(app)
+if app.config['SESSION_TYPE'] == 'sqlite':
+    app.session_interface = TieredSessionInterface(
+        app,
+        SQLiteSessionStore(os.environ.get('SESSION_DB_PATH', os.path.join(BASE_DIR, 'flask_session', 'sessions.db'))),
+        LRUSessionCache(max_entries=int(os.environ.get('SESSION_LRU_SIZE', 10000)),
+                        ttl=float(os.environ.get('SESSION_LRU_TTL', 5))),
+        sweep_interval=float(os.environ.get('SESSION_SWEEP_INTERVAL', 60)),
+        use_signer=app.config['SESSION_USE_SIGNER'],
+        permanent=app.config['SESSION_PERMANENT'],
+    )
+else:
+    Session(app)
 CORS(app, supports_credentials=True, origins=['http://localhost:3000', 'http://127.0.0.1:3000'])
 
+# Request and DB metrics served at /metrics; set METRICS_TOKEN to require "Authorization: Bearer <token>"
+metrics = Metrics()
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+
+def db_timed(fn):
+    """Count each call as one database statement of the current request"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            metrics.record_db(time.perf_counter() - started)
+    return wrapper
+
 # DB connection settings - prefer environment variables
 DB_CONFIG = {
     'host': os.environ.get('DB_HOST', 'localhost'),
@@ -34,50 +131,1635 @@ DB_CONFIG = {
 }
 
 
+# Connection pool settings - sizes and recycling limits (seconds)
+POOL_CONFIG = {
+    'min_size': int(os.environ.get('DB_POOL_MIN', 2)),
+    'max_size': int(os.environ.get('DB_POOL_MAX', 10)),
+    'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+    'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', 3600)),
+    'ping_interval': float(os.environ.get('DB_POOL_PING_INTERVAL', 30)),
+}
+
+
 def get_db_connection():
     return pymysql.connect(**DB_CONFIG)
 
 
-def query(sql, params=None):
-    conn = get_db_connection()
-    try:
+class PoolTimeoutError(RuntimeError):
+    pass
+
+
+class ConnectionPool:
+    """Thread-safe pool of reusable MySQL connections"""
+
+    def __init__(self, connect, min_size=2, max_size=10, timeout=10, max_idle=300,
+                 max_lifetime=3600, ping_interval=30):
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self._cond = threading.Condition()
+        self._idle = deque()   # (conn, created_at, last_used_at), most recently used on the right
+        self._created_at = {}  # id(conn) -> creation time, for every open connection
+        self._size = 0
+        self._in_use = 0
+        self._refilling = False
+        self._stats = {'created': 0, 'recycled': 0, 'failed_checks': 0, 'checkouts': 0,
+                       'waits': 0, 'wait_time': 0.0, 'timeouts': 0}
+
+    def _open(self):
+        conn = self._connect()
+        with self._cond:
+            self._created_at[id(conn)] = time.monotonic()
+            self._stats['created'] += 1
+        return conn
+
+    def _discard(self, conn):
+        # Caller must hold the lock; closing the socket happens outside of it
+        self._created_at.pop(id(conn), None)
+        self._size -= 1
+        self._cond.notify()
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, created_at, last_used, now):
+        if self.max_lifetime and now - created_at > self.max_lifetime:
+            return True
+        return bool(self.max_idle) and now - last_used > self.max_idle
+
+    def _reap(self, now):
+        # Caller must hold the lock; returns the expired idle connections, to close outside of it.
+        # acquire() takes from the right, so connections idle too long collect on the left. Like
+        # max_lifetime, max_idle closes them, but only while the pool stays at min_size or above.
+        stale = []
+        keep = deque()
+        for entry in self._idle:
+            conn, created_at, last_used = entry
+            if (self.max_lifetime and now - created_at > self.max_lifetime) or (
+                    self.max_idle and now - last_used > self.max_idle and self._size > self.min_size):
+                self._discard(conn)
+                stale.append(conn)
+            else:
+                keep.append(entry)
+        if stale:
+            self._idle = keep
+            self._stats['recycled'] += len(stale)
+        if self._size < self.min_size and not self._refilling:
+            # Recycling shrank the pool below min_size; reopen in the background, not on this request
+            self._refilling = True
+            threading.Thread(target=self._refill, name='db-pool-refill', daemon=True).start()
+        return stale
+
+    def _refill(self):
+        try:
+            self.warm()
+        except Exception as e:
+            log.warning('Could not refill the connection pool to %s: %s', self.min_size, e)
+        finally:
+            with self._cond:
+                self._refilling = False
+
+    def warm(self):
+        # Open connections up to min_size so the first requests skip the handshake
+        while True:
+            with self._cond:
+                if self._size >= min(self.min_size, self.max_size):
+                    return
+                self._size += 1
+            try:
+                conn = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append((conn, self._created_at[id(conn)], time.monotonic()))
+                self._cond.notify()
+
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        wait_started = None
+        while True:
+            conn = None
+            needs_ping = False
+            with self._cond:
+                now = time.monotonic()
+                stale = self._reap(now)
+                if self._idle:
+                    # Most recently used first, so the rest can reach max_idle and be reaped
+                    conn, _, last_used = self._idle.pop()
+                    needs_ping = now - last_used >= self.ping_interval
+                if conn is None and self._size < self.max_size:
+                    self._size += 1
+                    conn = False  # reserved a slot, connect outside the lock
+                if conn is None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        if waited:
+                            self._stats['wait_time'] += now - wait_started
+                        raise PoolTimeoutError(f'No database connection available within {self.timeout}s')
+                    if not waited:
+                        waited = True
+                        wait_started = now
+                        self._stats['waits'] += 1
+                    self._cond.wait(remaining)
+            for candidate in stale:
+                self._close_quietly(candidate)
+            if conn is None:
+                continue
+            if conn is False:
+                try:
+                    conn = self._open()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif needs_ping:
+                # Health check: drop connections the server has closed while they sat idle
+                try:
+                    conn.ping(reconnect=False)
+                except Exception:
+                    with self._cond:
+                        self._discard(conn)
+                        self._stats['failed_checks'] += 1
+                    self._close_quietly(conn)
+                    continue
+            with self._cond:
+                self._in_use += 1
+                self._stats['checkouts'] += 1
+                if waited:
+                    self._stats['wait_time'] += time.monotonic() - wait_started
+            return conn
+
+    def release(self, conn, discard=False):
+        if not discard and getattr(conn, 'server_status', 0) & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+            # Never hand out a connection with a half-finished transaction
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            self._in_use -= 1
+            created_at = self._created_at.get(id(conn))
+            now = time.monotonic()
+            if discard or created_at is None or self._expired(created_at, now, now):
+                self._discard(conn)
+                if not discard:
+                    self._stats['recycled'] += 1
+                stale = [conn]
+            else:
+                self._idle.append((conn, created_at, now))
+                self._cond.notify()
+                stale = []
+            stale += self._reap(now)
+        for conn in stale:
+            self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException as e:
+            # Client-side errors (2000+) mean the socket may be unusable; server errors such as
+            # trigger SIGNALs leave the connection fine to reuse
+            lost = isinstance(e, pymysql.err.InterfaceError) or (
+                isinstance(e, pymysql.err.OperationalError) and e.args and e.args[0] >= 2000)
+            self.release(conn, discard=lost)
+            raise
+        else:
+            self.release(conn)
+
+    def close_all(self):
+        with self._cond:
+            idle = [entry[0] for entry in self._idle]
+            self._idle.clear()
+            for conn in idle:
+                self._discard(conn)
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            })
+        stats['wait_time'] = round(stats['wait_time'], 6)
+        return stats
+
+
+db_pool = ConnectionPool(get_db_connection, **POOL_CONFIG)
+
+# Read replicas as comma-separated host[:port]; same user, password and database as the primary
+DB_REPLICAS = [h.strip() for h in os.environ.get('DB_REPLICAS', '').split(',') if h.strip()]
+# 'round_robin' or 'least_latency'
+DB_REPLICA_STRATEGY = os.environ.get('DB_REPLICA_STRATEGY', 'round_robin')
+# Replicas further behind than this (seconds) get no reads until they catch up
+DB_REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', 5))
+DB_REPLICA_CHECK_INTERVAL = float(os.environ.get('DB_REPLICA_CHECK_INTERVAL', 2))
+# After a session writes, its reads stay on the primary this long (seconds)
+READ_YOUR_WRITES_WINDOW = float(os.environ.get('READ_YOUR_WRITES_WINDOW', DB_REPLICA_MAX_LAG * 2))
+
+
+class Replica:
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.lag = None        # seconds behind the primary at the last check, None = unknown
+        self.healthy = False   # set by the first lag check
+        self.latency = None    # moving average of query time (seconds)
+        self.reads = 0
+        self.errors = 0
+
+
+class ReplicaRouter:
+    """Picks a replica for each read, skipping ones that are down or lag too far behind"""
+
+    def __init__(self, hosts, strategy='round_robin', max_lag=5, check_interval=2, pool_config=None):
+        self.strategy = strategy
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.replicas = []
+        for host in hosts:
+            name, _, port = host.partition(':')
+            config = dict(DB_CONFIG, host=name, port=int(port) if port else 3306)
+            self.replicas.append(Replica(host, ConnectionPool(functools.partial(pymysql.connect, **config),
+                                                               **(pool_config or {}))))
+        self._lock = threading.Lock()
+        self._next = 0
+        self._stats = {'primary_reads': 0, 'replica_reads': 0, 'fallbacks': 0}
+        self._checker = None
+
+    def choose(self):
+        with self._lock:
+            eligible = [r for r in self.replicas
+                        if r.healthy and r.lag is not None and r.lag <= self.max_lag]
+            if not eligible:
+                self._stats['primary_reads'] += 1
+                return None
+            if self.strategy == 'least_latency':
+                # Untried replicas count as fastest so each gets measured
+                replica = min(eligible, key=lambda r: r.latency if r.latency is not None else -1)
+            else:
+                replica = eligible[self._next % len(eligible)]
+                self._next += 1
+            replica.reads += 1
+            self._stats['replica_reads'] += 1
+            return replica
+
+    def observe(self, replica, seconds):
+        with self._lock:
+            replica.latency = seconds if replica.latency is None else replica.latency * 0.8 + seconds * 0.2
+
+    def failed(self, replica):
+        # Taken out of rotation until the next successful lag check
+        with self._lock:
+            replica.healthy = False
+            replica.errors += 1
+            self._stats['fallbacks'] += 1
+
+    def count_primary_read(self):
+        with self._lock:
+            self._stats['primary_reads'] += 1
+
+    def check(self, replica):
+        try:
+            with replica.pool.connection() as conn:
+                with conn.cursor() as cur:
+                    try:
+                        cur.execute('SHOW REPLICA STATUS')
+                    except pymysql.err.ProgrammingError:
+                        cur.execute('SHOW SLAVE STATUS')  # MariaDB and MySQL before 8.0.22
+                    status = cur.fetchone() or {}
+            lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+            with self._lock:
+                # NULL means the replication threads are stopped: the data is of unknown age
+                replica.lag = float(lag) if lag is not None else None
+                replica.healthy = lag is not None
+        except (pymysql.err.MySQLError, PoolTimeoutError) as e:
+            with self._lock:
+                replica.healthy = False
+            log.warning('Replica %s check failed: %s', replica.name, e)
+
+    def start(self):
+        if not self.replicas or (self._checker is not None and self._checker.is_alive()):
+            return
+
+        def run():
+            while True:
+                for replica in self.replicas:
+                    self.check(replica)
+                time.sleep(self.check_interval)
+
+        self._checker = threading.Thread(target=run, name='replica-lag-check', daemon=True)
+        self._checker.start()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['replicas'] = [{'name': r.name, 'healthy': r.healthy, 'lag': r.lag, 'reads': r.reads,
+                                  'errors': r.errors,
+                                  'latency_ms': round(r.latency * 1000, 3) if r.latency is not None else None}
+                                 for r in self.replicas]
+        stats['healthy_replicas'] = sum(1 for r in stats['replicas'] if r['healthy'])
+        return stats
+
+
+replica_router = ReplicaRouter(DB_REPLICAS, strategy=DB_REPLICA_STRATEGY, max_lag=DB_REPLICA_MAX_LAG,
+                               check_interval=DB_REPLICA_CHECK_INTERVAL,
+                               pool_config=dict(POOL_CONFIG, min_size=0))
+replica_router.start()
+
+# Set once the current request has written, so its remaining reads see those writes
+_wrote = contextvars.ContextVar('wrote', default=False)
+
+
+def note_write():
+    _wrote.set(True)
+
+
+def pinned_to_primary():
+    if _wrote.get():
+        return True
+    if has_request_context():
+        return session.get('_wrote_at', 0) > time.time() - READ_YOUR_WRITES_WINDOW
+    return False
+
+
+# Reads that fill a cache (dashboard, room index, summary) or guard a write use primary=True:
+# a stale replica row would otherwise be cached or checked against long after the lag is gone
+def read_replica(primary=False):
+    """Replica for the next read, or None for the primary"""
+    if not replica_router.replicas:
+        return None
+    if primary or pinned_to_primary():
+        replica_router.count_primary_read()
+        return None
+    return replica_router.choose()
+
+
+@db_timed
+def query(sql, params=None, primary=False):
+    """Read rows; goes to a replica unless primary=True or this session has just written"""
+    replica = read_replica(primary)
+    if replica is not None:
+        started = time.perf_counter()
+        try:
+            with replica.pool.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(sql, params or ())
+                    rows = cur.fetchall()
+            replica_router.observe(replica, time.perf_counter() - started)
+            return rows
+        except (pymysql.err.InterfaceError, pymysql.err.OperationalError, PoolTimeoutError) as e:
+            if isinstance(e, pymysql.err.OperationalError) and e.args and e.args[0] < 2000:
+                raise  # a server-side error would fail on the primary too
+            replica_router.failed(replica)
+            log.warning('Replica %s read failed, using the primary: %s', replica.name, e)
+    with db_pool.connection() as conn:
         with conn.cursor() as cur:
             cur.execute(sql, params or ())
             return cur.fetchall()
-    finally:
-        conn.close()
+
+
+class SchemaCache:
+    """Table columns read once from information_schema and served from memory"""
+
+    def __init__(self, database):
+        self.database = database
+        self._lock = threading.Lock()
+        self._columns = None  # lower-cased table name -> column names in ordinal order
+        self._primary_keys = {}  # lower-cased table name -> primary key columns
+        self._not_null = {}  # lower-cased table name -> set of NOT NULL columns
+        self.loaded_at = None
+
+    def refresh(self):
+        rows = query(
+            'SELECT TABLE_NAME, COLUMN_NAME, COLUMN_KEY, IS_NULLABLE FROM information_schema.columns '
+            'WHERE table_schema = %s ORDER BY TABLE_NAME, ORDINAL_POSITION',
+            (self.database,), primary=True)
+        columns, primary_keys, not_null = {}, {}, {}
+        for row in rows:
+            table = row['TABLE_NAME'].lower()
+            columns.setdefault(table, []).append(row['COLUMN_NAME'])
+            if row.get('COLUMN_KEY') == 'PRI':
+                primary_keys.setdefault(table, []).append(row['COLUMN_NAME'])
+            if row.get('IS_NULLABLE') == 'NO':
+                not_null.setdefault(table, set()).add(row['COLUMN_NAME'])
+        with self._lock:
+            self._columns = columns
+            self._primary_keys = primary_keys
+            self._not_null = not_null
+            self.loaded_at = time.time()
+        return columns
+
+    def _loaded(self):
+        if self._columns is None:
+            try:
+                self.refresh()
+            except Exception:
+                # DB unavailable - try again on the next call instead of caching nothing
+                return False
+        return True
+
+    def columns(self, table):
+        if not self._loaded():
+            return []
+        return self._columns.get(table.lower(), [])
+
+    def primary_key(self, table):
+        if not self._loaded():
+            return []
+        return self._primary_keys.get(table.lower(), [])
+
+    def not_null_columns(self, table):
+        if not self._loaded():
+            return set()
+        return self._not_null.get(table.lower(), set())
+
+    def tables(self):
+        return sorted(self._columns or {})
+
+    def fees_column(self):
+        # prefer FeesPaid, fall back to Amount
+        cols = self.columns('FeesInfo')
+        for col in ('FeesPaid', 'Amount'):
+            if col in cols:
+                return col
+        return None
+
+    def room_id_column(self):
+        # roominfo has had several spellings of its id column; RoomNo when none exists
+        cols = self.columns('roominfo')
+        for col in ('Room_id', 'room_id', 'Roomid', 'roomid', 'RoomID'):
+            if col in cols:
+                return col
+        return 'RoomNo'
+
+
+schema_cache = SchemaCache(DB_CONFIG['database'])
 
 
 def detect_fees_column():
     # return the column name to use for fees in FeesInfo (prefer FeesPaid, fall back to Amount)
+    return schema_cache.fees_column()
+
+
+# Distinct studentinfo INSERT/UPDATE shapes kept as ready-made SQL
+STATEMENT_CACHE_SIZE = int(os.environ.get('STATEMENT_CACHE_SIZE', 256))
+
+
+class StatementCache:
+    """LRU of SQL text per statement shape, so each column set is formatted once"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def get(self, key, build):
+        with self._lock:
+            sql = self._entries.get(key)
+            if sql is not None:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return sql
+            self._stats['misses'] += 1
+        sql = build()
+        with self._lock:
+            self._entries[key] = sql
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return sql
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, size=len(self._entries), max_size=self.max_entries)
+
+
+statement_cache = StatementCache(STATEMENT_CACHE_SIZE)
+
+
+# Set by MySQL whenever a row changes (sql_scripts/change_log.sql), never from a request body
+ROW_UPDATED_COLUMN = 'updated_at'
+
+
+def studentinfo_fields(data, protected=()):
+    """Body keys as studentinfo columns in table order, None if the schema is unavailable.
+
+    Raises ValueError for keys that are not columns, or are protected columns.
+    """
+    columns = schema_cache.columns('studentinfo')
+    if not columns:
+        return None
+    unknown = [k for k in data if k not in columns]
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(map(str, unknown))}')
+    locked = [k for k in data if k in protected or k == ROW_UPDATED_COLUMN]
+    if locked:
+        raise ValueError(f'Fields cannot be changed: {", ".join(locked)}')
+    # Table order makes {a, b} and {b, a} the same shape
+    return tuple(col for col in columns if col in data)
+
+
+def studentinfo_sql(kind, fields):
+    """SQL for whitelisted studentinfo columns, from the cache.
+
+    kind is 'insert', 'update' (WHERE StudentId = %s) or 'update_many' (WHERE StudentId IN %s, given a tuple).
+    """
+    def build():
+        if kind == 'insert':
+            return (f'INSERT INTO studentinfo ({", ".join(f"`{f}`" for f in fields)}) '
+                    f'VALUES ({", ".join(["%s"] * len(fields))})')
+        where = 'StudentId IN %s' if kind == 'update_many' else 'StudentId = %s'
+        return f'UPDATE studentinfo SET {", ".join(f"`{f}` = %s" for f in fields)} WHERE {where}'
+    return statement_cache.get((kind, fields), build)
+
+
+class TableVersions:
+    """Per-table write counters, used as ETags for the public reference tables"""
+
+    shared = False  # True when every worker process sees the same counters
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Process start marker, so tags from another process or an earlier run never match
+        self._boot = f'{os.getpid():x}{int(time.time()):x}'
+        self._started = time.time()
+        self._generation = 0  # moved by bump_all, invalidates every table at once
+        self._versions = {}  # lower-cased table name -> (version, last modified timestamp)
+
+    def bump(self, *tables):
+        now = time.time()
+        with self._lock:
+            for table in tables:
+                version = self._versions.get(table.lower(), (0, now))[0]
+                self._versions[table.lower()] = (version + 1, now)
+
+    def bump_all(self):
+        with self._lock:
+            self._generation += 1
+            self._started = time.time()
+            self._versions = {table: (version, self._started) for table, (version, _) in self._versions.items()}
+
+    def get(self, table):
+        return self._versions.get(table.lower(), (0, self._started))
+
+    def stamp(self, *names):
+        """Generation plus the version of each name; changes whenever any of them is bumped"""
+        with self._lock:
+            return (self._generation,) + tuple(self._versions.get(name.lower(), (0,))[0] for name in names)
+
+    def etag(self, table, variant=''):
+        version, _ = self.get(table)
+        tag = f'{table.lower()}-{self._boot}-{self._generation}-{version}'
+        return f'{tag}-{variant}' if variant else tag
+
+
+class SQLiteTableVersions(TableVersions):
+    """TableVersions kept in a SQLite file, so every worker process hands out and honours the same ETags"""
+
+    shared = True
+    # Reserved rows: the generation (as its version) and the marker of the current launch
+    GENERATION, BOOT = '', '.boot'
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS table_versions (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                modified REAL NOT NULL
+            )
+        ''')
+        now = time.time()
+        conn.executemany('INSERT OR IGNORE INTO table_versions (name, version, modified) VALUES (?, ?, ?)',
+                         [(self.GENERATION, 0, now), (self.BOOT, int(now), now)])
+        # The first process to open the file sets the marker; the others adopt it
+        boot = conn.execute('SELECT version FROM table_versions WHERE name = ?', (self.BOOT,)).fetchone()[0]
+        self._boot = f'{boot:x}'
+
+    def _conn(self):
+        # sqlite3 connections must stay on the thread that opened them
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _rows(self, names):
+        placeholders = ', '.join('?' * (len(names) + 1))
+        rows = self._conn().execute(
+            f'SELECT name, version, modified FROM table_versions WHERE name IN ({placeholders})',
+            (self.GENERATION, *names)).fetchall()
+        return {name: (version, modified) for name, version, modified in rows}
+
+    def bump(self, *tables):
+        now = time.time()
+        self._conn().executemany(
+            'INSERT INTO table_versions (name, version, modified) VALUES (?, 1, ?) '
+            'ON CONFLICT(name) DO UPDATE SET version = version + 1, modified = excluded.modified',
+            [(table.lower(), now) for table in tables])
+
+    def bump_all(self):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('UPDATE table_versions SET version = version + 1 WHERE name = ?', (self.GENERATION,))
+            conn.execute('UPDATE table_versions SET modified = ? WHERE name != ?', (time.time(), self.BOOT))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get(self, table):
+        rows = self._rows([table.lower()])
+        return rows.get(table.lower(), (0, rows[self.GENERATION][1]))
+
+    def stamp(self, *names):
+        keys = [name.lower() for name in names]
+        rows = self._rows(keys)
+        return (rows[self.GENERATION][0],) + tuple(rows.get(key, (0,))[0] for key in keys)
+
+    def etag(self, table, variant=''):
+        rows = self._rows([table.lower()])
+        version = rows.get(table.lower(), (0,))[0]
+        tag = f'{table.lower()}-{self._boot}-{rows[self.GENERATION][0]}-{version}'
+        return f'{tag}-{variant}' if variant else tag
+
+
+# Shared counters for multi-process servers; gunicorn.conf.py sets this for its workers
+TABLE_VERSIONS_PATH = os.environ.get('TABLE_VERSIONS_PATH')
+table_versions = SQLiteTableVersions(TABLE_VERSIONS_PATH) if TABLE_VERSIONS_PATH else TableVersions()
+
+# Tables each write path can change (directly, through procedures or through triggers)
+STUDENT_WRITE_TABLES = ('studentinfo', 'feesinfo', 'login', 'roominfo', 'blockinfo', 'messinfo')
+ROOM_WRITE_TABLES = ('studentinfo', 'roominfo', 'blockinfo', 'messinfo')
+
+
+def refresh_schema_cache(bump=True):
+    # Call after running migrations from sql_scripts/ so column lookups see the new schema
     try:
-        cols = query("SELECT COLUMN_NAME FROM information_schema.columns WHERE table_schema = %s AND table_name = %s AND COLUMN_NAME IN ('FeesPaid','Amount')", (DB_CONFIG['database'], 'FeesInfo'))
-        if cols:
-            return cols[0].get('COLUMN_NAME')
-    except Exception:
-        pass
-    return None
+        schema_cache.refresh()
+        # A migration may have rewritten data too, so cached representations are stale
+        if bump:
+            table_versions.bump_all()
+        room_index.invalidate()
+        statement_cache.clear()
+        return True
+    except pymysql.err.MySQLError as e:
+        log.warning('Schema refresh failed: %s', e)
+        return False
 
 
+# Reported by /api/ready; a worker is warm once its pool is open and the schema is loaded
+warm_state = {'warm': False, 'pool': False, 'schema': False, 'warmed_at': None, 'attempts': 0}
+_warm_lock = threading.Lock()
+
+
+def warm_up():
+    """Pre-open pool connections and load the schema cache; run before a process takes traffic"""
+    with _warm_lock:
+        started = time.perf_counter()
+        warm_state['attempts'] += 1
+        if not warm_state['pool']:
+            try:
+                db_pool.warm()
+                warm_state['pool'] = True
+            except pymysql.err.MySQLError as e:
+                log.warning('Could not pre-open connections: %s', e)
+        if not warm_state['schema']:
+            # Started workers share ETags with the running ones, so loading the schema must not reset them
+            warm_state['schema'] = refresh_schema_cache(bump=False)
+        warm_state['warm'] = warm_state['pool'] and warm_state['schema']
+        if warm_state['warm'] and warm_state['warmed_at'] is None:
+            warm_state['warmed_at'] = time.time()
+            log.info('Worker warm', extra={'pid': os.getpid(),
+                                           'warmup_ms': round((time.perf_counter() - started) * 1000, 1)})
+        return warm_state['warm']
+
+
+@db_timed
 def execute(sql, params=None):
-    conn = get_db_connection()
-    try:
+    note_write()
+    with db_pool.connection() as conn:
         with conn.cursor() as cur:
             cur.execute(sql, params or ())
             return cur.lastrowid
-    finally:
-        conn.close()
 
 
+@db_timed
 def call_procedure(proc_name, params=None):
     """Call a stored procedure"""
-    conn = get_db_connection()
-    try:
+    note_write()
+    with db_pool.connection() as conn:
         with conn.cursor() as cur:
             cur.callproc(proc_name, params or ())
             conn.commit()
-    finally:
-        conn.close()
+
+
+class UnitOfWork:
+    """Statements of one request on a single connection, committed once at the end"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = None  # rows affected by the last execute()
+
+    @db_timed
+    def query(self, sql, params=None):
+        with self.conn.cursor() as cur:
+            cur.execute(sql, params or ())
+            return cur.fetchall()
+
+    @db_timed
+    def execute(self, sql, params=None):
+        with self.conn.cursor() as cur:
+            cur.execute(sql, params or ())
+            self.rowcount = cur.rowcount
+            return cur.lastrowid
+
+    @db_timed
+    def executemany(self, sql, seq_of_params):
+        with self.conn.cursor() as cur:
+            return cur.executemany(sql, seq_of_params)
+
+    @db_timed
+    def call_procedure(self, proc_name, params=None):
+        # No commit here - the procedure's writes land with the rest of the unit
+        with self.conn.cursor() as cur:
+            cur.callproc(proc_name, params or ())
+
+
+@contextmanager
+def unit_of_work():
+    """One pooled connection and one transaction: commit on success, roll back on any error"""
+    note_write()
+    with db_pool.connection() as conn:
+        conn.begin()
+        try:
+            yield UnitOfWork(conn)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+# Total hostel fees per student; fn_remaining_fees in MySQL still has 50000 built in
+TOTAL_FEES = float(os.environ.get('TOTAL_FEES', 50000))
+
+# Seconds a student's dashboard row stays cached; write paths invalidate it earlier
+DASHBOARD_CACHE_TTL = float(os.environ.get('DASHBOARD_CACHE_TTL', 60))
+
+
+class TTLCache:
+    """Small thread-safe in-process LRU cache with per-entry expiry"""
+
+    def __init__(self, ttl, max_entries=10000, versions=None, name=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # With a shared TableVersions, invalidations made in other worker processes drop entries here too
+        self.versions = versions
+        self.name = name
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # least recently used first
+
+    def _stamp(self, key):
+        return self.versions.stamp(self.name, f'{self.name}:{key}') if self.versions else None
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        if self.versions and entry[2] != self._stamp(key):
+            self._drop(key)
+            return None
+        return entry[0]
+
+    def set(self, key, value):
+        stamp = self._stamp(key)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl, stamp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _drop(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def invalidate(self, key=None):
+        self._drop(key)
+        if self.versions:
+            self.versions.bump(self.name if key is None else f'{self.name}:{key}')
+
+
+dashboard_cache = TTLCache(DASHBOARD_CACHE_TTL, versions=table_versions if table_versions.shared else None,
+                           name='dashboard')
+
+
+def first_value(row, names):
+    for name in names:
+        if row.get(name):
+            return row[name]
+    return None
+
+
+def dashboard_sql():
+    # Student profile, room, block, mess and fees from one JOIN
+    room_id_col = schema_cache.room_id_column()
+    fees_col = detect_fees_column()
+    select = ['s.*']
+    for alias, table in (('r', 'roominfo'), ('b', 'blockinfo'), ('m', 'messinfo')):
+        # Vacancy changes with other students' writes, so it is left out of the cached row
+        select += [f'{alias}.{col} AS `{alias}__{col}`' for col in schema_cache.columns(table) if col != 'Vacancy']
+    joins = [
+        f'LEFT JOIN roominfo r ON r.{room_id_col} = s.RoomId',
+        'LEFT JOIN blockinfo b ON b.HostelId = s.StHostelId',
+        'LEFT JOIN messinfo m ON m.MessId = s.MessId',
+    ]
+    if fees_col:
+        select.append(f'f.{fees_col} AS `f__FeesPaid`')
+        joins.append('LEFT JOIN FeesInfo f ON f.StudentId = s.StudentId')
+    return f'''
+        SELECT {', '.join(select)}
+        FROM studentinfo s
+        {' '.join(joins)}
+        WHERE s.StudentId = %s
+        LIMIT 1
+    '''
+
+
+def load_student_dashboard(student_id):
+    # Cached per student; write paths invalidate the entry
+    cached = dashboard_cache.get(student_id)
+    if cached is not None:
+        return cached
+    rows = query(dashboard_sql(), (student_id,), primary=True)
+    if not rows:
+        return None
+    return build_dashboard(student_id, rows[0])
+
+
+def build_dashboard(student_id, row):
+    """Split the dashboard row into its parts and cache the result"""
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug('Dashboard row', extra={'student_id': student_id, 'row': {k: v for k, v in row.items() if k != 'Password'}})
+
+    parts = {'r': {}, 'b': {}, 'm': {}, 'f': {}}
+    profile = {}
+    for key, value in row.items():
+        alias, sep, col = key.partition('__')
+        if sep and alias in parts:
+            parts[alias][col] = value
+        else:
+            profile[key] = value
+
+    room = parts['r'] if any(v is not None for v in parts['r'].values()) else None
+    block = parts['b'] if any(v is not None for v in parts['b'].values()) else None
+    mess = parts['m'] if any(v is not None for v in parts['m'].values()) else None
+
+    if profile.get('RoomId'):
+        room_no = first_value(room or {}, ('RoomNo', 'Room_No', 'Roomno', 'room_no'))
+        profile['RoomNo'] = str(room_no or profile.get('RoomId'))
+    else:
+        profile['RoomNo'] = 'Not assigned'
+    if block:
+        # Use 'Type' column as block name if BlockName doesn't exist
+        block['BlockName'] = first_value(block, ('BlockName', 'Block_Name', 'Blockname', 'block_name', 'Type'))
+    profile['BlockName'] = (block and block['BlockName']) or 'Not assigned'
+
+    try:
+        fees_paid = float(parts['f'].get('FeesPaid') or 0)
+    except (TypeError, ValueError):
+        fees_paid = 0
+    fees = {
+        'FeesPaid': fees_paid,
+        'FeesRemaining': float(max(TOTAL_FEES - fees_paid, 0)),
+        'TotalFees': TOTAL_FEES,
+    }
+
+    data = {'profile': profile, 'room': room, 'block': block, 'mess': mess, 'fees': fees}
+    dashboard_cache.set(student_id, data)
+    return data
+
+
+# studentinfo columns returned alongside each balance, when the table has them
+OUTSTANDING_FIELDS = ('Firstname', 'Lastname', 'Dept', 'Year', 'StHostelId', 'RoomId')
+
+
+def outstanding_fees(student_ids=None, min_balance=0.01, hostel_id=None, limit=None, uow=None):
+    """Remaining fees for every student (or just student_ids) in one scan, largest balance first"""
+    fees_col = detect_fees_column() or 'FeesPaid'
+    paid = f'COALESCE(f.{fees_col}, 0)'
+    fields = [f's.{c}' for c in OUTSTANDING_FIELDS if c in schema_cache.columns('studentinfo')]
+    where, params = [f'GREATEST(%s - {paid}, 0) >= %s'], [TOTAL_FEES, TOTAL_FEES, min_balance]
+    if student_ids is not None:
+        if not student_ids:
+            return []
+        where.append(f"s.StudentId IN ({', '.join(['%s'] * len(student_ids))})")
+        params.extend(student_ids)
+    if hostel_id is not None:
+        where.append('s.StHostelId = %s')
+        params.append(hostel_id)
+    sql = (f'SELECT {", ".join(["s.StudentId"] + fields)}, {paid} AS FeesPaid, '
+           f'GREATEST(%s - {paid}, 0) AS FeesRemaining '
+           f'FROM studentinfo s LEFT JOIN FeesInfo f ON f.StudentId = s.StudentId '
+           f'WHERE {" AND ".join(where)} ORDER BY FeesRemaining DESC, s.StudentId')
+    if limit is not None:
+        sql += ' LIMIT %s'
+        params.append(limit)
+    rows = (uow.query if uow is not None else query)(sql, tuple(params))
+    for row in rows:
+        row['FeesPaid'] = float(row['FeesPaid'])
+        row['FeesRemaining'] = float(row['FeesRemaining'])
+    return rows
+
+
+# Seconds /api/summary may serve its in-process copy when no write went through this process
+SUMMARY_CACHE_TTL = float(os.environ.get('SUMMARY_CACHE_TTL', 5))
+# Tables whose triggers maintain hostel_summary (see sql_scripts/hostel_summary.sql)
+SUMMARY_SOURCES = ('studentinfo', 'feesinfo', 'roominfo')
+SUMMARY_SCOPES = {'total': 'total', 'hostel': 'hostels', 'block': 'blocks', 'mess': 'messes'}
+
+summary_cache = TTLCache(SUMMARY_CACHE_TTL, max_entries=4)
+
+
+SUMMARY_COLUMNS = ('Students', 'FeesCollected', 'FeesOutstanding', 'FreeBeds')
+
+
+def summary_from_rows(rows):
+    summary = {name: [] for name in SUMMARY_SCOPES.values()}
+    summary['total'] = {'Students': 0, 'FeesCollected': 0.0, 'FeesOutstanding': 0.0, 'FreeBeds': 0}
+    for row in rows:
+        entry = {'Students': int(row['Students']), 'FeesCollected': float(row['FeesCollected']),
+                 'FeesOutstanding': float(row['FeesOutstanding']), 'FreeBeds': int(row['FreeBeds'])}
+        if row['Scope'] == 'total':
+            summary['total'] = entry
+        elif row['Scope'] in SUMMARY_SCOPES:
+            summary[SUMMARY_SCOPES[row['Scope']]].append({'Id': row['ScopeId'], **entry})
+    summary['total']['TotalFees'] = TOTAL_FEES
+    return summary
+
+
+def load_summary():
+    """The hostel_summary rows, re-read only after a write or once the TTL passes"""
+    key = tuple(table_versions.etag(t) for t in SUMMARY_SOURCES)
+    cached = summary_cache.get(key)
+    if cached is not None:
+        return cached
+    rows = query(f'SELECT Scope, ScopeId, {", ".join(SUMMARY_COLUMNS)} FROM hostel_summary', primary=True)
+    due = query("SELECT Value FROM hostel_summary_settings WHERE Name = 'TotalFees'", primary=True)
+    if not due or float(due[0]['Value']) != TOTAL_FEES:
+        log.warning('hostel_summary counts fees owed against %s, not TOTAL_FEES=%s; run rebuild-summary',
+                    due[0]['Value'] if due else None, TOTAL_FEES)
+    summary = summary_from_rows(rows)
+    summary_cache.set(key, summary)
+    return summary
+
+
+SUMMARY_TABLE_DDL = (
+    """
+    CREATE TABLE IF NOT EXISTS hostel_summary (
+        Scope VARCHAR(8) NOT NULL,
+        ScopeId INT NOT NULL,
+        Students INT NOT NULL DEFAULT 0,
+        FeesCollected DECIMAL(12,2) NOT NULL DEFAULT 0,
+        FeesOutstanding DECIMAL(12,2) NOT NULL DEFAULT 0,
+        FreeBeds INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (Scope, ScopeId)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS hostel_summary_settings (
+        Name VARCHAR(32) PRIMARY KEY,
+        Value DECIMAL(12,2) NOT NULL
+    )
+    """,
+)
+
+
+def rebuild_summary(check_only=False):
+    """Recompute hostel_summary from the source tables; returns the rows that had drifted"""
+    fees_col = detect_fees_column() or 'FeesPaid'
+    room_col = 'BlockId' if 'BlockId' in schema_cache.columns('roominfo') else None
+    # DDL commits implicitly, so it runs before the transaction
+    for ddl in SUMMARY_TABLE_DDL:
+        execute(ddl)
+    if not query("SELECT 1 FROM information_schema.columns WHERE table_schema = DATABASE() "
+                 "AND table_name = 'hostel_summary' AND column_name = 'FeesOutstanding'", primary=True):
+        execute('ALTER TABLE hostel_summary ADD COLUMN FeesOutstanding DECIMAL(12,2) NOT NULL DEFAULT 0 AFTER FeesCollected')
+    columns = ', '.join(SUMMARY_COLUMNS)
+    with unit_of_work() as uow:
+        current = {(r['Scope'], r['ScopeId']): r for r in
+                   uow.query(f'SELECT Scope, ScopeId, {columns} FROM hostel_summary FOR UPDATE')}
+        fresh = {}
+
+        def add(scope, scope_id, column, value):
+            if scope_id is None:
+                return
+            row = fresh.setdefault((scope, scope_id), dict.fromkeys(SUMMARY_COLUMNS, 0))
+            row[column] += value
+
+        # Shared locks keep the sources still until the new rows are written.
+        # Owed is worked out as in outstanding_fees() and fn_summary_outstanding().
+        paid = f'COALESCE(f.{fees_col}, 0)'
+        for row in uow.query(f'SELECT s.StHostelId, s.MessId, COUNT(*) AS Students, COALESCE(SUM(f.{fees_col}), 0) AS Paid, '
+                             f'COALESCE(SUM(GREATEST(%s - {paid}, 0)), 0) AS Owed '
+                             f'FROM studentinfo s LEFT JOIN FeesInfo f ON f.StudentId = s.StudentId '
+                             f'GROUP BY s.StHostelId, s.MessId LOCK IN SHARE MODE', (TOTAL_FEES,)):
+            for scope, scope_id in (('total', 0), ('hostel', row['StHostelId']), ('mess', row['MessId'])):
+                add(scope, scope_id, 'Students', row['Students'])
+                add(scope, scope_id, 'FeesOutstanding', row['Owed'])
+                if scope != 'mess':
+                    add(scope, scope_id, 'FeesCollected', row['Paid'])
+        block_select = f'{room_col} AS BlockId' if room_col else 'NULL AS BlockId'
+        for row in uow.query(f'SELECT {block_select}, COALESCE(SUM(Vacancy), 0) AS FreeBeds FROM roominfo '
+                             f'GROUP BY 1 LOCK IN SHARE MODE'):
+            add('total', 0, 'FreeBeds', row['FreeBeds'])
+            add('block', row['BlockId'], 'FreeBeds', row['FreeBeds'])
+        fresh.setdefault(('total', 0), dict.fromkeys(SUMMARY_COLUMNS, 0))
+
+        drift = []
+        for key in sorted(set(current) | set(fresh), key=str):
+            was = current.get(key) or {}
+            now = fresh.get(key, dict.fromkeys(SUMMARY_COLUMNS, 0))
+            if any(float(was.get(c) or 0) != float(now[c]) for c in SUMMARY_COLUMNS):
+                drift.append({'Scope': key[0], 'ScopeId': key[1],
+                              'stored': {c: float(was[c]) for c in now} if was else None,
+                              'actual': {c: float(v) for c, v in now.items()}})
+        if not check_only:
+            # The triggers count what is owed against this from now on
+            uow.execute("INSERT INTO hostel_summary_settings (Name, Value) VALUES ('TotalFees', %s) "
+                        "ON DUPLICATE KEY UPDATE Value = VALUES(Value)", (TOTAL_FEES,))
+        if drift and not check_only:
+            uow.execute('DELETE FROM hostel_summary')
+            uow.executemany(f'INSERT INTO hostel_summary (Scope, ScopeId, {columns}) '
+                            f'VALUES (%s, %s, {", ".join(["%s"] * len(SUMMARY_COLUMNS))})',
+                            [(scope, scope_id, *(r[c] for c in SUMMARY_COLUMNS))
+                             for (scope, scope_id), r in fresh.items()])
+    summary_cache.invalidate()
+    return drift
+
+
+# Extra roominfo columns (e.g. Type, Floor) the room index groups by, after the block column
+ROOM_INDEX_GROUP_BY = [c.strip() for c in os.environ.get('ROOM_INDEX_GROUP_BY', '').split(',') if c.strip()]
+# Seconds before the room index is reloaded in full, to pick up changes made outside this process
+ROOM_INDEX_TTL = float(os.environ.get('ROOM_INDEX_TTL', 300))
+
+
+class RoomIndex:
+    """Free beds per room, grouped by block, kept sorted so a best-fit room is a bisect away"""
+
+    def __init__(self, ttl=300, group_by=()):
+        self.ttl = ttl
+        self.group_by = list(group_by)
+        self._lock = threading.RLock()
+        self._groups = {}  # group key -> sorted list of (vacancy, room_no)
+        self._rooms = {}   # room_no -> (group key, vacancy)
+        self._columns = []  # roominfo columns that make up the group key
+        self.loaded_at = None
+
+    def _key_columns(self):
+        cols = schema_cache.columns('roominfo')
+        block_col = next((c for c in ('BlockId', 'HostelId', 'StHostelId') if c in cols), None)
+        return ([block_col] if block_col else []) + [c for c in self.group_by if c in cols]
+
+    def load(self):
+        columns = self._key_columns()
+        room_col = schema_cache.room_id_column()
+        select = ', '.join([f'{room_col} AS RoomNo', 'Vacancy'] + columns)
+        rows = query(f'SELECT {select} FROM roominfo', primary=True)
+        groups, rooms = {}, {}
+        for row in rows:
+            key = tuple(row[c] for c in columns)
+            vacancy = row['Vacancy'] or 0
+            groups.setdefault(key, []).append((vacancy, row['RoomNo']))
+            rooms[row['RoomNo']] = (key, vacancy)
+        for entries in groups.values():
+            entries.sort()
+        with self._lock:
+            self._columns, self._groups, self._rooms = columns, groups, rooms
+            self.loaded_at = time.monotonic()
+
+    @property
+    def key_columns(self):
+        return list(self._columns)
+
+    def invalidate(self):
+        with self._lock:
+            self.loaded_at = None
+
+    def _ensure_loaded(self):
+        if self.loaded_at is None or time.monotonic() - self.loaded_at > self.ttl:
+            self.load()
+
+    def _set(self, room_no, vacancy):
+        # Caller holds the lock; move one room to its new place in the group's order
+        key, old = self._rooms[room_no]
+        entries = self._groups[key]
+        i = bisect.bisect_left(entries, (old, room_no))
+        if i < len(entries) and entries[i] == (old, room_no):
+            del entries[i]
+        bisect.insort(entries, (vacancy, room_no))
+        self._rooms[room_no] = (key, vacancy)
+
+    def _matching_groups(self, block, filters):
+        if not self._columns:
+            return list(self._groups)
+        wanted = dict(filters)
+        if block is not None:
+            wanted[self._columns[0]] = block
+        if all(c in wanted for c in self._columns):
+            key = tuple(wanted[c] for c in self._columns)
+            return [key] if key in self._groups else []
+        return [key for key in self._groups
+                if all(wanted.get(c, v) == v for c, v in zip(self._columns, key))]
+
+    def take(self, block=None, spread=False, exclude=None, **filters):
+        # Reserve one bed: best fit is the fullest room that still has space, spread the emptiest
+        self._ensure_loaded()
+        with self._lock:
+            best = None
+            for key in self._matching_groups(block, filters):
+                entries = self._groups[key]
+                if spread:
+                    candidates = reversed(entries)
+                else:
+                    candidates = entries[bisect.bisect_left(entries, (1,)):]
+                for vacancy, room_no in candidates:
+                    if vacancy < 1:
+                        break
+                    if room_no == exclude:
+                        continue
+                    if best is None or (vacancy > best[0] if spread else vacancy < best[0]):
+                        best = (vacancy, room_no, key)
+                    break
+            if best is None:
+                return None
+            vacancy, room_no, key = best
+            self._set(room_no, vacancy - 1)
+            return {'RoomNo': room_no, **dict(zip(self._columns, key))}
+
+    def adjust(self, room_no, delta):
+        with self._lock:
+            if room_no in self._rooms:
+                self._set(room_no, self._rooms[room_no][1] + delta)
+
+    def refresh_rooms(self, room_nos):
+        # Re-read a few rooms after a write whose effect on Vacancy is not known here
+        room_nos = [r for r in set(room_nos) if r is not None]
+        if not room_nos or self.loaded_at is None:
+            return
+        room_col = schema_cache.room_id_column()
+        placeholders = ', '.join(['%s'] * len(room_nos))
+        rows = query(f'SELECT {room_col} AS RoomNo, Vacancy FROM roominfo WHERE {room_col} IN ({placeholders})', tuple(room_nos), primary=True)
+        with self._lock:
+            for row in rows:
+                if row['RoomNo'] in self._rooms:
+                    self._set(row['RoomNo'], row['Vacancy'] or 0)
+                else:
+                    # A room added since the last load; pick it up with the next full load
+                    self.loaded_at = None
+            # Rooms deleted since the last load must not be offered again
+            for room_no in set(room_nos) - {row['RoomNo'] for row in rows}:
+                if room_no in self._rooms:
+                    self._set(room_no, 0)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rooms': len(self._rooms),
+                'groups': len(self._groups),
+                'free_beds': sum(max(v, 0) for _, v in self._rooms.values()),
+                'rooms_with_space': sum(1 for _, v in self._rooms.values() if v > 0),
+            }
+
+
+room_index = RoomIndex(ttl=ROOM_INDEX_TTL, group_by=ROOM_INDEX_GROUP_BY)
+
+
+# Page sizes for the table endpoints
+TABLE_PAGE_DEFAULT = int(os.environ.get('TABLE_PAGE_DEFAULT', 1000))
+TABLE_PAGE_MAX = int(os.environ.get('TABLE_PAGE_MAX', 5000))
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, default=str, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        return json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+
+def parse_page_args(table, args, default_limit=TABLE_PAGE_DEFAULT, max_limit=TABLE_PAGE_MAX):
+    # Validate limit/after/fields/order against the cached schema of the table
+    columns = schema_cache.columns(table)
+    if not columns:
+        raise ValueError('Table schema unavailable')
+
+    limit = args.get('limit', default_limit)
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError('limit must be a number')
+        if limit < 1 or (max_limit and limit > max_limit):
+            raise ValueError(f'limit must be between 1 and {max_limit}')
+
+    key = schema_cache.primary_key(table)
+    order = args.get('order') or ''
+    descending = order.startswith('-')
+    order_col = order.lstrip('-')
+    if order_col:
+        # Only NOT NULL columns can sit in a keyset cursor; NULLs break the row comparison
+        if order_col not in key and order_col not in schema_cache.not_null_columns(table):
+            raise ValueError(f'Cannot order by {order_col}')
+        if not key:
+            raise ValueError(f'{table} has no primary key to order by')
+    sort_cols = ([order_col] if order_col and order_col not in key else []) + key
+
+    fields = None
+    if args.get('fields'):
+        fields = [f.strip() for f in args['fields'].split(',') if f.strip()]
+        unknown = [f for f in fields if f not in columns]
+        if unknown:
+            raise ValueError(f'Unknown fields: {", ".join(unknown)}')
+        # The cursor is built from the sort columns, so they are always returned
+        fields += [c for c in sort_cols if c not in fields]
+
+    after = None
+    if args.get('after'):
+        after = decode_cursor(args['after'])
+        if sort_cols and (not isinstance(after, list) or len(after) != len(sort_cols)):
+            raise ValueError('Invalid cursor')
+        if not sort_cols and not isinstance(after, int):
+            raise ValueError('Invalid cursor')
+
+    return {'limit': limit, 'fields': fields, 'sort_cols': sort_cols,
+            'descending': descending, 'after': after}
+
+
+def page_sql(table, page, extra_select=(), joins='', fetch_extra=0):
+    sort_cols = page['sort_cols']
+    select = ', '.join(f't.`{c}`' for c in page['fields']) if page['fields'] else 't.*'
+    select = ', '.join([select, *extra_select])
+    sql = f'SELECT {select} FROM {table} t {joins}'
+    params = []
+    limit = page['limit'] + fetch_extra if page['limit'] else None
+    if sort_cols:
+        direction = 'DESC' if page['descending'] else 'ASC'
+        if page['after'] is not None:
+            cols = ', '.join(f't.`{c}`' for c in sort_cols)
+            marks = ', '.join(['%s'] * len(sort_cols))
+            sql += f' WHERE ({cols}) {"<" if page["descending"] else ">"} ({marks})'
+            params += page['after']
+        sql += ' ORDER BY ' + ', '.join(f't.`{c}` {direction}' for c in sort_cols)
+        if limit:
+            sql += ' LIMIT %s'
+            params.append(limit)
+    elif limit or page['after']:
+        # MySQL needs a LIMIT before OFFSET; the documented "all rows" value stands in for none
+        sql += ' LIMIT %s OFFSET %s'
+        params += [limit or 18446744073709551615, page['after'] or 0]
+    return sql, tuple(params)
+
+
+def read_page(table, args, extra_select=(), joins='', primary=False):
+    # One page of a table in keyset order; tables without a primary key fall back to an offset cursor.
+    # Callers that pass neither limit nor after get the whole table, as before paging existed.
+    paged = 'limit' in args or 'after' in args
+    page = parse_page_args(table, args, default_limit=TABLE_PAGE_DEFAULT if paged else None)
+    sort_cols = page['sort_cols']
+    sql, params = page_sql(table, page, extra_select, joins, fetch_extra=1)
+    rows = query(sql, params, primary=primary)
+    next_cursor = None
+    if page['limit'] and len(rows) > page['limit']:
+        rows = rows[:page['limit']]
+        if sort_cols:
+            next_cursor = encode_cursor([rows[-1][c] for c in sort_cols])
+        else:
+            next_cursor = encode_cursor((page['after'] or 0) + page['limit'])
+    return rows, next_cursor
+
+
+def page_response(rows, next_cursor):
+    # The body stays a plain JSON array; the cursor for the next page travels in headers
+    response = jsonify(rows)
+    if next_cursor:
+        args = request.args.to_dict()
+        args['after'] = next_cursor
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    return response
+
+
+class StreamedQuery:
+    """Rows of one query read from an unbuffered server-side cursor"""
+
+    @db_timed
+    def __init__(self, sql, params=None):
+        # Run the query up front so errors surface before any response bytes are sent
+        replica = read_replica()
+        self._pool = replica.pool if replica is not None else db_pool
+        self._conn = self._pool.acquire()
+        self._done = False
+        try:
+            self._cur = self._conn.cursor(pymysql.cursors.SSDictCursor)
+            self._cur.execute(sql, params or ())
+        except BaseException:
+            self.close()
+            raise
+
+    def __iter__(self):
+        for row in self._cur:
+            yield row
+        self._cur.close()
+        self._done = True
+        self.close()
+
+    def close(self):
+        # Hand the connection back; an unread unbuffered result would have to be drained first, so drop it instead
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn, discard=not self._done)
+
+
+def wants_stream():
+    if request.args.get('stream') in ('1', 'true'):
+        return True
+    best = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson'])
+    return best == 'application/x-ndjson'
+
+
+def stream_table(table, args, extra_select=(), joins=''):
+    # Whole table (or the rest of it after a cursor) as NDJSON, one row per line, in constant memory
+    page = parse_page_args(table, args, default_limit=None, max_limit=None)
+    sql, params = page_sql(table, page, extra_select, joins)
+    rows = StreamedQuery(sql, params)
+
+    def generate():
+        for row in rows:
+            yield app.json.dumps(row) + '\n'
+
+    response = Response(generate(), mimetype='application/x-ndjson')
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(rows.close)
+    return response
+
+
+# Tables with a change feed, and the change_log tables behind each. A FeesInfo change is an
+# update to the student, whose row carries FeesPaid.
+CHANGE_FEEDS = {
+    'studentinfo': ('studentinfo', 'feesinfo'),
+    'feesinfo': ('feesinfo',),
+    'roominfo': ('roominfo',),
+    'blockinfo': ('blockinfo',),
+    'messinfo': ('messinfo',),
+}
+# change_log entries read per /changes response; with "more": true the client asks again from "next"
+CHANGES_MAX_ROWS = int(os.environ.get('CHANGES_MAX_ROWS', 5000))
+# ChangeIds are handed out at insert time but become visible at commit, so a gap younger than this
+# may still be filled by an open transaction. Keep it above twice the longest write transaction.
+CHANGES_SETTLE_SECONDS = int(os.environ.get('CHANGES_SETTLE_SECONDS', 30))
+# Days of change_log kept by prune-changes
+CHANGE_LOG_RETENTION_DAYS = float(os.environ.get('CHANGE_LOG_RETENTION_DAYS', 7))
+
+CHANGE_HEAD_COLUMN = '_change_head'
+# Newest ChangeId with no unsettled gap below it, or the id before the oldest entry if none has settled
+CHANGE_HEAD_SQL = (
+    'COALESCE((SELECT ChangeId FROM change_log '
+    f'WHERE ChangedAt < NOW(6) - INTERVAL {CHANGES_SETTLE_SECONDS} SECOND '
+    'ORDER BY ChangedAt DESC, ChangeId DESC LIMIT 1), (SELECT MIN(ChangeId) - 1 FROM change_log), 0)')
+
+
+def change_head_select(table, args):
+    """Extra select that puts the change token in the first page of a fed table.
+
+    It is read by the same statement as the rows, so on a replica it matches the snapshot the page came from.
+    """
+    if table.lower() not in CHANGE_FEEDS or args.get('after') or not schema_cache.columns('change_log'):
+        return []
+    return [f'{CHANGE_HEAD_SQL} AS {CHANGE_HEAD_COLUMN}']
+
+
+def pop_change_head(rows):
+    head = None
+    for row in rows:
+        head = row.pop(CHANGE_HEAD_COLUMN, head)
+    return head
+
+
+def read_changes(since, sources, max_rows=CHANGES_MAX_ROWS):
+    """change_log entries for sources after ChangeId since: (entries, ChangeId for the next token, more).
+
+    Stops short of an id that is missing but may still commit, so a token never skips a change.
+    """
+    rows = query(
+        'SELECT ChangeId, TableName, RowId, Op, '
+        'ChangedAt < NOW(6) - INTERVAL %s SECOND AS Settled '
+        'FROM change_log WHERE ChangeId > %s ORDER BY ChangeId LIMIT %s',
+        (CHANGES_SETTLE_SECONDS, since, max_rows + 1), primary=True)
+    entries, last = [], since
+    for row in rows[:max_rows]:
+        # A rolled-back transaction leaves a gap for good; it is trusted once the entry after it has settled
+        if row['ChangeId'] != last + 1 and not row['Settled']:
+            return entries, last, False
+        last = row['ChangeId']
+        if row['TableName'].lower() in sources:
+            entries.append(row)
+    return entries, last, len(rows) > max_rows
+
+
+def collapse_changes(entries, table):
+    """Net change per row id over entries in ChangeId order: 'I', 'U' or 'D'.
+
+    Entries from the tables that feed this one count as updates; a row inserted and deleted in between is left out.
+    """
+    first, last = {}, {}
+    for entry in entries:
+        op = entry['Op'] if entry['TableName'].lower() == table else 'U'
+        first.setdefault(entry['RowId'], op)
+        last[entry['RowId']] = op
+    net = {}
+    for row_id, op in last.items():
+        if op == 'D':
+            if first[row_id] != 'I':
+                net[row_id] = 'D'
+        else:
+            net[row_id] = 'I' if first[row_id] == 'I' else 'U'
+    return net
+
+
+# Live events for /api/events: vacancy and fee changes, published by the write paths after they commit.
+# SQLite file that relays events between worker processes; unset = this process only
+EVENTS_PATH = os.environ.get('EVENTS_PATH')
+# Events kept for clients that reconnect with Last-Event-ID
+EVENTS_HISTORY = int(os.environ.get('EVENTS_HISTORY', 1000))
+# Events queued per open stream before it is sent a reset instead
+EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE', 100))
+# Seconds between keep-alive comments, and before a stream is closed for the browser to reconnect
+SSE_HEARTBEAT_SECONDS = float(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+SSE_STREAM_SECONDS = float(os.environ.get('SSE_STREAM_SECONDS', 300))
+# Streams this process serves on request threads. gunicorn.conf.py gives each worker this many threads on top
+# of WEB_THREADS; past it the route answers 503 and the page polls instead. asgi_app has no such limit.
+SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', 16))
+sse_slots = threading.BoundedSemaphore(max(SSE_MAX_STREAMS, 0))
+
+broadcaster = (SQLiteBroadcaster(EVENTS_PATH, history=EVENTS_HISTORY) if EVENTS_PATH
+               else Broadcaster(history=EVENTS_HISTORY))
+metrics.gauge('events', 'Live event streams', broadcaster.stats)
+
+
+def sse_message(event):
+    lines = [f'id: {event.id}'] if event.id else []
+    lines += [f'event: {event.name}', f'data: {app.json.dumps(event.data, separators=(",", ":"))}']
+    return '\n'.join(lines) + '\n\n'
+
+
+def publish_vacancies(rooms=(), messes=(), hostels=()):
+    """Publish the current vacancy of rooms (and their blocks), messes and the blocks of hostels.
+
+    Values are read back after the commit, so vacancy moved by triggers is included and a listener
+    that missed an event is corrected by the next one.
+    """
+    rooms, messes, hostels = ({i for i in ids if i is not None} for ids in (rooms, messes, hostels))
+    if not (rooms or messes or hostels) or not broadcaster.listening():
+        return
+    payload = {'rooms': [], 'blocks': [], 'messes': []}
+    try:
+        block_ids = set()
+        if rooms:
+            room_col = schema_cache.room_id_column()
+            block_col = next((c for c in ('BlockId', 'HostelId', 'StHostelId') if c in schema_cache.columns('roominfo')), None)
+            select = f'{room_col} AS RoomNo, Vacancy' + (f', {block_col}' if block_col else '')
+            payload['rooms'] = query(f'SELECT {select} FROM roominfo WHERE {room_col} IN %s',
+                                     (tuple(rooms),), primary=True)
+            # trg_update_block_on_room_full moves block vacancy by BlockId; the app moves it by HostelId
+            for row in payload['rooms']:
+                (block_ids if block_col == 'BlockId' else hostels).add(row.get(block_col))
+        block_cols = schema_cache.columns('blockinfo')
+        conditions = [(col, tuple(ids - {None})) for col, ids in (('BlockId', block_ids), ('HostelId', hostels))
+                      if col in block_cols and ids - {None}]
+        if conditions:
+            select = ', '.join(c for c in ('BlockId', 'HostelId', 'Vacancy') if c in block_cols)
+            where = ' OR '.join(f'{col} IN %s' for col, _ in conditions)
+            payload['blocks'] = query(f'SELECT {select} FROM blockinfo WHERE {where}',
+                                      tuple(ids for _, ids in conditions), primary=True)
+        if messes:
+            payload['messes'] = query('SELECT MessId, Vacancy FROM messinfo WHERE MessId IN %s',
+                                      (tuple(messes),), primary=True)
+    except (pymysql.err.MySQLError, PoolTimeoutError) as e:
+        # The write has committed; listeners reload rather than miss it
+        log.warning('Vacancy event not published: %s', e)
+        broadcaster.publish(RESET, {'reason': 'vacancy read failed'})
+        return
+    broadcaster.publish('vacancy', payload)
+
+
+def publish_fees(paid=None, removed=()):
+    """Publish fees after a commit: paid maps StudentId to FeesPaid, removed lists students whose fees row is gone"""
+    if not (paid or removed) or not broadcaster.listening():
+        return
+    students = [{'StudentId': student_id, 'FeesPaid': float(fees), 'FeesRemaining': max(TOTAL_FEES - float(fees), 0)}
+                for student_id, fees in (paid or {}).items()]
+    broadcaster.publish('fees', {'students': students, 'removed': list(removed)})
+
+
+@app.errorhandler(PoolTimeoutError)
+def pool_timeout(e):
+    return jsonify({'error': 'Database busy, please retry'}), 503
+
+
+@app.before_request
+def start_metrics():
+    request.environ['hostelease.started'] = time.perf_counter()
+    request.environ['hostelease.metrics'] = metrics.start_request()
+    # Reuse the caller's id (e.g. from a proxy) so their logs and ours line up
+    request.environ['hostelease.request_id'] = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+    request.environ['hostelease.request_id_token'] = request_id.set(request.environ['hostelease.request_id'])
+    request.environ['hostelease.wrote_token'] = _wrote.set(False)
+
+
+@app.after_request
+def record_metrics(response):
+    started = request.environ.get('hostelease.started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.finish_request(route, request.method, response.status_code,
+                               time.perf_counter() - started, request.environ.get('hostelease.metrics'))
+    if 'hostelease.request_id' in request.environ:
+        response.headers['X-Request-ID'] = request.environ['hostelease.request_id']
+    if _wrote.get() and replica_router.replicas and 'user' in session:
+        # Keeps this session's next reads on the primary until replicas have caught up
+        session['_wrote_at'] = time.time()
+    return response
+
+
+@app.teardown_request
+def clear_request_context(exc):
+    token = request.environ.pop('hostelease.request_id_token', None)
+    if token is not None:
+        request_id.reset(token)
+    token = request.environ.pop('hostelease.wrote_token', None)
+    if token is not None:
+        _wrote.reset(token)
+
+
+metrics.gauge('pool', 'Database connection pool', lambda: db_pool.stats())
+metrics.gauge('session', 'Session store', lambda: app.session_interface.stats() if hasattr(app.session_interface, 'stats') else {})
+metrics.gauge('room_index', 'Room vacancy index', lambda: room_index.stats())
+metrics.gauge('replicas', 'Read replica routing', lambda: replica_router.stats())
+metrics.gauge('statement_cache', 'Cached studentinfo statement shapes', lambda: statement_cache.stats())
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return jsonify({'error': 'Forbidden'}), 403
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/')
@@ -94,28 +1776,50 @@ def static_files(path):
 
 
 # Login
+# Login attempts allowed at once and refilled per minute, per username and per client IP (0 = no limit).
+# A whole hostel can share one IP behind NAT, so the IP limit is the looser one.
+LOGIN_LIMIT_USER_BURST = int(os.environ.get('LOGIN_LIMIT_USER_BURST', 5))
+LOGIN_LIMIT_USER_PER_MINUTE = float(os.environ.get('LOGIN_LIMIT_USER_PER_MINUTE', 5))
+LOGIN_LIMIT_IP_BURST = int(os.environ.get('LOGIN_LIMIT_IP_BURST', 100))
+LOGIN_LIMIT_IP_PER_MINUTE = float(os.environ.get('LOGIN_LIMIT_IP_PER_MINUTE', 60))
+# SQLite file that lets every worker process draw from the same buckets; unset = this process only
+LOGIN_LIMIT_PATH = os.environ.get('LOGIN_LIMIT_PATH')
+
+LOGIN_LIMIT_RULES = {
+    'user': Rule(LOGIN_LIMIT_USER_BURST, LOGIN_LIMIT_USER_PER_MINUTE / 60),
+    'ip': Rule(LOGIN_LIMIT_IP_BURST, LOGIN_LIMIT_IP_PER_MINUTE / 60),
+}
+login_limiter = (SQLiteTokenBucketLimiter(LOGIN_LIMIT_PATH, LOGIN_LIMIT_RULES) if LOGIN_LIMIT_PATH
+                 else TokenBucketLimiter(LOGIN_LIMIT_RULES))
+metrics.gauge('login_limiter', 'Login rate limiter', login_limiter.stats)
+
+
 @app.route('/api/login', methods=['POST'])
 def login():
     data = request.get_json() or {}
     username = data.get('username')
     password = data.get('password')
     
-    print(f"[LOGIN] Attempt with username: {username}")
-    
     if not username or not password:
         return jsonify({'error': 'username and password required'}), 400
 
-    rows = query('SELECT * FROM login WHERE username = %s AND password = %s', (username, password))
+    # Throttled before the database is touched
+    wait = login_limiter.take(user=str(username).lower(), ip=request.remote_addr)
+    if wait:
+        log.warning('Login throttled', extra={'username': username, 'ip': request.remote_addr})
+        response = jsonify({'error': 'Too many login attempts, please try again later'})
+        response.headers['Retry-After'] = str(int(wait) + 1)
+        return response, 429
+
+    rows = query('SELECT * FROM login WHERE username = %s AND password = %s', (username, password), primary=True)
     if not rows:
-        print(f"[LOGIN] Invalid credentials for: {username}")
+        log.info('Login failed', extra={'username': username})
         return jsonify({'error': 'Invalid credentials'}), 401
 
     user = rows[0]
     session['user'] = {'id': user.get('id'), 'username': user.get('username'), 'role': user.get('role')}
     session.modified = True  # Force session save
-    print(f"[LOGIN] Success! User: {username}, Role: {user.get('role')}, Session ID: {session.get('_id', 'unknown')}")
-    print(f"[LOGIN] Session data: {session.get('user')}")
-    
+    log.info('Login succeeded', extra={'username': username, 'role': user.get('role')})
     response = jsonify({'role': user.get('role'), 'id': user.get('id')})
     return response
 
@@ -128,103 +1832,62 @@ def logout():
 
 @app.route('/api/current-user')
 def current_user():
-    print(f"[CURRENT-USER] Checking session...")
-    print(f"[CURRENT-USER] Session keys: {list(session.keys())}")
-    print(f"[CURRENT-USER] Session user: {session.get('user', 'NOT FOUND')}")
-    print(f"[CURRENT-USER] Cookie: {request.cookies.get(app.config.get('SESSION_COOKIE_NAME', 'session'))}")
-    
     if 'user' not in session:
-        print(f"[CURRENT-USER] No user in session - returning 401")
         return jsonify({'error': 'Not logged in'}), 401
-    
-    print(f"[CURRENT-USER] User found: {session['user']}")
+    log.debug('Session user', extra={'user': session['user']})
     return jsonify(session['user'])
 
 
+def dashboard_payload(user, data):
+    profile = dict(data['profile'])
+    profile.pop('Password', None)
+    return {
+        'user': user,
+        'profile': profile,
+        'room': data['room'],
+        'block': data['block'],
+        'mess': data['mess'],
+        'fees': data['fees'],
+    }
+
+
+def student_fees_payload(data):
+    profile = data['profile']
+    return {
+        'FeesPaid': data['fees']['FeesPaid'],
+        'FeesRemaining': data['fees']['FeesRemaining'],
+        'RoomNo': profile['RoomNo'] if profile.get('RoomId') else None,
+        'BlockName': data['block']['BlockName'] if data['block'] else None
+    }
+
+
+@app.route('/api/student-dashboard')
+def student_dashboard():
+    if 'user' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    if session['user'].get('role') != 'student':
+        return jsonify({'error': 'Forbidden'}), 403
+    data = load_student_dashboard(session['user'].get('id'))
+    if data is None:
+        return jsonify({'error': 'Profile not found'}), 404
+
+    response = jsonify(dashboard_payload(session['user'], data))
+    # Private to the student; the browser revalidates with the ETag and gets a 304 when unchanged
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+
 @app.route('/api/student-profile')
 def student_profile():
     if 'user' not in session:
         return jsonify({'error': 'Not logged in'}), 401
     if session['user'].get('role') != 'student':
         return jsonify({'error': 'Forbidden'}), 403
-    student_id = session['user'].get('id')
-    
-    # Get student info
-    rows = query('SELECT * FROM studentinfo WHERE StudentId = %s', (student_id,))
-    
-    if not rows:
+    data = load_student_dashboard(session['user'].get('id'))
+    if data is None:
         return jsonify({'error': 'Profile not found'}), 404
-    
-    student_data = rows[0]
-    print(f"[PROFILE] Student data: RoomId={student_data.get('RoomId')}, StHostelId={student_data.get('StHostelId')}")
-    
-    # Get block name/type if hostel is assigned
-    if student_data.get('StHostelId'):
-        try:
-            block_rows = query('SELECT * FROM blockinfo WHERE HostelId = %s', (student_data.get('StHostelId'),))
-            print(f"[PROFILE] Block rows: {block_rows}")
-            if block_rows:
-                block_data = block_rows[0]
-                print(f"[PROFILE] Block data keys: {list(block_data.keys())}")
-                # Use 'Type' column as block name if BlockName doesn't exist
-                block_name = (block_data.get('BlockName') or block_data.get('Block_Name') or 
-                             block_data.get('Blockname') or block_data.get('block_name') or 
-                             block_data.get('Type'))
-                print(f"[PROFILE] Block name found: {block_name}")
-                student_data['BlockName'] = block_name if block_name else 'Not assigned'
-            else:
-                student_data['BlockName'] = 'Not assigned'
-        except Exception as e:
-            print(f"[PROFILE] Block error: {e}")
-            student_data['BlockName'] = 'Not assigned'
-    else:
-        student_data['BlockName'] = 'Not assigned'
-    
-    # Get room number if room is assigned
-    if student_data.get('RoomId'):
-        try:
-            # First, get the column name used for room identifier in roominfo
-            room_rows = query('SELECT * FROM roominfo LIMIT 1')
-            if room_rows:
-                room_columns = list(room_rows[0].keys())
-                print(f"[PROFILE] Room table columns: {room_columns}")
-                
-                # Find the correct column name for room ID
-                room_id_col = None
-                for col in ['Room_id', 'room_id', 'Roomid', 'roomid', 'RoomID']:
-                    if col in room_columns:
-                        room_id_col = col
-                        break
-                
-                if room_id_col:
-                    room_rows = query(f'SELECT * FROM roominfo WHERE {room_id_col} = %s', (student_data.get('RoomId'),))
-                else:
-                    # If no match, try with the student's RoomId value as room number
-                    room_rows = query('SELECT * FROM roominfo WHERE RoomNo = %s', (student_data.get('RoomId'),))
-                
-                print(f"[PROFILE] Room rows: {room_rows}")
-                if room_rows:
-                    room_data = room_rows[0]
-                    print(f"[PROFILE] Room data keys: {list(room_data.keys())}")
-                    room_no = (room_data.get('RoomNo') or room_data.get('Room_No') or 
-                              room_data.get('Roomno') or room_data.get('room_no') or 
-                              str(student_data.get('RoomId')))
-                    print(f"[PROFILE] Room number found: {room_no}")
-                    student_data['RoomNo'] = room_no if room_no else 'Not assigned'
-                else:
-                    # Use RoomId value directly as room number
-                    student_data['RoomNo'] = str(student_data.get('RoomId'))
-            else:
-                student_data['RoomNo'] = str(student_data.get('RoomId'))
-        except Exception as e:
-            print(f"[PROFILE] Room error: {e}")
-            # Fallback: use RoomId value as room number
-            student_data['RoomNo'] = str(student_data.get('RoomId'))
-    else:
-        student_data['RoomNo'] = 'Not assigned'
-    
-    print(f"[PROFILE] Final data - RoomNo: {student_data.get('RoomNo')}, BlockName: {student_data.get('BlockName')}")
-    return jsonify(student_data)
+    return jsonify(data['profile'])
 
 
 @app.route('/api/student-fees')
@@ -233,83 +1896,10 @@ def student_fees():
         return jsonify({'error': 'Not logged in'}), 401
     if session['user'].get('role') != 'student':
         return jsonify({'error': 'Forbidden'}), 403
-    student_id = session['user'].get('id')
-    
-    # Get student info
-    student_info = query('SELECT * FROM studentinfo WHERE StudentId = %s', (student_id,))
-    if not student_info:
+    data = load_student_dashboard(session['user'].get('id'))
+    if data is None:
         return jsonify({'error': 'Student not found'}), 404
-    
-    student = student_info[0]
-        
-    # Get fees info using the database function fn_remaining_fees
-    fees_col = detect_fees_column()
-    if not fees_col:
-        feesPaid = 0
-        feesRemaining = 50000
-    else:
-        rows = query(f'SELECT {fees_col}, fn_remaining_fees(%s) as FeesRemaining FROM FeesInfo WHERE StudentId = %s', (student_id, student_id))
-        if rows:
-            feesPaid = rows[0].get(fees_col, 0)
-            feesRemaining = rows[0].get('FeesRemaining', 50000)
-        else:
-            feesPaid = 0
-            feesRemaining = 50000
-    try:
-        feesPaid = float(feesPaid) if feesPaid is not None else 0
-        feesRemaining = float(feesRemaining) if feesRemaining is not None else 50000
-    except Exception:
-        feesPaid = 0
-        feesRemaining = 50000
-
-    # Get room info - use same logic as student_profile
-    room_no = None
-    if student.get('RoomId'):
-        try:
-            # Try to get room info, but if column doesn't exist, use RoomId directly
-            room_rows = query('SELECT * FROM roominfo LIMIT 1')
-            if room_rows:
-                room_columns = list(room_rows[0].keys())
-                room_id_col = None
-                for col in ['Room_id', 'room_id', 'Roomid', 'roomid', 'RoomID']:
-                    if col in room_columns:
-                        room_id_col = col
-                        break
-                
-                if room_id_col:
-                    room_info = query(f'SELECT * FROM roominfo WHERE {room_id_col} = %s', (student.get('RoomId'),))
-                else:
-                    room_info = query('SELECT * FROM roominfo WHERE RoomNo = %s', (student.get('RoomId'),))
-                
-                if room_info:
-                    room_data = room_info[0]
-                    room_no = (room_data.get('RoomNo') or room_data.get('Room_No') or 
-                              room_data.get('Roomno') or str(student.get('RoomId')))
-                else:
-                    room_no = str(student.get('RoomId'))
-            else:
-                room_no = str(student.get('RoomId'))
-        except:
-            room_no = str(student.get('RoomId'))
-    
-    # Get block name - use Type column if BlockName doesn't exist
-    block_name = None
-    if student.get('StHostelId'):
-        try:
-            block_info = query('SELECT * FROM blockinfo WHERE HostelId = %s', (student.get('StHostelId'),))
-            if block_info:
-                block_data = block_info[0]
-                block_name = (block_data.get('BlockName') or block_data.get('Block_Name') or 
-                             block_data.get('Blockname') or block_data.get('Type'))
-        except:
-            pass
-
-    return jsonify({
-        'FeesPaid': feesPaid,
-        'FeesRemaining': feesRemaining,  # Using fn_remaining_fees function result
-        'RoomNo': room_no,
-        'BlockName': block_name
-    })
+    return jsonify(student_fees_payload(data))
 
 
 @app.route('/api/FeesInfo')
@@ -340,6 +1930,8 @@ def student_password():
     user_id = session['user'].get('id')
     execute('UPDATE login SET password = %s WHERE id = %s', (new_password, user_id))
     execute('UPDATE studentinfo SET Password = %s WHERE StudentId = %s', (new_password, user_id))
+    dashboard_cache.invalidate(user_id)
+    table_versions.bump('login', 'studentinfo')
     return jsonify({'message': 'Password updated successfully'})
 
 
@@ -350,12 +1942,140 @@ def get_studentinfo():
     if session['user'].get('role') != 'manager':
         return jsonify({'error': 'Forbidden'}), 403
     fees_col = detect_fees_column() or 'FeesPaid'
-    rows = query(f'''
-        SELECT s.*, f.{fees_col} as FeesPaid
-        FROM studentinfo s
-        LEFT JOIN FeesInfo f ON s.StudentId = f.StudentId
-    ''')
-    return jsonify(rows)
+    extra_select = [f'f.{fees_col} as FeesPaid']
+    joins = 'LEFT JOIN FeesInfo f ON t.StudentId = f.StudentId'
+    try:
+        if wants_stream():
+            return stream_table('studentinfo', request.args, extra_select, joins)
+        extra_select += change_head_select('studentinfo', request.args)
+        rows, next_cursor = read_page('studentinfo', request.args, extra_select, joins)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    head = pop_change_head(rows)
+    response = page_response(rows, next_cursor)
+    if head is not None:
+        response.headers['X-Change-Token'] = encode_cursor(head)
+    return response
+
+
+# Page size for /api/studentinfo/search
+SEARCH_PAGE_DEFAULT = int(os.environ.get('SEARCH_PAGE_DEFAULT', 50))
+# Exact-match filters; several values may be given comma-separated
+SEARCH_FILTERS = ('Dept', 'Year', 'Degree', 'StHostelId', 'RoomId', 'MessId')
+# Order when none is asked for (after relevance); matches idx_studentinfo_lastname
+SEARCH_DEFAULT_ORDER = ('Lastname', 'Firstname')
+# MySQL error raised by MATCH when the FULLTEXT index is missing
+ER_FT_MATCHING_KEY_NOT_FOUND = 1191
+
+
+def like_prefix(text):
+    # Escape LIKE wildcards so user input only ever matches literally, then anchor it at the start
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def search_sql(args, fees_col):
+    """SQL and params for a studentinfo search; raises ValueError on bad parameters"""
+    columns = schema_cache.columns('studentinfo')
+    if not columns:
+        raise ValueError('Table schema unavailable')
+    where, params = [], []
+    q = (args.get('q') or '').strip()
+    mode = args.get('mode', 'prefix')
+    if mode not in ('prefix', 'fulltext'):
+        raise ValueError('mode must be prefix or fulltext')
+    relevance = terms = None
+    words = q.split()
+    if words and mode == 'prefix':
+        # Every word starts the first or the last name: "ana sh" finds Ananya Sharma
+        for word in words:
+            where.append('(t.Firstname LIKE %s OR t.Lastname LIKE %s)')
+            params += [like_prefix(word)] * 2
+    elif words:
+        # Boolean mode, every word required and matched as a prefix; operators typed by the user are dropped
+        terms = ' '.join(f'+{term}*' for term in (''.join(ch for ch in w if ch.isalnum()) for w in words) if term)
+        if terms:
+            relevance = 'MATCH (t.Firstname, t.Lastname) AGAINST (%s IN BOOLEAN MODE)'
+            where.append(relevance)
+            params.append(terms)
+
+    for field in SEARCH_FILTERS:
+        raw = args.get(field)
+        if raw is None or raw == '' or field not in columns:
+            continue
+        values = [v.strip() for v in raw.split(',') if v.strip()]
+        if field in IMPORT_ID_FIELDS or field == 'Year':
+            try:
+                values = [int(v) for v in values]
+            except ValueError:
+                raise ValueError(f'{field} must be a number')
+        where.append(f't.`{field}` IN ({", ".join(["%s"] * len(values))})')
+        params += values
+
+    # Sort keys: any column but the password, the fees column, or relevance for full-text searches
+    sortable = {c: f't.`{c}`' for c in columns if c != 'Password'}
+    if fees_col:
+        sortable['FeesPaid'] = f'f.`{fees_col}`'
+    order, order_params = [], []
+    for key in [k.strip() for k in (args.get('sort') or '').split(',') if k.strip()]:
+        name = key.lstrip('-')
+        direction = 'DESC' if key.startswith('-') else 'ASC'
+        if name == 'relevance' and relevance:
+            order.append(f'{relevance} {direction}')
+            order_params.append(terms)
+        elif name in sortable:
+            order.append(f'{sortable[name]} {direction}')
+        else:
+            raise ValueError(f'Cannot sort by {name}')
+    if not order:
+        if relevance:
+            order.append(f'{relevance} DESC')
+            order_params.append(terms)
+        order += [f't.`{c}` ASC' for c in SEARCH_DEFAULT_ORDER if c in columns]
+    # StudentId last keeps pages stable between requests
+    order.append('t.StudentId ASC')
+
+    try:
+        limit = int(args.get('limit', SEARCH_PAGE_DEFAULT))
+    except ValueError:
+        raise ValueError('limit must be a number')
+    if limit < 1 or limit > TABLE_PAGE_MAX:
+        raise ValueError(f'limit must be between 1 and {TABLE_PAGE_MAX}')
+    offset = decode_cursor(args['after']) if args.get('after') else 0
+    if not isinstance(offset, int) or offset < 0:
+        raise ValueError('Invalid cursor')
+
+    select = 't.*' + (f', f.{fees_col} AS FeesPaid' if fees_col else '')
+    joins = 'LEFT JOIN FeesInfo f ON t.StudentId = f.StudentId' if fees_col else ''
+    sql = f'SELECT {select} FROM studentinfo t {joins}'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY ' + ', '.join(order) + ' LIMIT %s OFFSET %s'
+    return sql, tuple(params + order_params + [limit + 1, offset]), limit, offset
+
+
+@app.route('/api/studentinfo/search')
+def search_students():
+    if 'user' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    if session['user'].get('role') != 'manager':
+        return jsonify({'error': 'Forbidden'}), 403
+    try:
+        sql, params, limit, offset = search_sql(request.args, detect_fees_column())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        rows = query(sql, params)
+    except pymysql.err.OperationalError as e:
+        if e.args and e.args[0] == ER_FT_MATCHING_KEY_NOT_FOUND:
+            return jsonify({'error': 'Full-text search needs sql_scripts/student_search_indexes.sql'}), 503
+        raise
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(offset + limit)
+    for row in rows:
+        row.pop('Password', None)
+    return page_response(rows, next_cursor)
 
 
 @app.route('/api/studentinfo/<int:student_id>', methods=['PUT'])
@@ -367,24 +2087,40 @@ def update_studentinfo(student_id):
     updates = request.get_json() or {}
     if not updates:
         return jsonify({'message': 'No updates provided'}), 400
-    
     try:
+        fields = studentinfo_fields(updates, protected=schema_cache.primary_key('studentinfo'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if fields is None:
+        return jsonify({'error': 'Table schema unavailable'}), 503
+
+    try:
+        current = None
+        # The places the student leaves, so their vacancy can be published too
+        placement = [field for field in ('RoomId', 'MessId', 'StHostelId') if field in updates]
+        if placement:
+            current = query('SELECT RoomId, MessId, StHostelId FROM studentinfo WHERE StudentId = %s',
+                            (student_id,), primary=True)
         # If updating RoomId, check for room vacancy
         if 'RoomId' in updates and updates['RoomId'] is not None:
-            # Get current room
-            current = query('SELECT RoomId FROM studentinfo WHERE StudentId = %s', (student_id,))
             if current and current[0].get('RoomId') != updates['RoomId']:
                 # Check new room vacancy
-                room_check = query('SELECT Vacancy FROM RoomInfo WHERE RoomNo = %s', (updates['RoomId'],))
+                room_check = query('SELECT Vacancy FROM RoomInfo WHERE RoomNo = %s', (updates['RoomId'],), primary=True)
                 if not room_check:
                     return jsonify({'error': 'Room does not exist'}), 400
                 if room_check[0].get('Vacancy', 0) <= 0:
                     return jsonify({'error': 'Cannot assign student: Room has no vacancy'}), 400
         
-        fields = ', '.join([f"{k} = %s" for k in updates.keys()])
-        values = list(updates.values()) + [student_id]
-        sql = f'UPDATE studentinfo SET {fields} WHERE StudentId = %s'
-        execute(sql, tuple(values))
+        execute(studentinfo_sql('update', fields), tuple(updates[f] for f in fields) + (student_id,))
+        dashboard_cache.invalidate(student_id)
+        table_versions.bump(*ROOM_WRITE_TABLES)
+        if 'RoomId' in updates:
+            room_index.refresh_rooms([updates['RoomId']] + ([current[0].get('RoomId')] if current else []))
+        if placement:
+            moved = {field: [updates[field], current[0].get(field)] if current else [updates[field]]
+                     for field in placement}
+            publish_vacancies(rooms=moved.get('RoomId', ()), messes=moved.get('MessId', ()),
+                              hostels=moved.get('StHostelId', ()))
         return jsonify({'message': 'Updated'})
     except pymysql.err.OperationalError as e:
         if 'Room has no vacancy' in str(e) or 'Room does not exist' in str(e):
@@ -392,6 +2128,164 @@ def update_studentinfo(student_id):
         raise
 
 
+# Largest batch accepted by PATCH /api/studentinfo, and students per UPDATE ... IN statement
+BULK_UPDATE_MAX_ROWS = int(os.environ.get('BULK_UPDATE_MAX_ROWS', 5000))
+BULK_UPDATE_CHUNK = 1000
+# Placement columns whose vacancy moves with the student: roominfo (by its id column), messinfo, blockinfo
+PLACEMENT_FIELDS = (('RoomId', 'roominfo', None, 'Room'), ('MessId', 'messinfo', 'MessId', 'Mess'),
+                    ('StHostelId', 'blockinfo', 'HostelId', 'Block'))
+
+
+@app.route('/api/studentinfo', methods=['PATCH'])
+def bulk_update_students():
+    if 'user' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    if session['user'].get('role') != 'manager':
+        return jsonify({'error': 'Forbidden'}), 403
+    started = time.perf_counter()
+    dry_run = request.args.get('dry_run') in ('1', 'true')
+    items = request.get_json(silent=True)
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return jsonify({'error': 'Expected a JSON array of {"StudentId": ..., "fields": {...}} objects'}), 400
+    if not items:
+        return jsonify({'message': 'No updates provided'}), 400
+    if len(items) > BULK_UPDATE_MAX_ROWS:
+        return jsonify({'error': f'At most {BULK_UPDATE_MAX_ROWS} students per request'}), 400
+    if not schema_cache.columns('studentinfo'):
+        return jsonify({'error': 'Table schema unavailable'}), 503
+    protected = schema_cache.primary_key('studentinfo') or ['StudentId']
+
+    # Pass 1: shape checks, per item
+    results = [None] * len(items)
+    updates = []
+    seen = set()
+    for i, item in enumerate(items):
+        changes = item.get('fields')
+        try:
+            student_id = int(item.get('StudentId'))
+        except (TypeError, ValueError):
+            results[i] = {'item': i, 'status': 'rejected', 'error': 'StudentId must be a number'}
+            continue
+        error = None
+        if not isinstance(changes, dict) or not changes:
+            error = 'No fields to update'
+        elif student_id in seen:
+            error = f'StudentId {student_id} appears more than once'
+        elif any(isinstance(v, (list, dict)) for v in changes.values()):
+            error = 'Field values must be single values'
+        if not error:
+            try:
+                fields = studentinfo_fields(changes, protected=protected)
+            except ValueError as e:
+                error = str(e)
+        if not error:
+            changes = dict(changes)
+            try:
+                for field in IMPORT_ID_FIELDS:
+                    if changes.get(field) is not None:
+                        changes[field] = int(changes[field])
+            except (TypeError, ValueError):
+                error = f'{field} must be a number'
+        if error:
+            results[i] = {'item': i, 'StudentId': student_id, 'status': 'rejected', 'error': error}
+            continue
+        seen.add(student_id)
+        updates.append((i, student_id, fields, changes))
+
+    room_col = schema_cache.room_id_column()
+    applied = []
+    deltas = {field: {} for field, _, _, _ in PLACEMENT_FIELDS}
+    try:
+        with unit_of_work() as uow:
+            # Pass 2: the students and every place they move into, one locked query per table
+            current = {}
+            if updates:
+                placeholders = ', '.join(['%s'] * len(updates))
+                current = {r['StudentId']: r for r in uow.query(
+                    f'SELECT StudentId, RoomId, MessId, StHostelId FROM studentinfo '
+                    f'WHERE StudentId IN ({placeholders}) FOR UPDATE', tuple(u[1] for u in updates))}
+            vacancies = {}
+            for field, table, id_col, _ in PLACEMENT_FIELDS:
+                id_col = id_col or room_col
+                targets = {changes[field] for _, sid, _, changes in updates
+                           if changes.get(field) is not None and sid in current and changes[field] != current[sid][field]}
+                vacancies[field] = {}
+                if targets:
+                    placeholders = ', '.join(['%s'] * len(targets))
+                    vacancies[field] = {r['Id']: r['Vacancy'] or 0 for r in uow.query(
+                        f'SELECT {id_col} AS Id, Vacancy FROM {table} WHERE {id_col} IN ({placeholders}) FOR UPDATE',
+                        tuple(targets))}
+
+            for i, student_id, fields, changes in updates:
+                row = current.get(student_id)
+                if row is None:
+                    results[i] = {'item': i, 'StudentId': student_id, 'status': 'rejected', 'error': 'Student not found'}
+                    continue
+                moves = {field: changes[field] for field, _, _, _ in PLACEMENT_FIELDS
+                         if field in changes and changes[field] != row[field]}
+                error = None
+                for field, _, _, label in PLACEMENT_FIELDS:
+                    target = moves.get(field)
+                    if target is None:
+                        continue
+                    if target not in vacancies[field]:
+                        error = f'{label} {target} does not exist'
+                    elif vacancies[field][target] <= 0:
+                        error = f'{label} {target} has no vacancy'
+                    if error:
+                        break
+                if error:
+                    results[i] = {'item': i, 'StudentId': student_id, 'status': 'rejected', 'error': error}
+                    continue
+                # Places given up earlier in the batch can be taken by later items
+                for field, target in moves.items():
+                    if target is not None:
+                        vacancies[field][target] -= 1
+                        deltas[field][target] = deltas[field].get(target, 0) - 1
+                    if row[field] is not None:
+                        deltas[field][row[field]] = deltas[field].get(row[field], 0) + 1
+                        if row[field] in vacancies[field]:
+                            vacancies[field][row[field]] += 1
+                applied.append((i, student_id, fields, changes))
+
+            if applied and not dry_run:
+                # Students getting the same values (a whole cohort moving year or mess) share one statement
+                by_values = {}
+                for _, student_id, fields, changes in applied:
+                    by_values.setdefault((fields, tuple(changes[f] for f in fields)), []).append(student_id)
+                for (fields, values), ids in by_values.items():
+                    sql = studentinfo_sql('update_many', fields)
+                    for start in range(0, len(ids), BULK_UPDATE_CHUNK):
+                        uow.execute(sql, values + (tuple(ids[start:start + BULK_UPDATE_CHUNK]),))
+                # studentinfo has no update trigger, so vacancy moves with the students here
+                for field, table, id_col, _ in PLACEMENT_FIELDS:
+                    changed = [(n, ref) for ref, n in deltas[field].items() if n]
+                    if changed:
+                        uow.executemany(f'UPDATE {table} SET Vacancy = GREATEST(Vacancy + %s, 0) '
+                                        f'WHERE {id_col or room_col} = %s', changed)
+    except (pymysql.err.IntegrityError, pymysql.err.DataError) as e:
+        # A value the table refuses (bad reference, too long); nothing was committed
+        return jsonify({'error': f'Update rolled back, nothing was changed: {e.args[-1]}'}), 409
+
+    if applied and not dry_run:
+        table_versions.bump(*ROOM_WRITE_TABLES)
+        for _, student_id, _, _ in applied:
+            dashboard_cache.invalidate(student_id)
+        if deltas['RoomId']:
+            room_index.refresh_rooms(list(deltas['RoomId']))
+        publish_vacancies(rooms=deltas['RoomId'], messes=deltas['MessId'], hostels=deltas['StHostelId'])
+    for i, student_id, _, _ in applied:
+        results[i] = {'item': i, 'StudentId': student_id, 'status': 'valid' if dry_run else 'updated'}
+    return jsonify({
+        'dry_run': dry_run,
+        'updated': 0 if dry_run else len(applied),
+        'valid': len(applied),
+        'rejected': len(items) - len(applied),
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        'results': results,
+    })
+
+
 @app.route('/api/studentinfo/<int:student_id>', methods=['DELETE'])
 def delete_student(student_id):
     if 'user' not in session:
@@ -399,29 +2293,37 @@ def delete_student(student_id):
     if session['user'].get('role') != 'manager':
         return jsonify({'error': 'Forbidden'}), 403
 
-    rows = query('SELECT MessId, StHostelId FROM studentinfo WHERE StudentId = %s', (student_id,))
-    if not rows:
-        return jsonify({'error': 'Student not found'}), 404
-    student = rows[0]
-    
-    # Use fn_remaining_fees function to check if fees are paid
-    remaining_rows = query('SELECT fn_remaining_fees(%s) as Remaining', (student_id,))
-    remaining = float(remaining_rows[0].get('Remaining', 50000)) if remaining_rows else 50000
-    
-    if remaining > 0:
-        return jsonify({'error': f'Cannot delete student with unpaid fees. Remaining: ₹{remaining}'}), 400
-
-    # Update mess and block vacancy manually (no triggers for these)
-    if student.get('MessId'):
-        execute('UPDATE messinfo SET Vacancy = Vacancy + 1 WHERE MessId = %s', (student.get('MessId'),))
-    if student.get('StHostelId'):
-        execute('UPDATE blockinfo SET Vacancy = Vacancy + 1 WHERE HostelId = %s', (student.get('StHostelId'),))
-
-    # Delete student records
-    # Note: Room vacancy will be automatically increased by trg_increase_room_vacancy trigger
-    execute('DELETE FROM FeesInfo WHERE StudentId = %s', (student_id,))
-    execute('DELETE FROM login WHERE id = %s', (student_id,))
-    execute('DELETE FROM studentinfo WHERE StudentId = %s', (student_id,))
+    with unit_of_work() as uow:
+        # Lock the row so a concurrent edit cannot move the student while its places are released
+        rows = uow.query('SELECT MessId, StHostelId, RoomId FROM studentinfo WHERE StudentId = %s FOR UPDATE', (student_id,))
+        if not rows:
+            return jsonify({'error': 'Student not found'}), 404
+        student = rows[0]
+        
+        # Check if fees are paid
+        remaining_rows = outstanding_fees([student_id], min_balance=0, uow=uow)
+        remaining = remaining_rows[0]['FeesRemaining'] if remaining_rows else TOTAL_FEES
+        
+        if remaining > 0:
+            return jsonify({'error': f'Cannot delete student with unpaid fees. Remaining: ₹{remaining}'}), 400
+
+        # Update mess and block vacancy manually (no triggers for these)
+        if student.get('MessId'):
+            uow.execute('UPDATE messinfo SET Vacancy = Vacancy + 1 WHERE MessId = %s', (student.get('MessId'),))
+        if student.get('StHostelId'):
+            uow.execute('UPDATE blockinfo SET Vacancy = Vacancy + 1 WHERE HostelId = %s', (student.get('StHostelId'),))
+
+        # Delete student records
+        # Note: Room vacancy will be automatically increased by trg_increase_room_vacancy trigger
+        uow.execute('DELETE FROM FeesInfo WHERE StudentId = %s', (student_id,))
+        uow.execute('DELETE FROM login WHERE id = %s', (student_id,))
+        uow.execute('DELETE FROM studentinfo WHERE StudentId = %s', (student_id,))
+    table_versions.bump(*STUDENT_WRITE_TABLES)
+    dashboard_cache.invalidate(student_id)
+    if student.get('RoomId') is not None:
+        room_index.adjust(student['RoomId'], 1)
+    publish_fees(removed=[student_id])
+    publish_vacancies(rooms=[student.get('RoomId')], messes=[student.get('MessId')], hostels=[student.get('StHostelId')])
     return jsonify({'message': 'Student deleted'})
 
 
@@ -433,38 +2335,314 @@ def add_student():
         return jsonify({'error': 'Forbidden'}), 403
     data = request.get_json() or {}
     username = data.pop('username', None)
-    
     try:
-        # Insert into studentinfo
-        # Note: trg_reduce_room_vacancy trigger will validate room vacancy and raise error if room is full
-        fields = ', '.join(data.keys())
-        placeholders = ', '.join(['%s'] * len(data))
-        values = tuple(data.values())
-        sql = f'INSERT INTO studentinfo ({fields}) VALUES ({placeholders})'
-        student_id = execute(sql, values)
+        fields = studentinfo_fields(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if fields is None:
+        return jsonify({'error': 'Table schema unavailable'}), 503
+    if not fields:
+        return jsonify({'error': 'No student fields provided'}), 400
+
+    try:
+        with unit_of_work() as uow:
+            # Insert into studentinfo
+            # Note: trg_reduce_room_vacancy trigger will validate room vacancy and raise error if room is full
+            student_id = uow.execute(studentinfo_sql('insert', fields), tuple(data[f] for f in fields))
 
-        # Add FeesInfo using stored procedure
-        call_procedure('sp_update_fee_payment', (student_id, 0))
+            # Add FeesInfo using stored procedure
+            uow.call_procedure('sp_update_fee_payment', (student_id, 0))
 
-        # Update mess and block vacancy manually (no triggers for these)
-        if data.get('MessId'):
-            execute('UPDATE messinfo SET Vacancy = Vacancy - 1 WHERE MessId = %s AND Vacancy > 0', (data.get('MessId'),))
-        if data.get('StHostelId'):
-            execute('UPDATE blockinfo SET Vacancy = Vacancy - 1 WHERE HostelId = %s AND Vacancy > 0', (data.get('StHostelId'),))
-
-        loginData = {
-            'id': student_id,
-            'username': username or f'student{student_id}',
-            'password': data.get('Password') or 'pass123',
-            'role': 'student'
-        }
-        execute('INSERT INTO login (id, username, password, role) VALUES (%s, %s, %s, %s)', (loginData['id'], loginData['username'], loginData['password'], loginData['role']))
-        return jsonify({'id': student_id, 'message': 'Student added'})
+            # Update mess and block vacancy manually (no triggers for these)
+            if data.get('MessId'):
+                uow.execute('UPDATE messinfo SET Vacancy = Vacancy - 1 WHERE MessId = %s AND Vacancy > 0', (data.get('MessId'),))
+            if data.get('StHostelId'):
+                uow.execute('UPDATE blockinfo SET Vacancy = Vacancy - 1 WHERE HostelId = %s AND Vacancy > 0', (data.get('StHostelId'),))
+
+            loginData = {
+                'id': student_id,
+                'username': username or f'student{student_id}',
+                'password': data.get('Password') or 'pass123',
+                'role': 'student'
+            }
+            uow.execute('INSERT INTO login (id, username, password, role) VALUES (%s, %s, %s, %s)', (loginData['id'], loginData['username'], loginData['password'], loginData['role']))
     except pymysql.err.OperationalError as e:
-        # Catch trigger errors (SQLSTATE 45000)
+        # Catch trigger errors (SQLSTATE 45000); the whole insert was rolled back
         if 'Room has no vacancy' in str(e) or 'Room does not exist' in str(e):
             return jsonify({'error': str(e).split(': ')[-1] if ': ' in str(e) else str(e)}), 400
         raise
+    table_versions.bump(*STUDENT_WRITE_TABLES)
+    if data.get('RoomId') is not None:
+        room_index.adjust(data['RoomId'], -1)
+    publish_fees({student_id: 0})
+    publish_vacancies(rooms=[data.get('RoomId')], messes=[data.get('MessId')], hostels=[data.get('StHostelId')])
+    return jsonify({'id': student_id, 'message': 'Student added'})
+
+
+# Largest batch accepted by the bulk import endpoint
+IMPORT_MAX_ROWS = int(os.environ.get('IMPORT_MAX_ROWS', 5000))
+IMPORT_ID_FIELDS = ('StudentId', 'RoomId', 'MessId', 'StHostelId')
+
+
+def read_import_rows():
+    # JSON array body, a CSV body, or a CSV file uploaded as 'file'
+    upload = request.files.get('file')
+    if upload is not None or (request.mimetype or '').endswith('csv'):
+        text = (upload.read() if upload is not None else request.get_data()).decode('utf-8-sig')
+        # Empty CSV cells mean "no value", not an empty string
+        return [{k.strip(): (v if v != '' else None) for k, v in row.items() if k}
+                for row in csv.DictReader(io.StringIO(text))]
+    data = request.get_json(silent=True)
+    if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+        raise ValueError('Expected a JSON array of student objects or CSV')
+    return data
+
+
+def vacancy_map(sql, ids):
+    # One IN (...) query for every id referenced by the batch
+    if not ids:
+        return {}
+    placeholders = ', '.join(['%s'] * len(ids))
+    return {row['Id']: row['Vacancy'] or 0 for row in query(sql.format(placeholders), tuple(ids), primary=True)}
+
+
+@app.route('/api/studentinfo/import', methods=['POST'])
+def import_students():
+    if 'user' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    if session['user'].get('role') != 'manager':
+        return jsonify({'error': 'Forbidden'}), 403
+    started = time.perf_counter()
+    dry_run = request.args.get('dry_run') in ('1', 'true')
+    try:
+        rows = read_import_rows()
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'error': str(e)}), 400
+    if not rows:
+        return jsonify({'error': 'No rows to import'}), 400
+    if len(rows) > IMPORT_MAX_ROWS:
+        return jsonify({'error': f'At most {IMPORT_MAX_ROWS} rows per import'}), 400
+    if not schema_cache.columns('studentinfo'):
+        return jsonify({'error': 'Table schema unavailable'}), 503
+
+    # Pass 1: shape checks, per row
+    results = [None] * len(rows)
+    students = []
+    for i, raw in enumerate(rows):
+        data = dict(raw)
+        username = data.pop('username', None)
+        try:
+            # Same whitelist the insert uses, so a row that passes here cannot fail there
+            studentinfo_fields(data)
+        except ValueError as e:
+            results[i] = {'row': i, 'status': 'rejected', 'error': str(e)}
+            continue
+        try:
+            for field in IMPORT_ID_FIELDS:
+                if data.get(field) is not None:
+                    data[field] = int(data[field])
+        except (TypeError, ValueError):
+            results[i] = {'row': i, 'status': 'rejected', 'error': f'{field} must be a number'}
+            continue
+        students.append((i, data, username))
+
+    # Pass 2: capacity and uniqueness against the current tables, a handful of queries for the whole batch
+    room_col = schema_cache.room_id_column()
+    rooms = vacancy_map(f'SELECT {room_col} AS Id, Vacancy FROM roominfo WHERE {room_col} IN ({{}})',
+                        {d['RoomId'] for _, d, _ in students if d.get('RoomId') is not None})
+    messes = vacancy_map('SELECT MessId AS Id, Vacancy FROM messinfo WHERE MessId IN ({})',
+                         {d['MessId'] for _, d, _ in students if d.get('MessId') is not None})
+    blocks = vacancy_map('SELECT HostelId AS Id, Vacancy FROM blockinfo WHERE HostelId IN ({})',
+                         {d['StHostelId'] for _, d, _ in students if d.get('StHostelId') is not None})
+    wanted_names = [u for _, _, u in students if u]
+    taken_names = set()
+    if wanted_names:
+        placeholders = ', '.join(['%s'] * len(wanted_names))
+        taken_names = {r['username'] for r in query(f'SELECT username FROM login WHERE username IN ({placeholders})', tuple(wanted_names), primary=True)}
+    wanted_ids = [d['StudentId'] for _, d, _ in students if d.get('StudentId') is not None]
+    taken_ids = set()
+    if wanted_ids:
+        placeholders = ', '.join(['%s'] * len(wanted_ids))
+        taken_ids = {r['StudentId'] for r in query(f'SELECT StudentId FROM studentinfo WHERE StudentId IN ({placeholders})', tuple(wanted_ids), primary=True)}
+
+    accepted = []
+    for i, data, username in students:
+        checks = (('RoomId', rooms, 'Room'), ('MessId', messes, 'Mess'), ('StHostelId', blocks, 'Block'))
+        error = None
+        for field, vacancies, label in checks:
+            ref = data.get(field)
+            if ref is None:
+                continue
+            if ref not in vacancies:
+                error = f'{label} {ref} does not exist'
+            elif vacancies[ref] <= 0:
+                error = f'{label} {ref} has no vacancy'
+            if error:
+                break
+        if not error and username in taken_names:
+            error = f'Username {username} already exists'
+        if not error and data.get('StudentId') in taken_ids:
+            error = f'StudentId {data["StudentId"]} already exists'
+        if error:
+            results[i] = {'row': i, 'status': 'rejected', 'error': error}
+            continue
+        for field, vacancies, _ in checks:
+            if data.get(field) is not None:
+                vacancies[data[field]] -= 1
+        if username:
+            taken_names.add(username)
+        if data.get('StudentId') is not None:
+            taken_ids.add(data['StudentId'])
+        accepted.append((i, data, username))
+
+    if accepted and not dry_run:
+        fees_col = detect_fees_column() or 'FeesPaid'
+        try:
+            with unit_of_work() as uow:
+                # Ids are handed out up front so FeesInfo and login rows can be batched too;
+                # FOR UPDATE holds off concurrent inserts until this batch commits
+                max_id = uow.query('SELECT COALESCE(MAX(StudentId), 0) AS MaxId FROM studentinfo FOR UPDATE')[0]['MaxId']
+                next_id = max([max_id, *taken_ids]) + 1
+
+                # Pass 2 read vacancy unlocked; lock it now and give up if another write has used it since
+                counts = {field: {} for field, _, _, _ in PLACEMENT_FIELDS}
+                for field, table, id_col, label in PLACEMENT_FIELDS:
+                    for _, data, _ in accepted:
+                        if data.get(field) is not None:
+                            counts[field][data[field]] = counts[field].get(data[field], 0) + 1
+                    if not counts[field]:
+                        continue
+                    id_col = id_col or room_col
+                    placeholders = ', '.join(['%s'] * len(counts[field]))
+                    locked = {r['Id']: r['Vacancy'] or 0 for r in uow.query(
+                        f'SELECT {id_col} AS Id, Vacancy FROM {table} WHERE {id_col} IN ({placeholders}) FOR UPDATE',
+                        tuple(counts[field]))}
+                    for ref, n in counts[field].items():
+                        if locked.get(ref, 0) < n:
+                            return jsonify({'error': f'Import rolled back, nothing was added: {label} {ref} has '
+                                                     f'{locked.get(ref, 0)} places left for {n} students'}), 409
+                for _, data, _ in accepted:
+                    if data.get('StudentId') is None:
+                        data['StudentId'] = next_id
+                        next_id += 1
+
+                # executemany turns each group of rows with the same columns into multi-row INSERTs
+                by_shape = {}
+                for _, data, _ in accepted:
+                    fields = studentinfo_fields(data)
+                    by_shape.setdefault(fields, []).append(tuple(data[f] for f in fields))
+                for fields, values in by_shape.items():
+                    # trg_reduce_room_vacancy still checks and reduces room vacancy row by row
+                    uow.executemany(studentinfo_sql('insert', fields), values)
+
+                uow.executemany(f'INSERT INTO FeesInfo (StudentId, {fees_col}) VALUES (%s, %s)',
+                                [(data['StudentId'], 0) for _, data, _ in accepted])
+                uow.executemany('INSERT INTO login (id, username, password, role) VALUES (%s, %s, %s, %s)',
+                                [(data['StudentId'], username or f'student{data["StudentId"]}',
+                                  data.get('Password') or 'pass123', 'student') for _, data, username in accepted])
+
+                # Update mess and block vacancy manually (no triggers for these), once per id
+                for table, id_col, field in (('messinfo', 'MessId', 'MessId'), ('blockinfo', 'HostelId', 'StHostelId')):
+                    if counts[field]:
+                        uow.executemany(f'UPDATE {table} SET Vacancy = Vacancy - %s WHERE {id_col} = %s',
+                                        [(n, ref) for ref, n in counts[field].items()])
+        except pymysql.err.OperationalError as e:
+            # A trigger rejected a row because vacancy changed since validation; nothing was committed
+            if 'Room has no vacancy' in str(e) or 'Room does not exist' in str(e):
+                return jsonify({'error': f'Import rolled back, nothing was added: {e.args[-1]}'}), 409
+            raise
+        except (pymysql.err.IntegrityError, pymysql.err.DataError) as e:
+            return jsonify({'error': f'Import rolled back, nothing was added: {e.args[-1]}'}), 409
+        except ValueError as e:
+            return jsonify({'error': f'Import rolled back, nothing was added: {e}'}), 400
+        table_versions.bump(*STUDENT_WRITE_TABLES)
+        for _, data, _ in accepted:
+            if data.get('RoomId') is not None:
+                room_index.adjust(data['RoomId'], -1)
+        publish_fees({data['StudentId']: 0 for _, data, _ in accepted})
+        publish_vacancies(rooms=[data.get('RoomId') for _, data, _ in accepted],
+                          messes=[data.get('MessId') for _, data, _ in accepted],
+                          hostels=[data.get('StHostelId') for _, data, _ in accepted])
+
+    for i, data, _ in accepted:
+        results[i] = {'row': i, 'status': 'valid' if dry_run else 'inserted'}
+        if not dry_run:
+            results[i]['StudentId'] = data['StudentId']
+    return jsonify({
+        'dry_run': dry_run,
+        'inserted': 0 if dry_run else len(accepted),
+        'valid': len(accepted),
+        'rejected': len(rows) - len(accepted),
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        'results': results,
+    })
+
+
+@app.route('/api/pool-stats')
+def pool_stats():
+    if 'user' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    if session['user'].get('role') != 'manager':
+        return jsonify({'error': 'Forbidden'}), 403
+    stats = db_pool.stats()
+    if replica_router.replicas:
+        stats['replicas'] = replica_router.stats()
+    return jsonify(stats)
+
+
+@app.route('/api/ready')
+def ready():
+    # Readiness probe for load balancers: 503 until this worker has warmed up
+    if not warm_state['warm']:
+        warm_up()
+    pool = db_pool.stats()
+    body = {
+        'ready': warm_state['warm'],
+        'pid': os.getpid(),
+        'pool_warm': warm_state['pool'],
+        'schema_loaded': warm_state['schema'],
+        'warmed_at': warm_state['warmed_at'],
+        'warmup_attempts': warm_state['attempts'],
+        'pool_size': pool.get('size'),
+        'pool_idle': pool.get('idle'),
+        'shared_versions': table_versions.shared,
+    }
+    return jsonify(body), 200 if warm_state['warm'] else 503
+
+
+@app.route('/api/login-limit-stats')
+def login_limit_stats():
+    if 'user' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    if session['user'].get('role') != 'manager':
+        return jsonify({'error': 'Forbidden'}), 403
+    stats = login_limiter.stats()
+    stats['rules'] = {kind: {'burst': rule.burst, 'per_minute': round(rule.per_second * 60, 3)}
+                      for kind, rule in login_limiter.rules.items()}
+    stats['shared'] = LOGIN_LIMIT_PATH is not None
+    return jsonify(stats)
+
+
+@app.route('/api/session-stats')
+def session_stats():
+    if 'user' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    if session['user'].get('role') != 'manager':
+        return jsonify({'error': 'Forbidden'}), 403
+    if not hasattr(app.session_interface, 'stats'):
+        return jsonify({'error': f"No stats for session type {app.config['SESSION_TYPE']}"}), 404
+    return jsonify(app.session_interface.stats())
+
+
+@app.route('/api/schema/refresh', methods=['POST'])
+def schema_refresh():
+    if 'user' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    if session['user'].get('role') != 'manager':
+        return jsonify({'error': 'Forbidden'}), 403
+    if not refresh_schema_cache():
+        return jsonify({'error': 'Schema refresh failed'}), 500
+    return jsonify({'message': 'Schema cache refreshed', 'tables': len(schema_cache.tables())})
 
 
 @app.route('/api/<table>')
@@ -479,9 +2657,131 @@ def get_table(table):
             return jsonify({'error': 'Not logged in'}), 401
         if session['user'].get('role') != 'manager':
             return jsonify({'error': 'Forbidden'}), 403
+    elif not wants_stream():
+        # Public tables change only through the write paths below, so their version is the ETag
+        variant = hashlib.md5(request.query_string).hexdigest()[:12] if request.query_string else ''
+        etag = table_versions.etag(table, variant)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag, weak=True)
+            return response
 
-    rows = query(f'SELECT * FROM {table}')
-    return jsonify(rows)
+    try:
+        if wants_stream():
+            return stream_table(table, request.args)
+        # The ETag is the primary's table version, so the page it labels must come from the primary too;
+        # a lagging replica would pin a stale body under a fresh ETag until the next write
+        rows, next_cursor = read_page(table, request.args, change_head_select(table, request.args),
+                                      primary=table.lower() in publicTables)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    head = pop_change_head(rows)
+    response = page_response(rows, next_cursor)
+    if head is not None:
+        response.headers['X-Change-Token'] = encode_cursor(head)
+    if table.lower() in publicTables:
+        response.set_etag(etag, weak=True)
+        response.last_modified = table_versions.get(table)[1]
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.route('/api/<table>/changes')
+def table_changes(table):
+    name = table.lower()
+    if name not in CHANGE_FEEDS:
+        return jsonify({'error': 'Not found'}), 404
+    publicTables = ['blockinfo','roominfo','messinfo','feesinfo']
+    if name not in publicTables:
+        if 'user' not in session:
+            return jsonify({'error': 'Not logged in'}), 401
+        if session['user'].get('role') != 'manager':
+            return jsonify({'error': 'Forbidden'}), 403
+    if not schema_cache.columns('change_log'):
+        return jsonify({'error': 'change_log is missing; run sql_scripts/change_log.sql'}), 503
+    key = schema_cache.primary_key(table)
+    if len(key) != 1:
+        return jsonify({'error': f'{table} needs a single-column primary key for a change feed'}), 503
+    key = key[0]
+
+    since = None
+    if request.args.get('since'):
+        try:
+            since = decode_cursor(request.args['since'])
+        except ValueError:
+            pass
+        if type(since) is not int or since < 0:
+            return jsonify({'error': 'Invalid token'}), 400
+
+    # The log and the rows both come from the primary; a replica behind the log would hand back stale rows
+    bounds = query(f'SELECT MIN(ChangeId) AS oldest, MAX(ChangeId) AS newest, {CHANGE_HEAD_SQL} AS head '
+                   'FROM change_log', primary=True)[0]
+    if since is None:
+        # No token yet: start from now
+        return jsonify({'key': key, 'inserted': [], 'updated': [], 'deleted': [],
+                        'next': encode_cursor(int(bounds['head'])), 'more': False})
+    oldest = bounds['oldest'] or 1
+    if since < oldest - 1 or since > (bounds['newest'] or 0):
+        # Pruned past the token, or the token is from another database: the client reloads the table
+        return jsonify({'error': 'Change token expired; reload the table'}), 410
+
+    entries, next_id, more = read_changes(since, CHANGE_FEEDS[name])
+    net = collapse_changes(entries, name)
+    deleted = sorted(row_id for row_id, op in net.items() if op == 'D')
+    changed = sorted(row_id for row_id, op in net.items() if op != 'D')
+    inserted, updated = [], []
+    if changed:
+        select, joins = 't.*', ''
+        if name == 'studentinfo':
+            fees_col = detect_fees_column() or 'FeesPaid'
+            select += f', f.{fees_col} as FeesPaid'
+            joins = 'LEFT JOIN FeesInfo f ON t.StudentId = f.StudentId'
+        rows = query(f'SELECT {select} FROM {table} t {joins} WHERE t.`{key}` IN %s ORDER BY t.`{key}`',
+                     (changed,), primary=True)
+        found = set()
+        for row in rows:
+            found.add(row[key])
+            (inserted if net.get(row[key]) == 'I' else updated).append(row)
+        # Gone again after the last entry read; the next call reports the delete too
+        deleted = sorted(set(deleted) | (set(changed) - found))
+    return jsonify({'key': key, 'inserted': inserted, 'updated': updated, 'deleted': deleted,
+                    'next': encode_cursor(next_id), 'more': more})
+
+
+@app.route('/api/events')
+def event_stream():
+    if 'user' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    if session['user'].get('role') != 'manager':
+        return jsonify({'error': 'Forbidden'}), 403
+    # Each open stream holds a request thread here, so only a few may, leaving the rest for the API
+    if not sse_slots.acquire(blocking=False):
+        response = jsonify({'error': 'Live updates unavailable on this server, poll /api/<table>/changes instead'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(int(SSE_STREAM_SECONDS))
+        return response
+    try:
+        subscription = broadcaster.subscribe(Subscription(EVENTS_QUEUE_SIZE), request.headers.get('Last-Event-ID'))
+    except BaseException:
+        sse_slots.release()
+        raise
+
+    def close():
+        broadcaster.unsubscribe(subscription)
+        sse_slots.release()
+
+    def generate():
+        deadline = time.monotonic() + SSE_STREAM_SECONDS
+        yield 'retry: 2000\n\n'
+        while time.monotonic() < deadline:
+            event = subscription.get(SSE_HEARTBEAT_SECONDS)
+            yield sse_message(event) if event else ': keep-alive\n\n'
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.call_on_close(close)
+    return response
 
 
 @app.route('/api/studentinfo/<int:student_id>/fees', methods=['PUT'])
@@ -497,9 +2797,31 @@ def update_fees(student_id):
     
     # Use stored procedure to update fees
     call_procedure('sp_update_fee_payment', (student_id, fees))
+    dashboard_cache.invalidate(student_id)
+    table_versions.bump('feesinfo')
+    publish_fees({student_id: fees})
     return jsonify({'message': 'Fees updated successfully'})
 
 
+@app.route('/api/fees/outstanding')
+def fees_outstanding():
+    if 'user' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    if session['user'].get('role') != 'manager':
+        return jsonify({'error': 'Forbidden'}), 403
+    try:
+        limit = int(request.args.get('limit', TABLE_PAGE_DEFAULT))
+        min_balance = float(request.args.get('min', 0.01))
+        hostel_id = int(request.args['hostel']) if request.args.get('hostel') else None
+        ids = [int(i) for i in request.args['ids'].split(',')] if request.args.get('ids') else None
+    except ValueError:
+        return jsonify({'error': 'limit, min, hostel and ids must be numbers'}), 400
+    if limit < 1 or limit > TABLE_PAGE_MAX:
+        return jsonify({'error': f'limit must be between 1 and {TABLE_PAGE_MAX}'}), 400
+    rows = outstanding_fees(ids, min_balance=min_balance, hostel_id=hostel_id, limit=limit)
+    return jsonify({'TotalFees': TOTAL_FEES, 'count': len(rows), 'students': rows})
+
+
 @app.route('/api/studentinfo/<int:student_id>/assign-room', methods=['POST'])
 def assign_room(student_id):
     if 'user' not in session:
@@ -516,10 +2838,261 @@ def assign_room(student_id):
     try:
         # Use stored procedure to assign room
         call_procedure('sp_assign_room', (student_id, room_no, hostel_id))
+        dashboard_cache.invalidate(student_id)
+        table_versions.bump(*ROOM_WRITE_TABLES)
+        room_index.refresh_rooms([room_no])
+        publish_vacancies(rooms=[room_no], hostels=[hostel_id])
         return jsonify({'message': 'Room assigned successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
 
+# Attempts at the guarded vacancy UPDATE before auto-assign gives up on a contended block
+AUTO_ASSIGN_ATTEMPTS = int(os.environ.get('AUTO_ASSIGN_ATTEMPTS', 3))
+
+
+def block_hostel_id(uow, block_col, block):
+    # roominfo names its block by BlockId, students by blockinfo.HostelId; map one to the other
+    if block_col == 'HostelId' or 'HostelId' not in schema_cache.columns('blockinfo') \
+            or block_col not in schema_cache.columns('blockinfo'):
+        return block
+    rows = uow.query(f'SELECT HostelId FROM blockinfo WHERE {block_col} = %s', (block,))
+    return rows[0]['HostelId'] if rows else block
+
+
+@app.route('/api/studentinfo/<int:student_id>/auto-assign', methods=['POST'])
+def auto_assign_room(student_id):
+    if 'user' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    if session['user'].get('role') != 'manager':
+        return jsonify({'error': 'Forbidden'}), 403
+    data = request.get_json(silent=True) or {}
+    block = data.get('Block')
+    filters = {c: data[c] for c in room_index.group_by if data.get(c) is not None}
+    spread = data.get('strategy') == 'spread'
+    room_col = schema_cache.room_id_column()
+
+    taken = None
+    try:
+        with unit_of_work() as uow:
+            rows = uow.query('SELECT RoomId, StHostelId FROM studentinfo WHERE StudentId = %s FOR UPDATE', (student_id,))
+            if not rows:
+                return jsonify({'error': 'Student not found'}), 404
+            student = rows[0]
+
+            for _ in range(AUTO_ASSIGN_ATTEMPTS):
+                taken = room_index.take(block, spread=spread, exclude=student.get('RoomId'), **filters)
+                if taken is None:
+                    return jsonify({'error': 'No room with vacancy matches'}), 409
+                # The index can lag other writers; the guarded UPDATE is what actually claims the bed
+                uow.execute(f'UPDATE roominfo SET Vacancy = Vacancy - 1 WHERE {room_col} = %s AND Vacancy > 0', (taken['RoomNo'],))
+                if uow.rowcount:
+                    break
+                # Someone else took the bed first: give back this reservation, then read what is really left
+                room_index.adjust(taken['RoomNo'], 1)
+                lost, taken = taken['RoomNo'], None
+                room_index.refresh_rooms([lost])
+            if taken is None:
+                return jsonify({'error': 'Rooms filled up concurrently, try again'}), 409
+
+            block_col = (room_index.key_columns or [None])[0]
+            hostel_id = student.get('StHostelId')
+            if block_col:
+                hostel_id = block_hostel_id(uow, block_col, taken[block_col])
+
+            # studentinfo has no update trigger, so the old room and block get their places back here
+            if student.get('RoomId') is not None:
+                uow.execute(f'UPDATE roominfo SET Vacancy = Vacancy + 1 WHERE {room_col} = %s', (student['RoomId'],))
+            if hostel_id != student.get('StHostelId'):
+                if student.get('StHostelId'):
+                    uow.execute('UPDATE blockinfo SET Vacancy = Vacancy + 1 WHERE HostelId = %s', (student['StHostelId'],))
+                uow.execute('UPDATE blockinfo SET Vacancy = Vacancy - 1 WHERE HostelId = %s AND Vacancy > 0', (hostel_id,))
+            uow.execute('UPDATE studentinfo SET RoomId = %s, StHostelId = %s WHERE StudentId = %s',
+                        (taken['RoomNo'], hostel_id, student_id))
+    except BaseException:
+        if taken is not None:
+            room_index.adjust(taken['RoomNo'], 1)
+        raise
+    if student.get('RoomId') is not None:
+        room_index.adjust(student['RoomId'], 1)
+    dashboard_cache.invalidate(student_id)
+    table_versions.bump(*ROOM_WRITE_TABLES)
+    publish_vacancies(rooms=[taken['RoomNo'], student.get('RoomId')], hostels=[hostel_id, student.get('StHostelId')])
+    return jsonify({'message': 'Room assigned', 'RoomNo': taken['RoomNo'], 'HostelId': hostel_id})
+
+
+# roomapplication columns the allocator understands, in the order they are looked for
+APPLICATION_BLOCK_PREFS = ('Preference1', 'Preference2', 'Preference3', 'PreferredBlock', 'BlockId', 'HostelId')
+APPLICATION_ROOM_PREFS = ('PreferredRoom', 'RoomNo', 'RoomId')
+APPLICATION_DATE_COLUMNS = ('AppliedOn', 'ApplicationDate', 'CreatedAt', 'Date')
+
+
+@app.route('/api/roomapplication/allocate', methods=['POST'])
+def allocate_applications():
+    if 'user' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    if session['user'].get('role') != 'manager':
+        return jsonify({'error': 'Forbidden'}), 403
+    started = time.perf_counter()
+    options = request.get_json(silent=True) or {}
+    dry_run = request.args.get('dry_run') in ('1', 'true') or bool(options.get('dry_run'))
+    columns = schema_cache.columns('roomapplication')
+    if 'StudentId' not in columns:
+        return jsonify({'error': 'roomapplication has no StudentId column'}), 503
+    app_pk = (schema_cache.primary_key('roomapplication') or ['StudentId'])[0]
+    block_prefs = [c for c in APPLICATION_BLOCK_PREFS if c in columns]
+    room_pref = next((c for c in APPLICATION_ROOM_PREFS if c in columns), None)
+    has_status = 'Status' in columns
+    # Highest Priority first, then first come first served
+    order = (['Priority DESC'] if 'Priority' in columns else []) \
+        + [c for c in APPLICATION_DATE_COLUMNS if c in columns][:1] + [app_pk]
+    room_col = schema_cache.room_id_column()
+    block_cols = schema_cache.columns('blockinfo')
+    block_col = next((c for c in ('BlockId', 'HostelId', 'StHostelId') if c in schema_cache.columns('roominfo')), None)
+    if block_col is None:
+        return jsonify({'error': 'roominfo has no block column'}), 503
+
+    try:
+        with unit_of_work() as uow:
+            # Locked for the whole solve so capacity cannot change between reading and writing
+            rooms = uow.query(f'SELECT {room_col} AS RoomNo, {block_col} AS Block, Vacancy FROM roominfo FOR UPDATE')
+            hostel_of = {}
+            if block_col != 'HostelId' and block_col in block_cols and 'HostelId' in block_cols:
+                hostel_of = {r['Block']: r['HostelId'] for r in
+                             uow.query(f'SELECT {block_col} AS Block, HostelId FROM blockinfo')}
+            block_of_hostel = {h: b for b, h in hostel_of.items()}
+
+            select = ', '.join(dict.fromkeys([f'a.{app_pk} AS AppId', 'a.StudentId', 's.RoomId', 's.StHostelId']
+                                              + [f'a.{c} AS `pref:{c}`' for c in block_prefs]
+                                              + ([f'a.{room_pref} AS PrefRoom'] if room_pref else [])))
+            pending = "(a.Status IS NULL OR a.Status = 'Pending')" if has_status else 's.RoomId IS NULL'
+            rows = uow.query(f'SELECT {select} FROM roomapplication a '
+                             f'JOIN studentinfo s ON s.StudentId = a.StudentId '
+                             f'WHERE {pending} ORDER BY {", ".join("a." + c for c in order)} FOR UPDATE')
+
+            applications = []
+            for row in rows:
+                blocks = []
+                for c in block_prefs:
+                    value = row[f'pref:{c}']
+                    if value is None:
+                        continue
+                    # Preferences naming blockinfo.HostelId are mapped to the roominfo block they belong to
+                    if c == 'HostelId' and block_of_hostel:
+                        value = block_of_hostel.get(value, value)
+                    if value not in blocks:
+                        blocks.append(value)
+                applications.append({'id': row['AppId'], 'student': row['StudentId'], 'blocks': blocks,
+                                     'room': row.get('PrefRoom'), 'current': row['RoomId'],
+                                     'hostel': row['StHostelId']})
+            placed, unplaced, stats = allocate(
+                applications, ((r['RoomNo'], r['Block'], r['Vacancy']) for r in rooms),
+                fallback=options.get('fallback', True), spread=options.get('strategy') == 'spread')
+
+            if placed and not dry_run:
+                block_by_room = {r['RoomNo']: r['Block'] for r in rooms}
+                room_delta, hostel_delta = {}, {}
+                assignments = []
+                for application, room_no in placed:
+                    hostel_id = hostel_of.get(block_by_room[room_no], block_by_room[room_no])
+                    assignments.append((room_no, hostel_id, application['student']))
+                    room_delta[room_no] = room_delta.get(room_no, 0) - 1
+                    hostel_delta[hostel_id] = hostel_delta.get(hostel_id, 0) - 1
+                    # studentinfo has no update trigger, so beds given up by movers are returned here
+                    if application['current'] is not None:
+                        room_delta[application['current']] = room_delta.get(application['current'], 0) + 1
+                    if application['hostel']:
+                        hostel_delta[application['hostel']] = hostel_delta.get(application['hostel'], 0) + 1
+                uow.executemany('UPDATE studentinfo SET RoomId = %s, StHostelId = %s WHERE StudentId = %s', assignments)
+                uow.executemany(f'UPDATE roominfo SET Vacancy = GREATEST(Vacancy + %s, 0) WHERE {room_col} = %s',
+                                [(n, ref) for ref, n in room_delta.items() if n])
+                uow.executemany('UPDATE blockinfo SET Vacancy = GREATEST(Vacancy + %s, 0) WHERE HostelId = %s',
+                                [(n, ref) for ref, n in hostel_delta.items() if n])
+                if has_status:
+                    uow.executemany(f"UPDATE roomapplication SET Status = 'Approved' WHERE {app_pk} = %s",
+                                    [(application['id'],) for application, _ in placed])
+    except pymysql.err.OperationalError as e:
+        if 'Room has no vacancy' in str(e) or 'Room does not exist' in str(e):
+            return jsonify({'error': f'Allocation rolled back, nothing was assigned: {e.args[-1]}'}), 409
+        raise
+
+    if placed and not dry_run:
+        table_versions.bump(*ROOM_WRITE_TABLES, 'roomapplication')
+        dashboard_cache.invalidate()
+        room_index.invalidate()
+        publish_vacancies(rooms=room_delta, hostels=hostel_delta)
+    stats['dry_run'] = dry_run
+    stats['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    stats['assignments'] = [{'ApplicationId': a['id'], 'StudentId': a['student'], 'RoomNo': room_no}
+                            for a, room_no in placed]
+    stats['unplaced_applicants'] = [{'ApplicationId': a['id'], 'StudentId': a['student'], 'reason': reason}
+                                    for a, reason in unplaced]
+    return jsonify(stats)
+
+
+@app.route('/api/summary')
+def hostel_summary():
+    if 'user' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    if session['user'].get('role') != 'manager':
+        return jsonify({'error': 'Forbidden'}), 403
+    try:
+        return jsonify(load_summary())
+    except pymysql.err.ProgrammingError:
+        return jsonify({'error': 'hostel_summary is missing; run sql_scripts/hostel_summary.sql and rebuild it'}), 503
+
+
+@app.route('/api/summary/rebuild', methods=['POST'])
+def hostel_summary_rebuild():
+    if 'user' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    if session['user'].get('role') != 'manager':
+        return jsonify({'error': 'Forbidden'}), 403
+    check_only = request.args.get('check') in ('1', 'true')
+    drift = rebuild_summary(check_only=check_only)
+    return jsonify({'check_only': check_only, 'drifted': len(drift), 'repaired': 0 if check_only else len(drift), 'rows': drift})
+
+
+@app.cli.command('rebuild-summary')
+@click.option('--check', is_flag=True, help='Only report drift, do not rewrite the table')
+def rebuild_summary_command(check):
+    """Recompute hostel_summary from studentinfo, FeesInfo and roominfo."""
+    refresh_schema_cache()
+    drift = rebuild_summary(check_only=check)
+    for row in drift:
+        click.echo(f"{row['Scope']} {row['ScopeId']}: stored {row['stored']}, actual {row['actual']}")
+    click.echo(f"{len(drift)} row(s) drifted" + ('' if check or not drift else ', repaired'))
+
+
+@app.cli.command('prune-changes')
+@click.option('--days', type=float, default=CHANGE_LOG_RETENTION_DAYS, show_default=True,
+              help='Keep change_log entries this many days old or newer')
+def prune_changes_command(days):
+    """Delete old change_log entries; clients holding older tokens reload their table."""
+    newest = query('SELECT MAX(ChangeId) AS newest FROM change_log', primary=True)[0]['newest']
+    total = 0
+    # Small batches keep each delete's locks short; the newest entry stays so tokens keep their place
+    while newest:
+        with unit_of_work() as uow:
+            uow.execute('DELETE FROM change_log WHERE ChangedAt < NOW(6) - INTERVAL %s SECOND AND ChangeId < %s '
+                        'ORDER BY ChangeId LIMIT 10000', (int(days * 86400), newest))
+            deleted = uow.rowcount
+        total += deleted
+        if deleted < 10000:
+            break
+    click.echo(f'{total} change_log entries deleted')
+
+
+@app.route('/api/room-index-stats')
+def room_index_stats():
+    if 'user' not in session:
+        return jsonify({'error': 'Not logged in'}), 401
+    if session['user'].get('role') != 'manager':
+        return jsonify({'error': 'Forbidden'}), 403
+    return jsonify(room_index.stats())
+
+
 if __name__ == '__main__':
+    # Development server; see gunicorn.conf.py for production
+    warm_up()
     app.run(host='0.0.0.0', port=3000, debug=True)
@@ -0,0 +1,58 @@
+"""
+Production server settings
+
+    gunicorn -c gunicorn.conf.py flask_app:app
+
+kill -HUP <master pid> reloads gracefully: new workers warm up and old ones finish their requests.
+
+Each worker opens its pool and loads the schema cache before accepting connections;
+/api/ready answers 503 until then, so point load-balancer health checks at it. Table
+ETags, dashboard invalidations, login buckets and live events are shared between workers
+through SQLite files. Every worker has its own pool, so MySQL needs up to
+WEB_CONCURRENCY x DB_POOL_MAX connections.
+"""
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+bind = os.environ.get('BIND', '0.0.0.0:3000')
+# One worker process per core, each with a few threads for requests waiting on MySQL
+workers = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))
+worker_class = 'gthread'
+# Open /api/events streams each hold a thread for minutes, so they get their own on top of WEB_THREADS
+threads = int(os.environ.get('WEB_THREADS', 4)) + int(os.environ.setdefault('SSE_MAX_STREAMS', '16'))
+# Recycle a worker after this many requests (0 = never); the jitter keeps workers from restarting together
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', max_requests // 10))
+# Seconds a stopping worker gets to finish its requests
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+timeout = int(os.environ.get('WEB_TIMEOUT', 60))
+# Each worker imports the app itself: pools, sockets and background threads must not cross a fork
+preload_app = False
+
+# Every worker hands out and honours the same table ETags and dashboard cache invalidations,
+os.environ.setdefault('TABLE_VERSIONS_PATH', os.path.join(BASE_DIR, 'flask_session', 'table_versions.db'))
+# and draw login attempts from the same rate-limit buckets
+os.environ.setdefault('LOGIN_LIMIT_PATH', os.path.join(BASE_DIR, 'flask_session', 'login_limits.db'))
+# and push /api/events to streams open on any of them
+os.environ.setdefault('EVENTS_PATH', os.path.join(BASE_DIR, 'flask_session', 'events.db'))
+
+
+def on_starting(server):
+    # Versions and events from an earlier run may not match the data any more; a HUP reload keeps them
+    for path in (os.environ['TABLE_VERSIONS_PATH'], os.environ['EVENTS_PATH']):
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                os.remove(path + suffix)
+            except FileNotFoundError:
+                pass
+
+
+def post_worker_init(worker):
+    # Runs in the worker before it accepts connections
+    import flask_app
+    if not flask_app.warm_up():
+        worker.log.warning('Worker %s started cold; /api/ready reports 503 until the database answers', worker.pid)
+    if worker.cfg.threads <= flask_app.SSE_MAX_STREAMS:
+        worker.log.warning('Worker %s has %s threads for SSE_MAX_STREAMS=%s; open event streams can take every '
+                           'thread and stall other requests', worker.pid, worker.cfg.threads, flask_app.SSE_MAX_STREAMS)
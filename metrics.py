@@ -0,0 +1,146 @@
+"""
+Request and database metrics, rendered in the Prometheus text format
+"""
+import bisect
+import contextvars
+import threading
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Upper bounds of the statements-per-request histogram buckets
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+ROUTE_LABELS = ('route', 'method')
+STATUS_LABELS = ('route', 'method', 'status')
+INF_LABEL = 'le="+Inf"'
+
+# [statements, seconds] for the request being handled in this context
+_request_db = contextvars.ContextVar('request_db', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Histogram:
+    """Bucket counts, sum and count for one label set"""
+
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, size):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Metrics:
+    """Registry for request latency, status counts, per-request DB work and gauges"""
+
+    def __init__(self, namespace='hostelease'):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._latency = {}     # (route, method) -> Histogram
+        self._statements = {}  # (route, method) -> Histogram
+        self._db_time = {}     # (route, method) -> Histogram
+        self._status = {}      # (route, method, status) -> count
+        self._db_total = [0, 0.0]
+        self._gauges = []      # (prefix, help, callable returning a dict)
+
+    def start_request(self):
+        return _request_db.set([0, 0.0])
+
+    def record_db(self, seconds, statements=1):
+        """Count a statement against the current request, if there is one"""
+        stats = _request_db.get()
+        if stats is not None:
+            stats[0] += statements
+            stats[1] += seconds
+        with self._lock:
+            self._db_total[0] += statements
+            self._db_total[1] += seconds
+
+    def request_db(self):
+        stats = _request_db.get()
+        return (stats[0], stats[1]) if stats is not None else (0, 0.0)
+
+    def finish_request(self, route, method, status, seconds, token=None):
+        statements, db_seconds = self.request_db()
+        if token is not None:
+            _request_db.reset(token)
+        key = (route, method)
+        with self._lock:
+            self._observe(self._latency, key, LATENCY_BUCKETS, seconds)
+            self._observe(self._statements, key, STATEMENT_BUCKETS, statements)
+            self._observe(self._db_time, key, LATENCY_BUCKETS, db_seconds)
+            status_key = (route, method, str(status))
+            self._status[status_key] = self._status.get(status_key, 0) + 1
+
+    @staticmethod
+    def _observe(histograms, key, buckets, value):
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram(len(buckets))
+        i = bisect.bisect_left(buckets, value)
+        if i < len(buckets):
+            histogram.counts[i] += 1
+        histogram.sum += value
+        histogram.count += 1
+
+    def gauge(self, prefix, help_text, source):
+        """Export every numeric value of source() as <namespace>_<prefix>_<key>"""
+        self._gauges.append((prefix, help_text, source))
+
+    def _render_histograms(self, lines, name, help_text, histograms, buckets):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for key, histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(buckets, histogram.counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f'{name}_bucket{_labels(ROUTE_LABELS, key, le)} {cumulative}')
+            lines.append(f'{name}_bucket{_labels(ROUTE_LABELS, key, INF_LABEL)} {histogram.count}')
+            lines.append(f'{name}_sum{_labels(ROUTE_LABELS, key)} {histogram.sum:.6f}')
+            lines.append(f'{name}_count{_labels(ROUTE_LABELS, key)} {histogram.count}')
+
+    def render(self):
+        ns = self.namespace
+        lines = []
+        with self._lock:
+            self._render_histograms(lines, f'{ns}_request_duration_seconds', 'Request latency by route',
+                                    self._latency, LATENCY_BUCKETS)
+            self._render_histograms(lines, f'{ns}_request_db_statements', 'Database statements per request',
+                                    self._statements, STATEMENT_BUCKETS)
+            self._render_histograms(lines, f'{ns}_request_db_seconds', 'Database time per request',
+                                    self._db_time, LATENCY_BUCKETS)
+            lines.append(f'# HELP {ns}_requests_total Responses by route and status')
+            lines.append(f'# TYPE {ns}_requests_total counter')
+            for key, count in sorted(self._status.items()):
+                lines.append(f'{ns}_requests_total{_labels(STATUS_LABELS, key)} {count}')
+            lines.append(f'# HELP {ns}_db_statements_total Database statements run')
+            lines.append(f'# TYPE {ns}_db_statements_total counter')
+            lines.append(f'{ns}_db_statements_total {self._db_total[0]}')
+            lines.append(f'# HELP {ns}_db_seconds_total Time spent in database statements')
+            lines.append(f'# TYPE {ns}_db_seconds_total counter')
+            lines.append(f'{ns}_db_seconds_total {self._db_total[1]:.6f}')
+        for prefix, help_text, source in self._gauges:
+            try:
+                values = source()
+            except Exception as e:
+                lines.append(f'# {ns}_{prefix} unavailable: {_escape(e)}')
+                continue
+            for key, value in sorted(values.items()):
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f'{ns}_{prefix}_{key}'
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} gauge')
+                lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
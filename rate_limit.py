@@ -0,0 +1,151 @@
+"""
+Token-bucket rate limiting, in process memory or in a SQLite file shared by the worker processes
+
+POST /api/login takes a token for the username (LOGIN_LIMIT_USER_BURST, default 5, refilled
+at LOGIN_LIMIT_USER_PER_MINUTE) and one for the client IP (LOGIN_LIMIT_IP_BURST, default 100,
+refilled at LOGIN_LIMIT_IP_PER_MINUTE; looser, as a hostel may share one address) before
+MySQL is queried. A burst of 0 turns a limit off. Behind a reverse proxy the client IP is
+the proxy's unless the app is wrapped in Werkzeug's ProxyFix.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# burst: attempts allowed at once; per_second: tokens added back per second
+Rule = namedtuple('Rule', 'burst per_second')
+
+
+class TokenBucketLimiter:
+    """Token buckets per (kind, key), e.g. per username and per client IP, kept in this process"""
+
+    def __init__(self, rules, max_keys=100000):
+        # Rules with no burst are switched off
+        self.rules = {kind: rule for kind, rule in rules.items() if rule.burst > 0 and rule.per_second > 0}
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # 'kind:key' -> (tokens, updated)
+        self._stats = {'allowed': 0, 'rejected': 0}
+        for kind in self.rules:
+            self._stats[f'rejected_{kind}'] = 0
+
+    def _names(self, keys):
+        return [(kind, f'{kind}:{value}') for kind, value in keys.items() if value and kind in self.rules]
+
+    def _apply(self, names, current, now):
+        """(seconds to wait, new bucket states, kind that ran out); the wait is 0 when allowed"""
+        wait, rejected_kind, states = 0.0, None, {}
+        for kind, name in names:
+            rule = self.rules[kind]
+            tokens, updated = current.get(name) or (rule.burst, now)
+            tokens = min(rule.burst, tokens + max(now - updated, 0) * rule.per_second)
+            if tokens < 1:
+                needed = (1 - tokens) / rule.per_second
+                if needed > wait:
+                    wait, rejected_kind = needed, kind
+            states[name] = (tokens - 1, now)
+        return (wait, None, rejected_kind) if rejected_kind else (0.0, states, None)
+
+    def _count(self, rejected_kind):
+        with self._lock:
+            if rejected_kind:
+                self._stats['rejected'] += 1
+                self._stats[f'rejected_{rejected_kind}'] += 1
+            else:
+                self._stats['allowed'] += 1
+
+    def take(self, **keys):
+        """Take one token from each key's bucket; returns seconds to wait (0 = go ahead, nothing taken otherwise)"""
+        names = self._names(keys)
+        if not names:
+            return 0.0
+        now = time.time()
+        with self._lock:
+            wait, states, rejected_kind = self._apply(names, {n: self._buckets.get(n) for _, n in names}, now)
+            if states:
+                for name, state in states.items():
+                    self._buckets[name] = state
+                    self._buckets.move_to_end(name)
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+        self._count(rejected_kind)
+        return wait
+
+    def tracked(self):
+        return len(self._buckets)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['tracked_keys'] = self.tracked()
+        return stats
+
+
+class SQLiteTokenBucketLimiter(TokenBucketLimiter):
+    """Token buckets in a SQLite file, so every worker process on the host draws from the same buckets"""
+
+    # Full buckets carry no state, so their rows are dropped every this many takes
+    SWEEP_EVERY = 1000
+
+    def __init__(self, path, rules, max_keys=100000):
+        super().__init__(rules, max_keys)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._takes = 0
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS buckets (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+        ''')
+
+    def _conn(self):
+        # sqlite3 connections must stay on the thread that opened them
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA synchronous=OFF')  # losing a few buckets in a crash is harmless
+            self._local.conn = conn
+        return conn
+
+    def take(self, **keys):
+        names = self._names(keys)
+        if not names:
+            return 0.0
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            placeholders = ', '.join('?' * len(names))
+            rows = conn.execute(f'SELECT name, tokens, updated FROM buckets WHERE name IN ({placeholders})',
+                                [name for _, name in names]).fetchall()
+            wait, states, rejected_kind = self._apply(names, {r[0]: (r[1], r[2]) for r in rows}, now)
+            if states:
+                conn.executemany('INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)',
+                                 [(name, tokens, updated) for name, (tokens, updated) in states.items()])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._count(rejected_kind)
+        with self._lock:
+            self._takes += 1
+            sweep = self._takes % self.SWEEP_EVERY == 0
+        if sweep:
+            self.sweep()
+        return wait
+
+    def sweep(self):
+        # A bucket idle for longer than it takes to refill completely is back at full burst
+        longest = max(rule.burst / rule.per_second for rule in self.rules.values())
+        return self._conn().execute('DELETE FROM buckets WHERE updated < ?', (time.time() - longest,)).rowcount
+
+    def tracked(self):
+        return self._conn().execute('SELECT COUNT(*) FROM buckets').fetchone()[0]
@@ -0,0 +1,245 @@
+"""
+Session backend: small in-process LRU in front of a shared SQLite (WAL) store
+
+Every worker process on the host opens the same file (SESSION_DB_PATH, default
+flask_session/sessions.db). A worker serves a session from its LRU (SESSION_LRU_SIZE
+entries) for up to SESSION_LRU_TTL seconds before re-reading the store, and each cached
+read still checks that the row exists, so a logout in one worker ends the session in all
+of them. Expired rows are removed every SESSION_SWEEP_INTERVAL seconds; hit rate and
+store size are at /api/session-stats.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask_session.base import ServerSideSession, ServerSideSessionInterface
+from itsdangerous import BadSignature
+
+log = logging.getLogger(__name__)
+
+
+class SQLiteSessionStore:
+    """Session rows in one SQLite file that every worker process on the host can open"""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                expires REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires)')
+
+    def _conn(self):
+        # sqlite3 connections must stay on the thread that opened them
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT data, expires FROM sessions WHERE id = ? AND expires > ?', (key, time.time())
+        ).fetchone()
+        return (bytes(row[0]), row[1]) if row else None
+
+    def exists(self, key):
+        # Reads only the primary key index, not the session data
+        return self._conn().execute('SELECT 1 FROM sessions WHERE id = ?', (key,)).fetchone() is not None
+
+    def set(self, key, data, expires):
+        self._conn().execute(
+            'INSERT INTO sessions (id, data, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET data = excluded.data, expires = excluded.expires',
+            (key, data, expires))
+
+    def delete(self, key):
+        self._conn().execute('DELETE FROM sessions WHERE id = ?', (key,))
+
+    def delete_expired(self):
+        return self._conn().execute('DELETE FROM sessions WHERE expires <= ?', (time.time(),)).rowcount
+
+    def stats(self):
+        count, size = self._conn().execute('SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM sessions').fetchone()
+        return {'store_size': count, 'store_bytes': size}
+
+
+class LRUSessionCache:
+    """Bounded, thread-safe LRU of encoded sessions kept for a few seconds, so they are not read and decoded again"""
+
+    def __init__(self, max_entries=10000, ttl=5):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (data, store expiry, cache expiry)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] <= now or entry[1] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def set(self, key, data, expires):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = (data, expires, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_expired(self):
+        now = time.time()
+        with self._lock:
+            expired = [k for k, entry in self._entries.items() if entry[2] <= now or entry[1] <= now]
+            for key in expired:
+                del self._entries[key]
+        return len(expired)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TieredSession(ServerSideSession):
+    pass
+
+
+class TieredSessionInterface(ServerSideSessionInterface):
+    """Flask-Session interface reading through the LRU and writing through to SQLite"""
+
+    session_class = TieredSession
+    ttl = True  # expiry is enforced on read and by the sweeper, not by Flask-Session's cleanup hooks
+
+    def __init__(self, app, store, cache, sweep_interval=60, **kwargs):
+        self.store = store
+        self.cache = cache
+        self.sweep_interval = sweep_interval
+        self._stats_lock = threading.Lock()
+        self._stats = {'lru_hits': 0, 'store_hits': 0, 'misses': 0, 'revoked': 0, 'writes': 0,
+                       'skipped_writes': 0, 'deletes': 0, 'expired_swept': 0}
+        self._sweeper = None
+        super().__init__(app, **kwargs)
+        if sweep_interval:
+            self.start_sweeper()
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def _retrieve_session_data(self, store_id):
+        entry = self.cache.get(store_id)
+        if entry is not None and not self.store.exists(store_id):
+            # Logged out or revoked through another worker since this one cached it
+            self.cache.delete(store_id)
+            self._count('revoked')
+            return None
+        if entry is not None:
+            self._count('lru_hits')
+        else:
+            entry = self.store.get(store_id)
+            if entry is None:
+                self._count('misses')
+                return None
+            self._count('store_hits')
+            self.cache.set(store_id, *entry)
+        data, expires = entry
+        session_data = self.serializer.decode(data)
+        # Remembered so an unmodified session is only re-written once half its lifetime has passed
+        session_data['_store_expires'] = expires
+        return session_data
+
+    def open_session(self, app, request):
+        session = super().open_session(app, request)
+        session.store_expires = dict.pop(session, '_store_expires', None)
+        return session
+
+    def peek(self, app, cookie_value):
+        """Session data for a cookie value outside a Flask request (read-only), or None"""
+        sid = cookie_value
+        if self.use_signer:
+            try:
+                sid = self._unsign(app, cookie_value)
+            except BadSignature:
+                return None
+        data = self._retrieve_session_data(self._get_store_id(sid))
+        if data is not None:
+            data.pop('_store_expires', None)
+        return data
+
+    def should_set_storage(self, app, session):
+        if session.modified:
+            return True
+        if not app.config['SESSION_REFRESH_EACH_REQUEST']:
+            return False
+        expires = getattr(session, 'store_expires', None)
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        if expires is None or expires - time.time() < lifetime / 2:
+            return True
+        self._count('skipped_writes')
+        return False
+
+    def _delete_session(self, store_id):
+        self.cache.delete(store_id)
+        self.store.delete(store_id)
+        self._count('deletes')
+
+    def _upsert_session(self, session_lifetime, session, store_id):
+        data = self.serializer.encode(session)
+        expires = time.time() + session_lifetime.total_seconds()
+        self.store.set(store_id, data, expires)
+        self.cache.set(store_id, data, expires)
+        self._count('writes')
+
+    def _delete_expired_sessions(self):
+        removed = self.store.delete_expired()
+        self.cache.delete_expired()
+        self._count('expired_swept', removed)
+        return removed
+
+    def start_sweeper(self):
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+
+        def sweep():
+            while True:
+                time.sleep(self.sweep_interval)
+                try:
+                    self._delete_expired_sessions()
+                except sqlite3.Error as e:
+                    log.warning('Sweep failed: %s', e)
+
+        self._sweeper = threading.Thread(target=sweep, name='session-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        lookups = stats['lru_hits'] + stats['store_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['lru_hits'] + stats['store_hits']) / lookups, 4) if lookups else None
+        stats['lru_hit_rate'] = round(stats['lru_hits'] / lookups, 4) if lookups else None
+        stats['lru_size'] = len(self.cache)
+        stats.update(self.store.stats())
+        return stats
@@ -0,0 +1,195 @@
+USE hostel_db;
+
+-- Row-level change feed behind GET /api/<table>/changes. Safe to run again.
+-- Every insert, update and delete on the tracked tables appends (TableName, RowId, Op) to change_log,
+-- whichever write made it: the app, a stored procedure or another trigger (e.g. the vacancy triggers).
+-- Each tracked table also gets an updated_at column, set by MySQL on every change to the row.
+-- Prune old entries with: flask --app flask_app prune-changes
+CREATE TABLE IF NOT EXISTS change_log (
+    ChangeId BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    TableName VARCHAR(32) NOT NULL,
+    RowId BIGINT NOT NULL,
+    Op CHAR(1) NOT NULL,  -- I(nsert), U(pdate) or D(elete)
+    ChangedAt TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+    KEY idx_change_log_table (TableName, ChangeId),
+    KEY idx_change_log_changed (ChangedAt)
+);
+
+DELIMITER $$
+
+DROP PROCEDURE IF EXISTS sp_add_updated_at_if_missing$$
+CREATE PROCEDURE sp_add_updated_at_if_missing(IN p_table VARCHAR(64))
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = p_table AND column_name = 'updated_at'
+    ) THEN
+        SET @ddl = CONCAT('ALTER TABLE ', p_table, ' ADD COLUMN updated_at TIMESTAMP(6) NOT NULL ',
+                          'DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)');
+        PREPARE stmt FROM @ddl;
+        EXECUTE stmt;
+        DEALLOCATE PREPARE stmt;
+    END IF;
+END$$
+
+DELIMITER ;
+
+CALL sp_add_updated_at_if_missing('studentinfo');
+CALL sp_add_updated_at_if_missing('FeesInfo');
+CALL sp_add_updated_at_if_missing('roominfo');
+CALL sp_add_updated_at_if_missing('blockinfo');
+CALL sp_add_updated_at_if_missing('messinfo');
+
+DROP PROCEDURE IF EXISTS sp_add_updated_at_if_missing;
+
+DELIMITER $$
+
+-- An UPDATE that matches a row without changing it leaves updated_at alone and logs nothing.
+-- A changed primary key is logged as a delete of the old id and an insert of the new one.
+
+-- studentinfo
+DROP TRIGGER IF EXISTS trg_change_student_insert$$
+CREATE TRIGGER trg_change_student_insert
+AFTER INSERT ON studentinfo
+FOR EACH ROW
+BEGIN
+    INSERT INTO change_log (TableName, RowId, Op) VALUES ('studentinfo', NEW.StudentId, 'I');
+END$$
+
+DROP TRIGGER IF EXISTS trg_change_student_update$$
+CREATE TRIGGER trg_change_student_update
+AFTER UPDATE ON studentinfo
+FOR EACH ROW
+BEGIN
+    IF OLD.StudentId <> NEW.StudentId THEN
+        INSERT INTO change_log (TableName, RowId, Op) VALUES ('studentinfo', OLD.StudentId, 'D'), ('studentinfo', NEW.StudentId, 'I');
+    ELSEIF NOT (OLD.updated_at <=> NEW.updated_at) THEN
+        INSERT INTO change_log (TableName, RowId, Op) VALUES ('studentinfo', NEW.StudentId, 'U');
+    END IF;
+END$$
+
+DROP TRIGGER IF EXISTS trg_change_student_delete$$
+CREATE TRIGGER trg_change_student_delete
+AFTER DELETE ON studentinfo
+FOR EACH ROW
+BEGIN
+    INSERT INTO change_log (TableName, RowId, Op) VALUES ('studentinfo', OLD.StudentId, 'D');
+END$$
+
+-- FeesInfo (its rows are keyed by StudentId)
+DROP TRIGGER IF EXISTS trg_change_fees_insert$$
+CREATE TRIGGER trg_change_fees_insert
+AFTER INSERT ON FeesInfo
+FOR EACH ROW
+BEGIN
+    INSERT INTO change_log (TableName, RowId, Op) VALUES ('feesinfo', NEW.StudentId, 'I');
+END$$
+
+DROP TRIGGER IF EXISTS trg_change_fees_update$$
+CREATE TRIGGER trg_change_fees_update
+AFTER UPDATE ON FeesInfo
+FOR EACH ROW
+BEGIN
+    IF OLD.StudentId <> NEW.StudentId THEN
+        INSERT INTO change_log (TableName, RowId, Op) VALUES ('feesinfo', OLD.StudentId, 'D'), ('feesinfo', NEW.StudentId, 'I');
+    ELSEIF NOT (OLD.updated_at <=> NEW.updated_at) THEN
+        INSERT INTO change_log (TableName, RowId, Op) VALUES ('feesinfo', NEW.StudentId, 'U');
+    END IF;
+END$$
+
+DROP TRIGGER IF EXISTS trg_change_fees_delete$$
+CREATE TRIGGER trg_change_fees_delete
+AFTER DELETE ON FeesInfo
+FOR EACH ROW
+BEGIN
+    INSERT INTO change_log (TableName, RowId, Op) VALUES ('feesinfo', OLD.StudentId, 'D');
+END$$
+
+-- roominfo (replace RoomNo below if your roominfo uses another id column)
+DROP TRIGGER IF EXISTS trg_change_room_insert$$
+CREATE TRIGGER trg_change_room_insert
+AFTER INSERT ON roominfo
+FOR EACH ROW
+BEGIN
+    INSERT INTO change_log (TableName, RowId, Op) VALUES ('roominfo', NEW.RoomNo, 'I');
+END$$
+
+DROP TRIGGER IF EXISTS trg_change_room_update$$
+CREATE TRIGGER trg_change_room_update
+AFTER UPDATE ON roominfo
+FOR EACH ROW
+BEGIN
+    IF OLD.RoomNo <> NEW.RoomNo THEN
+        INSERT INTO change_log (TableName, RowId, Op) VALUES ('roominfo', OLD.RoomNo, 'D'), ('roominfo', NEW.RoomNo, 'I');
+    ELSEIF NOT (OLD.updated_at <=> NEW.updated_at) THEN
+        INSERT INTO change_log (TableName, RowId, Op) VALUES ('roominfo', NEW.RoomNo, 'U');
+    END IF;
+END$$
+
+DROP TRIGGER IF EXISTS trg_change_room_delete$$
+CREATE TRIGGER trg_change_room_delete
+AFTER DELETE ON roominfo
+FOR EACH ROW
+BEGIN
+    INSERT INTO change_log (TableName, RowId, Op) VALUES ('roominfo', OLD.RoomNo, 'D');
+END$$
+
+-- blockinfo
+DROP TRIGGER IF EXISTS trg_change_block_insert$$
+CREATE TRIGGER trg_change_block_insert
+AFTER INSERT ON blockinfo
+FOR EACH ROW
+BEGIN
+    INSERT INTO change_log (TableName, RowId, Op) VALUES ('blockinfo', NEW.BlockId, 'I');
+END$$
+
+DROP TRIGGER IF EXISTS trg_change_block_update$$
+CREATE TRIGGER trg_change_block_update
+AFTER UPDATE ON blockinfo
+FOR EACH ROW
+BEGIN
+    IF OLD.BlockId <> NEW.BlockId THEN
+        INSERT INTO change_log (TableName, RowId, Op) VALUES ('blockinfo', OLD.BlockId, 'D'), ('blockinfo', NEW.BlockId, 'I');
+    ELSEIF NOT (OLD.updated_at <=> NEW.updated_at) THEN
+        INSERT INTO change_log (TableName, RowId, Op) VALUES ('blockinfo', NEW.BlockId, 'U');
+    END IF;
+END$$
+
+DROP TRIGGER IF EXISTS trg_change_block_delete$$
+CREATE TRIGGER trg_change_block_delete
+AFTER DELETE ON blockinfo
+FOR EACH ROW
+BEGIN
+    INSERT INTO change_log (TableName, RowId, Op) VALUES ('blockinfo', OLD.BlockId, 'D');
+END$$
+
+-- messinfo
+DROP TRIGGER IF EXISTS trg_change_mess_insert$$
+CREATE TRIGGER trg_change_mess_insert
+AFTER INSERT ON messinfo
+FOR EACH ROW
+BEGIN
+    INSERT INTO change_log (TableName, RowId, Op) VALUES ('messinfo', NEW.MessId, 'I');
+END$$
+
+DROP TRIGGER IF EXISTS trg_change_mess_update$$
+CREATE TRIGGER trg_change_mess_update
+AFTER UPDATE ON messinfo
+FOR EACH ROW
+BEGIN
+    IF OLD.MessId <> NEW.MessId THEN
+        INSERT INTO change_log (TableName, RowId, Op) VALUES ('messinfo', OLD.MessId, 'D'), ('messinfo', NEW.MessId, 'I');
+    ELSEIF NOT (OLD.updated_at <=> NEW.updated_at) THEN
+        INSERT INTO change_log (TableName, RowId, Op) VALUES ('messinfo', NEW.MessId, 'U');
+    END IF;
+END$$
+
+DROP TRIGGER IF EXISTS trg_change_mess_delete$$
+CREATE TRIGGER trg_change_mess_delete
+AFTER DELETE ON messinfo
+FOR EACH ROW
+BEGIN
+    INSERT INTO change_log (TableName, RowId, Op) VALUES ('messinfo', OLD.MessId, 'D');
+END$$
+
+DELIMITER ;
@@ -0,0 +1,210 @@
+USE hostel_db;
+
+-- Running totals for the manager dashboard, kept up to date by the triggers below.
+-- Scope 'total' (ScopeId 0), 'hostel' (studentinfo.StHostelId), 'block' (roominfo.BlockId)
+-- or 'mess' (studentinfo.MessId).
+-- FeesOutstanding is SUM(GREATEST(TotalFees - FeesPaid, 0)) over the scope's students, the same figure
+-- /api/fees/outstanding adds up. TotalFees lives in hostel_summary_settings; rebuild-summary sets it from
+-- the app's TOTAL_FEES.
+-- If it ever drifts, or after TOTAL_FEES changes, rebuild it with: flask --app flask_app rebuild-summary
+CREATE TABLE IF NOT EXISTS hostel_summary (
+    Scope VARCHAR(8) NOT NULL,
+    ScopeId INT NOT NULL,
+    Students INT NOT NULL DEFAULT 0,
+    FeesCollected DECIMAL(12,2) NOT NULL DEFAULT 0,
+    FeesOutstanding DECIMAL(12,2) NOT NULL DEFAULT 0,
+    FreeBeds INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (Scope, ScopeId)
+);
+
+CREATE TABLE IF NOT EXISTS hostel_summary_settings (
+    Name VARCHAR(32) PRIMARY KEY,
+    Value DECIMAL(12,2) NOT NULL
+);
+INSERT IGNORE INTO hostel_summary_settings (Name, Value) VALUES ('TotalFees', 50000);
+
+DELIMITER $$
+
+-- Tables created by an earlier version of this script have no FeesOutstanding column
+DROP PROCEDURE IF EXISTS sp_summary_add_outstanding_if_missing$$
+CREATE PROCEDURE sp_summary_add_outstanding_if_missing()
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = 'hostel_summary' AND column_name = 'FeesOutstanding'
+    ) THEN
+        ALTER TABLE hostel_summary ADD COLUMN FeesOutstanding DECIMAL(12,2) NOT NULL DEFAULT 0 AFTER FeesCollected;
+    END IF;
+END$$
+
+DELIMITER ;
+
+CALL sp_summary_add_outstanding_if_missing();
+DROP PROCEDURE IF EXISTS sp_summary_add_outstanding_if_missing;
+
+DELIMITER $$
+
+DROP PROCEDURE IF EXISTS sp_summary_add$$
+CREATE PROCEDURE sp_summary_add(
+    IN p_scope VARCHAR(8),
+    IN p_scope_id INT,
+    IN p_students INT,
+    IN p_fees DECIMAL(12,2),
+    IN p_outstanding DECIMAL(12,2),
+    IN p_beds INT
+)
+BEGIN
+    IF p_scope_id IS NOT NULL THEN
+        INSERT INTO hostel_summary (Scope, ScopeId, Students, FeesCollected, FeesOutstanding, FreeBeds)
+        VALUES (p_scope, p_scope_id, p_students, p_fees, p_outstanding, p_beds)
+        ON DUPLICATE KEY UPDATE
+            Students = Students + p_students,
+            FeesCollected = FeesCollected + p_fees,
+            FeesOutstanding = FeesOutstanding + p_outstanding,
+            FreeBeds = FreeBeds + p_beds;
+    END IF;
+END$$
+
+-- What a student who has paid p_paid (NULL = no FeesInfo row) still owes; the only place this is worked out
+DROP FUNCTION IF EXISTS fn_summary_outstanding$$
+CREATE FUNCTION fn_summary_outstanding(p_paid DECIMAL(12,2))
+RETURNS DECIMAL(12,2)
+READS SQL DATA
+BEGIN
+    RETURN GREATEST(COALESCE((SELECT Value FROM hostel_summary_settings WHERE Name = 'TotalFees'), 0)
+                    - COALESCE(p_paid, 0), 0);
+END$$
+
+-- A student's FeesInfo row went from p_old_paid to p_new_paid (NULL = no row)
+DROP PROCEDURE IF EXISTS sp_summary_fees$$
+CREATE PROCEDURE sp_summary_fees(IN p_student_id INT, IN p_old_paid DECIMAL(12,2), IN p_new_paid DECIMAL(12,2))
+BEGIN
+    DECLARE v_students INT;
+    DECLARE v_hostel INT;
+    DECLARE v_mess INT;
+    DECLARE v_paid DECIMAL(12,2);
+    DECLARE v_owed DECIMAL(12,2) DEFAULT 0;
+    SET v_paid = COALESCE(p_new_paid, 0) - COALESCE(p_old_paid, 0);
+    SELECT COUNT(*), MAX(StHostelId), MAX(MessId) INTO v_students, v_hostel, v_mess
+    FROM studentinfo WHERE StudentId = p_student_id;
+    -- Only students owe fees; a payment without a studentinfo row is collected but changes nothing owed
+    IF v_students > 0 THEN
+        SET v_owed = fn_summary_outstanding(p_new_paid) - fn_summary_outstanding(p_old_paid);
+    END IF;
+    IF v_paid <> 0 OR v_owed <> 0 THEN
+        CALL sp_summary_add('total', 0, 0, v_paid, v_owed, 0);
+        CALL sp_summary_add('hostel', v_hostel, 0, v_paid, v_owed, 0);
+        CALL sp_summary_add('mess', v_mess, 0, 0, v_owed, 0);
+    END IF;
+END$$
+
+-- Students and what they owe per hostel and mess
+DROP TRIGGER IF EXISTS trg_summary_student_insert$$
+CREATE TRIGGER trg_summary_student_insert
+AFTER INSERT ON studentinfo
+FOR EACH ROW
+BEGIN
+    DECLARE owed DECIMAL(12,2);
+    SET owed = fn_summary_outstanding((SELECT SUM(FeesPaid) FROM FeesInfo WHERE StudentId = NEW.StudentId));
+    CALL sp_summary_add('total', 0, 1, 0, owed, 0);
+    CALL sp_summary_add('hostel', NEW.StHostelId, 1, 0, owed, 0);
+    CALL sp_summary_add('mess', NEW.MessId, 1, 0, owed, 0);
+END$$
+
+DROP TRIGGER IF EXISTS trg_summary_student_delete$$
+CREATE TRIGGER trg_summary_student_delete
+AFTER DELETE ON studentinfo
+FOR EACH ROW
+BEGIN
+    DECLARE owed DECIMAL(12,2);
+    SET owed = fn_summary_outstanding((SELECT SUM(FeesPaid) FROM FeesInfo WHERE StudentId = OLD.StudentId));
+    CALL sp_summary_add('total', 0, -1, 0, -owed, 0);
+    CALL sp_summary_add('hostel', OLD.StHostelId, -1, 0, -owed, 0);
+    CALL sp_summary_add('mess', OLD.MessId, -1, 0, -owed, 0);
+END$$
+
+DROP TRIGGER IF EXISTS trg_summary_student_update$$
+CREATE TRIGGER trg_summary_student_update
+AFTER UPDATE ON studentinfo
+FOR EACH ROW
+BEGIN
+    DECLARE paid DECIMAL(12,2);
+    DECLARE owed DECIMAL(12,2);
+    IF NOT (OLD.StHostelId <=> NEW.StHostelId) OR NOT (OLD.MessId <=> NEW.MessId) THEN
+        -- Fees already paid, and what is still owed, move with the student
+        SELECT SUM(FeesPaid) INTO paid FROM FeesInfo WHERE StudentId = NEW.StudentId;
+        SET owed = fn_summary_outstanding(paid);
+        SET paid = COALESCE(paid, 0);
+    END IF;
+    IF NOT (OLD.StHostelId <=> NEW.StHostelId) THEN
+        CALL sp_summary_add('hostel', OLD.StHostelId, -1, -paid, -owed, 0);
+        CALL sp_summary_add('hostel', NEW.StHostelId, 1, paid, owed, 0);
+    END IF;
+    IF NOT (OLD.MessId <=> NEW.MessId) THEN
+        CALL sp_summary_add('mess', OLD.MessId, -1, 0, -owed, 0);
+        CALL sp_summary_add('mess', NEW.MessId, 1, 0, owed, 0);
+    END IF;
+END$$
+
+-- Fees collected and owed (replace FeesPaid with Amount if that is the column FeesInfo has)
+DROP TRIGGER IF EXISTS trg_summary_fees_insert$$
+CREATE TRIGGER trg_summary_fees_insert
+AFTER INSERT ON FeesInfo
+FOR EACH ROW
+BEGIN
+    CALL sp_summary_fees(NEW.StudentId, NULL, NEW.FeesPaid);
+END$$
+
+DROP TRIGGER IF EXISTS trg_summary_fees_update$$
+CREATE TRIGGER trg_summary_fees_update
+AFTER UPDATE ON FeesInfo
+FOR EACH ROW
+BEGIN
+    IF OLD.StudentId <> NEW.StudentId THEN
+        CALL sp_summary_fees(OLD.StudentId, OLD.FeesPaid, NULL);
+        CALL sp_summary_fees(NEW.StudentId, NULL, NEW.FeesPaid);
+    ELSEIF NOT (OLD.FeesPaid <=> NEW.FeesPaid) THEN
+        CALL sp_summary_fees(NEW.StudentId, OLD.FeesPaid, NEW.FeesPaid);
+    END IF;
+END$$
+
+DROP TRIGGER IF EXISTS trg_summary_fees_delete$$
+CREATE TRIGGER trg_summary_fees_delete
+AFTER DELETE ON FeesInfo
+FOR EACH ROW
+BEGIN
+    CALL sp_summary_fees(OLD.StudentId, OLD.FeesPaid, NULL);
+END$$
+
+-- Free beds per block, as a delta of roominfo.Vacancy alone, so the order against other roominfo triggers does not matter
+DROP TRIGGER IF EXISTS trg_summary_room_insert$$
+CREATE TRIGGER trg_summary_room_insert
+AFTER INSERT ON roominfo
+FOR EACH ROW
+BEGIN
+    CALL sp_summary_add('total', 0, 0, 0, 0, COALESCE(NEW.Vacancy, 0));
+    CALL sp_summary_add('block', NEW.BlockId, 0, 0, 0, COALESCE(NEW.Vacancy, 0));
+END$$
+
+DROP TRIGGER IF EXISTS trg_summary_room_update$$
+CREATE TRIGGER trg_summary_room_update
+AFTER UPDATE ON roominfo
+FOR EACH ROW
+BEGIN
+    IF NOT (OLD.BlockId <=> NEW.BlockId) OR NOT (OLD.Vacancy <=> NEW.Vacancy) THEN
+        CALL sp_summary_add('total', 0, 0, 0, 0, COALESCE(NEW.Vacancy, 0) - COALESCE(OLD.Vacancy, 0));
+        CALL sp_summary_add('block', OLD.BlockId, 0, 0, 0, -COALESCE(OLD.Vacancy, 0));
+        CALL sp_summary_add('block', NEW.BlockId, 0, 0, 0, COALESCE(NEW.Vacancy, 0));
+    END IF;
+END$$
+
+DROP TRIGGER IF EXISTS trg_summary_room_delete$$
+CREATE TRIGGER trg_summary_room_delete
+AFTER DELETE ON roominfo
+FOR EACH ROW
+BEGIN
+    CALL sp_summary_add('total', 0, 0, 0, 0, -COALESCE(OLD.Vacancy, 0));
+    CALL sp_summary_add('block', OLD.BlockId, 0, 0, 0, -COALESCE(OLD.Vacancy, 0));
+END$$
+
+DELIMITER ;
@@ -0,0 +1,40 @@
+USE hostel_db;
+
+-- Indexes behind GET /api/studentinfo/search. Safe to run again: existing indexes are skipped.
+--   name prefixes   "Firstname LIKE 'ana%' OR Lastname LIKE 'ana%'" -> index merge of the two name indexes
+--   mode=fulltext   MATCH (Firstname, Lastname) AGAINST (... IN BOOLEAN MODE) -> ft_studentinfo_name
+--   filters         Dept/Year, Degree, StHostelId, RoomId and MessId each have an index
+
+DELIMITER $$
+
+DROP PROCEDURE IF EXISTS sp_add_index_if_missing$$
+CREATE PROCEDURE sp_add_index_if_missing(
+    IN p_table VARCHAR(64),
+    IN p_index VARCHAR(64),
+    IN p_definition VARCHAR(255)
+)
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = p_table AND index_name = p_index
+    ) THEN
+        SET @ddl = CONCAT('ALTER TABLE ', p_table, ' ADD ', p_definition);
+        PREPARE stmt FROM @ddl;
+        EXECUTE stmt;
+        DEALLOCATE PREPARE stmt;
+    END IF;
+END$$
+
+DELIMITER ;
+
+-- Lastname first: the default sort is Lastname, Firstname
+CALL sp_add_index_if_missing('studentinfo', 'idx_studentinfo_lastname', 'INDEX idx_studentinfo_lastname (Lastname, Firstname)');
+CALL sp_add_index_if_missing('studentinfo', 'idx_studentinfo_firstname', 'INDEX idx_studentinfo_firstname (Firstname)');
+CALL sp_add_index_if_missing('studentinfo', 'ft_studentinfo_name', 'FULLTEXT INDEX ft_studentinfo_name (Firstname, Lastname)');
+CALL sp_add_index_if_missing('studentinfo', 'idx_studentinfo_dept_year', 'INDEX idx_studentinfo_dept_year (Dept, Year)');
+CALL sp_add_index_if_missing('studentinfo', 'idx_studentinfo_degree', 'INDEX idx_studentinfo_degree (Degree)');
+CALL sp_add_index_if_missing('studentinfo', 'idx_studentinfo_hostel', 'INDEX idx_studentinfo_hostel (StHostelId)');
+CALL sp_add_index_if_missing('studentinfo', 'idx_studentinfo_room', 'INDEX idx_studentinfo_room (RoomId)');
+CALL sp_add_index_if_missing('studentinfo', 'idx_studentinfo_mess', 'INDEX idx_studentinfo_mess (MessId)');
+
+DROP PROCEDURE IF EXISTS sp_add_index_if_missing;